@@ -0,0 +1,101 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from clients.models import Client
+from clients.search_index import ClientSearchIndex
+import random
+import re
+import statistics
+import time
+import tracemalloc
+
+PREFIXES = ['ООО', 'ИП', 'АО', 'ЗАО', 'Магазин', 'Аптека', 'Кафе', 'Торговый дом', 'Супермаркет', 'Киоск']
+WORDS = [
+    'Ромашка', 'Берёзка', 'Север', 'Восток', 'Радуга', 'Удача', 'Лидер', 'Гранит', 'Сфера', 'Престиж',
+    'Маяк', 'Вектор', 'Орион', 'Альфа', 'Меридиан', 'Полюс', 'Рассвет', 'Кедр', 'Волна', 'Янтарь',
+]
+STREETS = ['ул. Ленина', 'ул. Садовая', 'пр. Мира', 'ул. Гагарина', 'пер. Школьный']
+QUERIES = ['ян', 'ооо', 'ромаш', 'БЕРЁЗКА', 'торговый дом р', 'кедр 12345', 'ипа', 'садовая', 'несуществующий']
+
+
+class Rollback(Exception):
+    """Raised to discard benchmark data."""
+
+
+class Command(BaseCommand):
+    help = 'Benchmark client search: ranked in-memory index against icontains/iregex queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, nargs='+', default=[100000, 1000000],
+                            help='Client counts to measure')
+        parser.add_argument('--repeat', type=int, default=50, help='Index lookups per query')
+        parser.add_argument('--scope-size', type=int, default=300,
+                            help='Clients assigned to one employee for the scoped search')
+
+    def handle(self, *args, **options):
+        for count in options['clients']:
+            try:
+                with transaction.atomic():
+                    self.run(count, options['repeat'], options['scope_size'])
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def run(self, count, repeat, scope_size):
+        random.seed(0)
+        existing = Client.objects.count()
+        # У половины клиентов заполнены торговая точка и ее адрес
+        Client.objects.bulk_create([
+            Client(
+                name=f'{random.choice(PREFIXES)} {random.choice(WORDS)} {random.choice(WORDS)} {number}',
+                trading_point_name=f'{random.choice(WORDS)} {number % 1000}' if number % 2 else None,
+                trading_point_address=f'{random.choice(STREETS)}, {number % 300}' if number % 2 else None,
+            )
+            for number in range(count - existing)
+        ], batch_size=5000)
+
+        index = ClientSearchIndex()
+        started = time.perf_counter()
+        index.rebuild()
+        build = time.perf_counter() - started
+        tracemalloc.start()
+        index.rebuild()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.stdout.write(
+            f'{len(index)} clients: index build {build:.1f} s, {memory / 2 ** 20:.0f} MB, '
+            f'{sum(len(field.grams) for field in index._fields)} trigrams'
+        )
+        # Клиенты одного сотрудника: случайная выборка
+        scope = frozenset(random.sample(sorted(index._names), min(scope_size, len(index))))
+        self.stdout.write(
+            f"{'query':>18} {'hits':>5} {'index us':>10} {'scoped us':>10} {'icontains ms':>13} {'iregex ms':>10}"
+        )
+        for query in QUERIES:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                found = index.search(query, 20)
+                timings.append(time.perf_counter() - started)
+            scoped = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                index.search(query, 20, scope)
+                scoped.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            list(Client.objects.filter(
+                Q(name__icontains=query) | Q(trading_point_name__icontains=query)
+                | Q(trading_point_address__icontains=query)
+            ).order_by('name').values_list('id', 'name')[:20])
+            icontains = time.perf_counter() - started
+            started = time.perf_counter()
+            list(Client.objects.filter(
+                Q(name__iregex=re.escape(query)) | Q(trading_point_name__iregex=re.escape(query))
+                | Q(trading_point_address__iregex=re.escape(query))
+            ).values_list('id', 'name')[:20])
+            iregex = time.perf_counter() - started
+            self.stdout.write(
+                f'{query:>18} {len(found):>5} {statistics.median(timings) * 1e6:>10.0f} '
+                f'{statistics.median(scoped) * 1e6:>10.0f} '
+                f'{icontains * 1e3:>13.1f} {iregex * 1e3:>10.1f}'
+            )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from clients.bulk_import import (
+    IMPORT_BATCH_SIZE, ImportFormatError, file_format_of, import_clients, read_client_rows,
+)
+import time
+
+
+class Command(BaseCommand):
+    help = 'Bulk import of the client master file (xlsx or CSV with the ClientResource columns)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='xlsx or CSV file')
+        parser.add_argument('--dry-run', action='store_true', help='Show the summary without saving anything')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Rows per batch')
+        parser.add_argument('--delimiter', default=',', help='CSV delimiter')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        started = time.perf_counter()
+        done = 0
+
+        def progress(count):
+            nonlocal done
+            done += count
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'Processed {done} rows ({done / elapsed:.0f} rows/s)')
+
+        try:
+            with open(path, 'rb') as file:
+                summary = import_clients(
+                    read_client_rows(file, file_format_of(path), options['delimiter']),
+                    dry_run=options['dry_run'],
+                    progress=progress,
+                    batch_size=options['batch_size'],
+                )
+        except (OSError, ImportFormatError) as error:
+            raise CommandError(str(error))
+
+        title = 'Dry run, nothing saved' if summary.dry_run else 'Import finished'
+        self.stdout.write(self.style.SUCCESS(
+            f'{title}: {summary.rows} rows in {summary.seconds:.1f} s '
+            f'({summary.rows / max(summary.seconds, 1e-9):.0f} rows/s)'
+        ))
+        self.stdout.write(
+            f'  created {summary.created}, updated {summary.updated}, unchanged {summary.unchanged}, '
+            f'skipped without name {summary.skipped}\n'
+            f'  group memberships added {summary.memberships_added}, removed {summary.memberships_removed}\n'
+            f'  unknown employees {summary.unknown_employees}, unknown groups {summary.unknown_groups}'
+        )
@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
 from clients.models import Client
+from clients.sync import log_changes
 from faker import Faker
+from tasks import versions
 import time
 
 class Command(BaseCommand):
@@ -31,8 +33,13 @@ class Command(BaseCommand):
                 clients_batch.append(client)
             
             Client.objects.bulk_create(clients_batch)
+            # Журнал изменений для офлайн-справочника устройств
+            log_changes([(client.pk, client.employee_id, None) for client in clients_batch])
             self.stdout.write(f'Created clients {i+1} to {batch_end}')
         
+        # bulk_create не вызывает сигналы: индексы поиска перестроятся по версии,
+        # журнал изменений записан выше
+        versions.bump(versions.CLIENTS)
         end_time = time.time()
         
         self.stdout.write(
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from clients.sync import CHANGE_RETENTION_DAYS, prune_changes
+
+
+class Command(BaseCommand):
+    help = 'Delete old entries of the client change log used by the offline sync'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=CHANGE_RETENTION_DAYS, help='Entries to keep, in days')
+
+    def handle(self, *args, **options):
+        deleted = prune_changes(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} client change log entries'))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0003_client_trading_point_address_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client_id', models.BigIntegerField(verbose_name='Клиент')),
+                ('employee_id', models.BigIntegerField(blank=True, null=True, verbose_name='Сотрудник')),
+                ('previous_employee_id', models.BigIntegerField(blank=True, null=True, verbose_name='Прежний сотрудник')),
+                ('changed_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Изменено')),
+            ],
+            options={
+                'verbose_name': 'Изменение клиента',
+                'verbose_name_plural': 'Изменения клиентов',
+                'indexes': [models.Index(fields=['employee_id', 'id'], name='clients_cli_employe_764cc5_idx'), models.Index(fields=['previous_employee_id', 'id'], name='clients_cli_previou_87ea3c_idx')],
+            },
+        ),
+    ]
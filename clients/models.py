@@ -96,4 +96,42 @@ class Client(models.Model):
         ordering = ['name']
         indexes = [
             models.Index(fields=['name']),  # Index for faster search
-        ]
\ No newline at end of file
+        ]
+
+class ClientChange(models.Model):
+    """
+    Change log entry of a client, read by the offline sync of devices.
+
+    Every save and delete of a client adds an entry; its id is the version
+    of the client directory after the change. Clients are referenced by
+    plain ids, so the entries outlive deleted clients and employees.
+
+    Attributes
+    ----------
+    client_id : int
+        Changed (or deleted) client
+    employee_id : int, optional
+        Employee assigned to the client after the change, None for deletes
+    previous_employee_id : int, optional
+        Employee assigned before the change, None for new clients
+    changed_at : datetime
+        Time of the change
+    """
+
+    client_id = models.BigIntegerField(_('Клиент'))
+    employee_id = models.BigIntegerField(_('Сотрудник'), blank=True, null=True)
+    previous_employee_id = models.BigIntegerField(_('Прежний сотрудник'), blank=True, null=True)
+    changed_at = models.DateTimeField(_('Изменено'), auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        """Return string representation of the change."""
+        return f'{self.client_id} @ {self.pk}'
+
+    class Meta:
+        verbose_name = _('Изменение клиента')
+        verbose_name_plural = _('Изменения клиентов')
+        indexes = [
+            # Изменения в области сотрудника после версии (клиенты пришли и ушли)
+            models.Index(fields=['employee_id', 'id']),
+            models.Index(fields=['previous_employee_id', 'id']),
+        ]
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Client search service.
+
+The one place where client search is tuned: minimum query length, result
+limit and a per-process LRU cache of ranked results. The client search
+endpoints (``clients.views.ClientSearchView``, ``tasks.views.search_clients``
+and ``tasks.views.autocomplete_clients``) all call ``find_clients``. The
+matching and ranking itself is done by ``clients.search_index``.
+
+Field employees work only with the clients assigned to them
+(``Client.employee``), so the survey form's client picker searches those by
+default (``SCOPE_OWN``) and the whole table only on request (``SCOPE_ALL``).
+The ids of an employee's clients are kept in the Django cache under a key
+with the employee's data version (``tasks.versions``, a database counter,
+so every process sees a change). ``clients.signals`` bumps the version when
+a client is assigned, reassigned or deleted; writers that bypass model
+signals call ``invalidate_employee_scopes``. A scoped search ranks these
+few hundred clients directly and is not put into the result cache.
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+
+from django.core.cache import cache
+
+from tasks import versions
+
+from .models import Client
+from .search_index import client_index, fold
+
+MIN_QUERY_LENGTH = 2
+SEARCH_LIMIT = 20
+RESULT_CACHE_SIZE = 1024
+SCOPE_CACHE_TIMEOUT = 60 * 60
+
+SCOPE_OWN = 'own'
+SCOPE_ALL = 'all'
+SEARCH_SCOPES = (SCOPE_OWN, SCOPE_ALL)
+
+SearchResult = namedtuple('SearchResult', 'id name rank field')
+
+
+class ResultCache:
+    """LRU-кэш результатов; запись действительна, пока не изменился индекс."""
+
+    def __init__(self, size=RESULT_CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+
+    def get(self, key, generation):
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is None or cached[0] != generation:
+                return None
+            self._results.move_to_end(key)
+            return cached[1]
+
+    def put(self, key, generation, results):
+        with self._lock:
+            self._results[key] = (generation, results)
+            self._results.move_to_end(key)
+            while len(self._results) > self.size:
+                self._results.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+result_cache = ResultCache()
+
+
+def employee_scope_version_name(employee_id):
+    """Имя версии данных списка клиентов сотрудника."""
+    return f'client_scope:{employee_id}'
+
+
+def employee_scope_cache_key(employee_id, version):
+    return f'clients:employee_scope:{employee_id}:{version}'
+
+
+def employee_client_ids(employee_id, version=None):
+    """
+    Id клиентов, закрепленных за сотрудником, из кэша или из базы.
+
+    ``version`` — уже прочитанная версия списка сотрудника.
+    """
+    if version is None:
+        name = employee_scope_version_name(employee_id)
+        version = versions.get_versions(name)[name]
+    key = employee_scope_cache_key(employee_id, version)
+    client_ids = cache.get(key)
+    if client_ids is None:
+        client_ids = frozenset(Client.objects.filter(employee_id=employee_id).values_list('id', flat=True))
+        cache.set(key, client_ids, SCOPE_CACHE_TIMEOUT)
+    return client_ids
+
+
+def invalidate_employee_scopes(*employee_ids):
+    """Меняет версии списков клиентов сотрудников во всех процессах."""
+    versions.bump(*(
+        employee_scope_version_name(employee_id) for employee_id in employee_ids if employee_id is not None
+    ))
+
+
+def normalize_query(query):
+    """Запрос без лишних пробелов."""
+    return ' '.join((query or '').split())
+
+
+def find_clients(query, limit=SEARCH_LIMIT, employee_id=None):
+    """
+    Клиенты по запросу, лучшие совпадения первыми.
+
+    Ищет подстроку без учета регистра в названии клиента, названии и
+    адресе торговой точки; ранги — точное совпадение, начало значения,
+    начало слова, подстрока. Запрос короче ``MIN_QUERY_LENGTH`` ничего
+    не находит.
+
+    Parameters
+    ----------
+    query : str
+    limit : int
+    employee_id : int, optional
+        Искать только среди клиентов этого сотрудника.
+
+    Returns
+    -------
+    list[SearchResult]
+    """
+    query = normalize_query(query)
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+    if employee_id is not None:
+        # Версии индекса и списка сотрудника одним запросом
+        name = employee_scope_version_name(employee_id)
+        current = versions.get_versions(versions.CLIENTS, name)
+        client_index.ensure_current(current[versions.CLIENTS])
+        client_ids = employee_client_ids(employee_id, current[name])
+        return [
+            SearchResult(*found) for found in client_index.search(query, limit, client_ids, ensure=False)
+        ]
+    client_index.ensure_current()
+    generation = client_index.generation
+    key = (fold(query), limit)
+    results = result_cache.get(key, generation)
+    if results is None:
+        results = [SearchResult(*found) for found in client_index.search(query, limit, ensure=False)]
+        result_cache.put(key, generation, results)
+    return results
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory index of clients for search and autocomplete.
+
+Clients are searched by casefolded substring in ``name``,
+``trading_point_name`` and ``trading_point_address`` (``SEARCH_FIELDS``).
+On SQLite ``icontains``/``iregex`` scan the whole table and ``LIKE`` folds
+only ASCII letters, so Cyrillic matched case-sensitively. The index keeps,
+per process and per field, the casefolded values in sorted order with two
+posting lists of positions in that order: one per trigram of the value and
+one per 1-3 character prefix of every word after the first.
+
+Matches are ranked exact > prefix > word prefix > substring (``MATCH_*``),
+then by field in ``SEARCH_FIELDS`` order, then alphabetically. Each rank
+of each field is read as a stream already in that order, so every stream
+stops after ``limit`` hits:
+
+* exact and prefix matches are a contiguous range of the sorted values;
+* word-prefix matches come from the word prefix posting list of the first
+  three characters of the query;
+* substring matches, needed only when the better ranks return fewer than
+  ``limit`` clients, come from the shortest trigram posting list of the
+  query, or the whole sorted list for queries shorter than three
+  characters.
+
+A search can be restricted to a set of client ids (``client_ids``), e.g.
+the clients assigned to an employee (``clients.search``). Such a set is
+small, so its clients are ranked directly from their folded values kept
+per id, without the posting lists.
+
+The index is built on the first search. Saves and deletes of clients in
+this process are applied after commit (``clients.signals``) to a small
+delta that is ranked directly and merged into every result; when the delta
+grows past ``MAX_DELTA_SHARE`` of the index, the index is rebuilt. Writes
+made elsewhere (other workers, management commands such as
+``import_clients``, ``bulk_create``, ``QuerySet.update``) are noticed
+through the ``clients`` data version of ``tasks.versions`` and trigger a
+rebuild on the next search. The version is a row in the database, not in
+the per-process cache, so every search reads it with one primary-key
+query. The search service used by the endpoints, with its limits and
+result cache, is ``clients.search``.
+"""
+
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from itertools import islice
+
+from tasks import versions
+
+from .models import Client
+
+SEARCH_FIELDS = ('name', 'trading_point_name', 'trading_point_address')
+
+MATCH_EXACT = 0
+MATCH_PREFIX = 1
+MATCH_WORD_PREFIX = 2
+MATCH_SUBSTRING = 3
+
+BUILD_CHUNK_SIZE = 5000
+# Позиции в отсортированных значениях: 4 байта на вхождение
+POSITION_TYPECODE = 'I'
+# Длина индексируемых префиксов слов; более длинный запрос проверяется по значению
+WORD_PREFIX_LENGTH = 3
+# Изменения сверх этой доли индекса (но не меньше MIN_DELTA) — перестройка
+MAX_DELTA_SHARE = 0.05
+MIN_DELTA = 1000
+
+
+def fold(value):
+    """Регистронезависимая форма строки (включая кириллицу)."""
+    return (value or '').casefold()
+
+
+def trigrams(folded):
+    return {folded[i:i + 3] for i in range(len(folded) - 2)}
+
+
+def word_prefixes(folded):
+    """Префиксы длиной 1..``WORD_PREFIX_LENGTH`` всех слов, кроме первого."""
+    return {
+        folded[start:start + length]
+        for start in range(1, len(folded))
+        if folded[start].isalnum() and not folded[start - 1].isalnum()
+        for length in range(1, min(WORD_PREFIX_LENGTH, len(folded) - start) + 1)
+    }
+
+
+def match_rank(folded, needle):
+    """Ранг совпадения ``needle`` со значением ``folded`` или None."""
+    if folded == needle:
+        return MATCH_EXACT
+    if folded.startswith(needle):
+        return MATCH_PREFIX
+    start = folded.find(needle, 1)
+    if start == -1:
+        return None
+    if needle[0].isalnum():
+        while start != -1:
+            if not folded[start - 1].isalnum():
+                return MATCH_WORD_PREFIX
+            start = folded.find(needle, start + 1)
+    return MATCH_SUBSTRING
+
+
+def _post(postings, key, position):
+    posting = postings.get(key)
+    if posting is None:
+        posting = postings[key] = array(POSITION_TYPECODE)
+    posting.append(position)
+
+
+class _FieldIndex:
+    """Отсортированные непустые значения одного поля и списки позиций."""
+
+    def __init__(self, docs):
+        # (свернутое значение, id клиента)
+        self.docs = sorted(docs)
+        self.grams = {}
+        self.words = {}
+        for position, (folded, _) in enumerate(self.docs):
+            for gram in trigrams(folded):
+                _post(self.grams, gram, position)
+            for prefix in word_prefixes(folded):
+                _post(self.words, prefix, position)
+
+    def prefix_matches(self, needle):
+        """Точные совпадения и совпадения по началу, по алфавиту."""
+        docs = self.docs
+        position = bisect_left(docs, (needle,))
+        while position < len(docs) and docs[position][0].startswith(needle):
+            yield docs[position]
+            position += 1
+
+    def word_prefix_matches(self, needle):
+        """Значения, в которых с ``needle`` начинается не первое слово, по алфавиту."""
+        docs = self.docs
+        for position in self.words.get(needle[:WORD_PREFIX_LENGTH], ()):
+            doc = docs[position]
+            if match_rank(doc[0], needle) == MATCH_WORD_PREFIX:
+                yield doc
+
+    def substring_matches(self, needle):
+        """Значения, содержащие ``needle`` только внутри слов, по алфавиту."""
+        docs = self.docs
+        if len(needle) < 3:
+            candidates = docs
+        else:
+            postings = []
+            for gram in trigrams(needle):
+                posting = self.grams.get(gram)
+                if posting is None:
+                    return
+                postings.append(posting)
+            candidates = (docs[position] for position in min(postings, key=len))
+        for doc in candidates:
+            if match_rank(doc[0], needle) == MATCH_SUBSTRING:
+                yield doc
+
+
+class ClientSearchIndex:
+    """Индекс клиентов одного процесса по полям ``SEARCH_FIELDS``."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.version = None
+        # Меняется при каждом изменении содержимого: ключ для кэшей результатов
+        self.generation = 0
+
+    def _reset(self):
+        self._fields = [_FieldIndex(()) for _ in SEARCH_FIELDS]
+        self._names = {}
+        # id -> свернутые значения полей (для поиска среди заданных id)
+        self._folded = {}
+        # Изменения после снимка: id -> свернутые значения полей; скрытые id снимка
+        self._added = {}
+        self._removed = set()
+
+    @property
+    def is_built(self):
+        return self.version is not None
+
+    def __len__(self):
+        return len(self._names)
+
+    def rebuild(self, version=None):
+        """Перечитывает всех клиентов из базы; ``version`` — уже прочитанная версия данных."""
+        with self._lock:
+            if version is None:
+                version = versions.get_versions(versions.CLIENTS)[versions.CLIENTS]
+            self._reset()
+            docs = [[] for _ in SEARCH_FIELDS]
+            rows = Client.objects.order_by().values_list('id', *SEARCH_FIELDS).iterator(chunk_size=BUILD_CHUNK_SIZE)
+            for pk, *values in rows:
+                self._names[pk] = values[0] or ''
+                # Строки значений общие для документов полей и _folded
+                folded = self._folded[pk] = tuple(fold(value) for value in values)
+                for field_docs, value in zip(docs, folded):
+                    if value:
+                        field_docs.append((value, pk))
+            self._fields = [_FieldIndex(field_docs) for field_docs in docs]
+            self.version = version
+            self.generation += 1
+
+    def invalidate(self):
+        """Сбрасывает индекс; он будет построен заново при следующем поиске."""
+        with self._lock:
+            self._reset()
+            self.version = None
+            self.generation += 1
+
+    def apply(self, pk, values=None, version=None):
+        """
+        Применяет изменение клиента ``pk``.
+
+        ``values`` — значения ``SEARCH_FIELDS`` после изменения, None —
+        клиент удален. ``version`` — версия данных клиентов после этого
+        изменения; если между ней и версией индекса были чужие изменения,
+        индекс сбрасывается.
+        """
+        with self._lock:
+            if not self.is_built:
+                return
+            if version is not None and version != self.version + 1:
+                self.invalidate()
+                return
+            self._removed.add(pk)
+            self._added.pop(pk, None)
+            self._names.pop(pk, None)
+            self._folded.pop(pk, None)
+            if values is not None:
+                self._added[pk] = self._folded[pk] = tuple(fold(value) for value in values)
+                self._names[pk] = values[0] or ''
+            self.generation += 1
+            if len(self._added) + len(self._removed) > max(MIN_DELTA, len(self._names) * MAX_DELTA_SHARE):
+                self.invalidate()
+                return
+            if version is not None:
+                self.version = version
+
+    def ensure_current(self, version=None):
+        """
+        Строит индекс или перестраивает его после изменений в других процессах.
+
+        ``version`` — уже прочитанная версия данных ``clients``.
+        """
+        if version is None:
+            version = versions.get_versions(versions.CLIENTS)[versions.CLIENTS]
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    self.rebuild(version)
+
+    def _streams(self, needle, substring=False):
+        """Упорядоченные потоки ключей (ранг, поле, значение, id) снимка."""
+        removed = self._removed
+        for field, index in enumerate(self._fields):
+            if substring:
+                yield (
+                    (MATCH_SUBSTRING, field, folded, pk)
+                    for folded, pk in index.substring_matches(needle) if pk not in removed
+                )
+                continue
+            yield (
+                (MATCH_EXACT if folded == needle else MATCH_PREFIX, field, folded, pk)
+                for folded, pk in index.prefix_matches(needle) if pk not in removed
+            )
+            yield (
+                (MATCH_WORD_PREFIX, field, folded, pk)
+                for folded, pk in index.word_prefix_matches(needle) if pk not in removed
+            )
+
+    @staticmethod
+    def _best_key(pk, values, needle):
+        """Лучший ключ (ранг, поле, значение, id) клиента или None."""
+        best = None
+        for field, folded in enumerate(values):
+            # Проверка вхождения отсеивает большинство значений без вызова match_rank
+            if needle in folded:
+                rank = match_rank(folded, needle)
+                if best is None or (rank, field, folded) < best[:3]:
+                    best = (rank, field, folded, pk)
+        return best
+
+    def search(self, query, limit=20, client_ids=None, ensure=True):
+        """
+        Клиенты, в полях которых есть ``query`` без учета регистра, по рангу.
+
+        Parameters
+        ----------
+        query : str
+        limit : int
+        client_ids : collection of int, optional
+            Искать только среди этих клиентов.
+        ensure : bool
+            Проверить версию данных (``ensure_current``); False — вызывающий
+            только что проверил ее сам.
+
+        Returns
+        -------
+        list[tuple[int, str, int, str]]
+            До ``limit`` кортежей (id, название, ранг совпадения, поле).
+        """
+        needle = fold(query)
+        if not needle:
+            return []
+        if ensure:
+            self.ensure_current()
+        with self._lock:
+            if client_ids is not None:
+                folded = self._folded
+                keys = (
+                    self._best_key(pk, folded[pk], needle)
+                    for pk in client_ids if pk in folded
+                )
+                ranked = heapq.nsmallest(limit, filter(None, keys))
+                return [(pk, self._names[pk], rank, SEARCH_FIELDS[field]) for rank, field, _, pk in ranked]
+
+            best = {}
+
+            def offer(key):
+                pk = key[3]
+                if pk not in best or key < best[pk]:
+                    best[pk] = key
+
+            for pk, values in self._added.items():
+                key = self._best_key(pk, values, needle)
+                if key is not None:
+                    offer(key)
+            # В потоке id не повторяются, поэтому ключ дальше limit-го в ответ не попадет
+            for stream in self._streams(needle):
+                for key in islice(stream, limit):
+                    offer(key)
+            if len(best) < limit:
+                for stream in self._streams(needle, substring=True):
+                    for key in islice(stream, limit):
+                        offer(key)
+
+            ranked = sorted(best.values())[:limit]
+            return [(pk, self._names[pk], rank, SEARCH_FIELDS[field]) for rank, field, _, pk in ranked]
+
+
+client_index = ClientSearchIndex()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Signals and signal handlers for the clients app.
+
+Handlers are connected in ``ClientsConfig.ready``.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from tasks import versions
+from .models import Client
+from .search import invalidate_employee_scopes
+from .search_index import SEARCH_FIELDS, client_index
+from .sync import log_changes
+
+
+def _on_commit(pk, values):
+    """Меняет версию клиентов и применяет изменение к индексу поиска этого процесса."""
+    def apply():
+        client_index.apply(pk, values, version=versions.bump(versions.CLIENTS)[versions.CLIENTS])
+    transaction.on_commit(apply, robust=True)
+
+
+@receiver(pre_save, sender=Client)
+def remember_previous_employee(sender, instance, update_fields=None, **kwargs):
+    """Запоминает сотрудника клиента до сохранения, чтобы заметить переназначение."""
+    if instance.pk is None or (update_fields is not None and 'employee' not in update_fields):
+        instance._previous_employee_id = instance.employee_id
+        return
+    instance._previous_employee_id = (
+        Client.objects.filter(pk=instance.pk).values_list('employee_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Client)
+def index_saved_client(sender, instance, created, **kwargs):
+    _on_commit(instance.pk, [getattr(instance, field) for field in SEARCH_FIELDS])
+    previous, current = getattr(instance, '_previous_employee_id', None), instance.employee_id
+    # Журнал пишется в транзакции изменения
+    log_changes([(instance.pk, current, None if created else previous)])
+    if created or previous != current:
+        transaction.on_commit(lambda: invalidate_employee_scopes(previous, current), robust=True)
+
+
+@receiver(post_delete, sender=Client)
+def unindex_deleted_client(sender, instance, **kwargs):
+    _on_commit(instance.pk, None)
+    employee_id = instance.employee_id
+    log_changes([(instance.pk, None, employee_id)])
+    transaction.on_commit(lambda: invalidate_employee_scopes(employee_id), robust=True)
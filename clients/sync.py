@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Offline sync of the client directory for devices.
+
+A device downloads a snapshot of the clients assigned to its employee
+(``snapshot``) once and then asks only for what changed since the version
+of its copy (``changes_since``), so autocomplete runs locally and works
+without coverage.
+
+Versions are ids of ``ClientChange`` entries. Every save and delete of a
+client adds an entry with the employee before and after the change
+(``clients.signals``; bulk writers call ``log_changes``), in the same
+transaction as the change. The delta for an employee takes the clients of
+the entries after the device's version where the employee is the current
+or the previous one, and reads their current rows: clients still assigned
+to the employee are sent whole (inserts and updates), the rest as deleted
+ids, which also covers clients reassigned to someone else.
+
+Entries older than ``CHANGE_RETENTION_DAYS`` are removed by
+``prune_changes`` (management command ``prune_client_changes``); a device
+whose version is older than the log gets ``SyncExpired`` and downloads a
+new snapshot.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .models import Client, ClientChange
+
+# Поля клиента в снимке и в изменениях, в этом порядке
+SYNC_FIELDS = ('id', 'name', 'trading_point_name', 'trading_point_address', 'address')
+CHANGE_RETENTION_DAYS = 90
+# Размер пачки id клиентов в запросе их текущих строк
+SYNC_CHUNK_SIZE = 500
+
+
+class SyncExpired(Exception):
+    """Версия устройства старше журнала изменений: нужен новый снимок."""
+
+
+def log_changes(changes):
+    """
+    Записывает изменения клиентов в журнал одной вставкой.
+
+    Parameters
+    ----------
+    changes : iterable of tuple
+        ``(id клиента, сотрудник после изменения, сотрудник до изменения)``;
+        для удаленного клиента сотрудник после изменения — None.
+    """
+    ClientChange.objects.bulk_create([
+        ClientChange(client_id=client_id, employee_id=employee_id, previous_employee_id=previous_employee_id)
+        for client_id, employee_id, previous_employee_id in changes
+    ])
+
+
+def current_version():
+    """Версия справочника клиентов: id последнего изменения, 0 — изменений нет."""
+    return ClientChange.objects.aggregate(version=Max('id'))['version'] or 0
+
+
+def snapshot(employee_id):
+    """
+    Клиенты сотрудника и версия, с которой запрашивать изменения.
+
+    Returns
+    -------
+    dict
+        ``version``, ``employee``, ``fields`` (``SYNC_FIELDS``) и
+        ``clients`` — списки значений полей.
+    """
+    # Версия и строки читаются в одной транзакции: изменение между ними
+    # придет повторно в следующей дельте, но не потеряется
+    with transaction.atomic():
+        version = current_version()
+        clients = Client.objects.filter(employee_id=employee_id).order_by('id').values_list(*SYNC_FIELDS)
+        return {
+            'version': version,
+            'employee': employee_id,
+            'fields': SYNC_FIELDS,
+            'clients': [list(client) for client in clients],
+        }
+
+
+def changes_since(employee_id, since):
+    """
+    Изменения клиентов сотрудника после версии ``since``.
+
+    Returns
+    -------
+    dict
+        ``version``, ``employee``, ``fields``, ``upserts`` — клиенты
+        сотрудника, добавленные или измененные после ``since``, и
+        ``deletes`` — id клиентов, удаленных или переданных другому
+        сотруднику.
+
+    Raises
+    ------
+    SyncExpired
+        Если изменения после ``since`` уже удалены из журнала или
+        ``since`` новее текущей версии.
+    """
+    with transaction.atomic():
+        bounds = ClientChange.objects.aggregate(oldest=Min('id'), version=Max('id'))
+        version = bounds['version'] or 0
+        if since > version or (bounds['oldest'] is not None and since < bounds['oldest'] - 1):
+            raise SyncExpired(since)
+        client_ids = sorted(set(
+            ClientChange.objects
+            .filter(Q(employee_id=employee_id) | Q(previous_employee_id=employee_id), id__gt=since)
+            .values_list('client_id', flat=True)
+        ))
+        upserts = []
+        for start in range(0, len(client_ids), SYNC_CHUNK_SIZE):
+            upserts.extend(
+                list(client) for client in Client.objects.filter(
+                    id__in=client_ids[start:start + SYNC_CHUNK_SIZE], employee_id=employee_id,
+                ).order_by('id').values_list(*SYNC_FIELDS)
+            )
+    kept = {client[0] for client in upserts}
+    return {
+        'version': version,
+        'employee': employee_id,
+        'fields': SYNC_FIELDS,
+        'upserts': upserts,
+        'deletes': [client_id for client_id in client_ids if client_id not in kept],
+    }
+
+
+def prune_changes(days=CHANGE_RETENTION_DAYS):
+    """Удаляет записи журнала старше ``days`` дней, кроме последней; возвращает их число."""
+    version = current_version()
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = ClientChange.objects.filter(changed_at__lt=cutoff, id__lt=version).delete()
+    return deleted
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import client_changes, client_snapshot
+
+urlpatterns = [
+    path('snapshot/', client_snapshot, name='client-snapshot'),
+    path('changes/', client_changes, name='client-changes'),
+]
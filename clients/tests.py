@@ -1,3 +1,326 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+import openpyxl
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from tasks import versions
+from users.models import CustomUser, UserRoles
+from . import search
+from .bulk_import import import_clients, read_client_rows
+from .models import Client, ClientChange, ClientGroup
+from .sync import current_version, prune_changes
+from .search_index import MATCH_EXACT, MATCH_PREFIX, MATCH_SUBSTRING, MATCH_WORD_PREFIX, ClientSearchIndex, client_index
+
+# Кэш другого процесса: LocMemCache у каждого процесса свой
+OTHER_WORKER_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'other-worker',
+}}
+
+
+class ClientSearchTests(TestCase):
+    """Поиск клиентов: кириллица без учета регистра, ранжирование и обновление по сигналам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        clients = [
+            ('ООО Ромашка', None, None),
+            ('ооо ромашка-2', None, None),
+            ('ИП Петров', 'Ромашка у дома', 'ул. Садовая, 5'),
+            ('Магазин «Берёзка»', None, 'пр. Мира, 10'),
+            ('Apple Store', None, None),
+            ('Ромашка', None, None),
+            ('Фромаж', None, None),
+        ]
+        cls.clients = {
+            name: Client.objects.create(name=name, trading_point_name=point, trading_point_address=address)
+            for name, point, address in clients
+        }
+
+    def setUp(self):
+        # Откат транзакции теста не вызывает сигналы, но удаляет версии данных:
+        # новая версия перестраивает индекс
+        cache.clear()
+
+    def names(self, query, limit=20):
+        return [client.name for client in search.find_clients(query, limit)]
+
+    def test_search_ignores_case(self):
+        self.assertEqual(self.names('БЕРЁЗ'), ['Магазин «Берёзка»'])
+        self.assertEqual(self.names('apple s'), ['Apple Store'])
+        self.assertEqual(self.names('ромашка-'), ['ооо ромашка-2'])
+        self.assertEqual(self.names('ромашкаа'), [])
+        # Короче MIN_QUERY_LENGTH — пусто
+        self.assertEqual(self.names('о'), [])
+
+    def test_ranking(self):
+        results = search.find_clients('ромашка')
+        self.assertEqual([(client.name, client.rank, client.field) for client in results], [
+            ('Ромашка', MATCH_EXACT, 'name'),
+            ('ИП Петров', MATCH_PREFIX, 'trading_point_name'),
+            ('ООО Ромашка', MATCH_WORD_PREFIX, 'name'),
+            ('ооо ромашка-2', MATCH_WORD_PREFIX, 'name'),
+        ])
+        self.assertEqual(
+            [(client.name, client.rank) for client in search.find_clients('ромаж')],
+            [('Фромаж', MATCH_SUBSTRING)],
+        )
+        self.assertEqual(self.names('садовая'), ['ИП Петров'])
+        self.assertEqual(self.names('ромашка', limit=2), ['Ромашка', 'ИП Петров'])
+
+    def test_streams_stop_at_limit(self):
+        index = ClientSearchIndex()
+        Client.objects.bulk_create([Client(name=f'ООО Торговый дом {i:03}') for i in range(200)])
+        self.assertEqual(
+            [name for _, name, _, _ in index.search('ооо т', 3)],
+            ['ООО Торговый дом 000', 'ООО Торговый дом 001', 'ООО Торговый дом 002'],
+        )
+        self.assertEqual([name for _, name, _, _ in index.search('торг', 2)], [
+            'ООО Торговый дом 000', 'ООО Торговый дом 001',
+        ])
+        self.assertEqual([name for _, name, _, _ in index.search('м 150', 3)], ['ООО Торговый дом 150'])
+
+    def test_signals_update_index_without_rebuild(self):
+        self.names('ромаш')
+        with self.captureOnCommitCallbacks(execute=True):
+            Client.objects.create(name='Ромашка Плюс')
+            self.clients['ИП Петров'].trading_point_name = 'Лютик'
+            self.clients['ИП Петров'].save()
+            self.clients['ООО Ромашка'].delete()
+        # Изменения после построения индекса сливаются с результатами, кэш сброшен;
+        # запрос — только проверка версии данных
+        with self.assertNumQueries(1):
+            self.assertEqual(self.names('ромаш'), ['Ромашка', 'Ромашка Плюс', 'ооо ромашка-2'])
+        self.assertEqual(self.names('лютик'), ['ИП Петров'])
+
+    def test_foreign_changes_trigger_rebuild(self):
+        self.names('петров')
+        # Как изменение в другом процессе (со своим кэшем) без сигналов
+        with override_settings(CACHES=OTHER_WORKER_CACHES):
+            Client.objects.filter(name='ИП Петров').update(name='ИП Сидоров')
+            versions.bump(versions.CLIENTS)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.names('сидор'), ['ИП Сидоров'])
+        self.assertEqual(self.names('петров'), [])
+
+    def test_results_are_cached(self):
+        self.names('ромаш')
+        generation = client_index.generation
+        self.assertIsNotNone(search.result_cache.get(('ромаш', search.SEARCH_LIMIT), generation))
+        self.assertEqual(self.names('  РОМАШ '), self.names('ромаш'))
+
+    def test_endpoints_share_the_service(self):
+        admin = CustomUser.objects.create_superuser('admin', password='pass', role=UserRoles.MODERATOR)
+        self.client.force_login(admin)
+        expected = ['Ромашка', 'ИП Петров', 'ООО Ромашка', 'ооо ромашка-2']
+        response = self.client.get(reverse('tasks:autocomplete_clients'), {'q': 'РОМАШКА'})
+        self.assertEqual([client['name'] for client in response.json()['clients']], expected)
+        response = self.client.get(reverse('client-search'), {'q': 'ромашка', 'scope': search.SCOPE_ALL})
+        self.assertEqual([client['name'] for client in response.json()], expected)
+        response = self.client.post(
+            reverse('tasks:search_clients'), {'query': 'ромашка'}, content_type='application/json'
+        )
+        self.assertEqual([client['name'] for client in response.json()['clients']], expected)
+        response = self.client.post(reverse('tasks:search_clients'), {'query': 'р'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_scoped_to_employee(self):
+        employee = CustomUser.objects.create_user('field', password='pass', role=UserRoles.EMPLOYEE)
+        other = CustomUser.objects.create_user('other', password='pass', role=UserRoles.EMPLOYEE)
+        with self.captureOnCommitCallbacks(execute=True):
+            for name in ('ООО Ромашка', 'ИП Петров'):
+                self.clients[name].employee = employee
+                self.clients[name].save()
+        self.client.force_login(employee)
+        url = reverse('client-search')
+
+        response = self.client.get(url, {'q': 'ромашка'})
+        self.assertEqual([client['name'] for client in response.json()], ['ИП Петров', 'ООО Ромашка'])
+        response = self.client.get(url, {'q': 'ромашка', 'scope': search.SCOPE_ALL})
+        self.assertEqual(len(response.json()), 4)
+        self.assertEqual(self.client.get(url, {'q': 'ромашка', 'scope': 'x'}).status_code, 400)
+
+        # Список клиентов сотрудника кэширован и сбрасывается при переназначении
+        with self.assertNumQueries(1):
+            self.assertEqual(len(search.find_clients('ромашка', employee_id=employee.pk)), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clients['ИП Петров'].employee = other
+            self.clients['ИП Петров'].save()
+            Client.objects.create(name='Ромашка Плюс', employee=employee)
+        self.assertEqual(
+            [client.name for client in search.find_clients('ромашка', employee_id=employee.pk)],
+            ['Ромашка Плюс', 'ООО Ромашка'],
+        )
+        self.assertEqual([client.name for client in search.find_clients('ромашка', employee_id=other.pk)], ['ИП Петров'])
+        # Переназначение в другом процессе (со своим кэшем) видно и здесь
+        with override_settings(CACHES=OTHER_WORKER_CACHES), self.captureOnCommitCallbacks(execute=True):
+            moved = Client.objects.get(name='Ромашка Плюс')
+            moved.employee = other
+            moved.save()
+        self.assertEqual([client.name for client in search.find_clients('ромашка', employee_id=employee.pk)], ['ООО Ромашка'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clients['ООО Ромашка'].delete()
+        self.assertEqual(search.employee_client_ids(employee.pk), frozenset())
+
+        self.client.logout()
+        self.assertEqual(self.client.get(url, {'q': 'ромашка'}).json(), [])
+
+
+class ClientImportTests(TestCase):
+    """Пакетный импорт клиентов: создание, изменение, группы и пробный прогон."""
+
+    HEADER = ['name', 'employee__username', 'client_groups__name', 'trading_point_name', 'trading_point_address']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = CustomUser.objects.create_user('field', password='pass', role=UserRoles.EMPLOYEE)
+        cls.retail = ClientGroup.objects.create(name='Розница')
+        cls.horeca = ClientGroup.objects.create(name='HoReCa')
+        cls.petrov = Client.objects.create(name='ИП Петров', trading_point_name='Лавка')
+        cls.petrov.client_groups.add(cls.retail)
+        cls.same = Client.objects.create(name='ООО Ромашка', trading_point_address='ул. Садовая, 5')
+
+    def rows(self, rows):
+        text = '\n'.join(','.join(f'"{value}"' for value in row) for row in [self.HEADER, *rows])
+        return read_client_rows(io.BytesIO(text.encode('utf-8-sig')), 'csv')
+
+    def test_import_creates_updates_and_syncs_groups(self):
+        version = versions.get_versions(versions.CLIENTS)[versions.CLIENTS]
+        with self.captureOnCommitCallbacks(execute=True):
+            summary = import_clients(self.rows([
+                ['ИП Петров', 'field', 'HoReCa, Нет такой', 'Лавка', 'пр. Мира, 1'],
+                ['ООО Ромашка', '', '', '', 'ул. Садовая, 5'],
+                ['Кафе Волна', 'nobody', 'Розница,HoReCa', 'Волна', ''],
+                ['', '', '', '', ''],
+                ['Кафе Волна', 'field', 'Розница', 'Волна', ''],
+            ]), batch_size=2)
+        self.assertEqual(summary[:9], (5, 1, 2, 1, 1, 3, 2, 1, 1))
+        self.assertNotEqual(versions.get_versions(versions.CLIENTS)[versions.CLIENTS], version)
+
+        self.petrov.refresh_from_db()
+        self.assertEqual(self.petrov.employee, self.employee)
+        self.assertEqual(self.petrov.trading_point_address, 'пр. Мира, 1')
+        self.assertEqual(list(self.petrov.client_groups.all()), [self.horeca])
+        wave = Client.objects.get(name='Кафе Волна')
+        self.assertEqual((wave.employee, wave.trading_point_address), (self.employee, None))
+        self.assertEqual(list(wave.client_groups.all()), [self.retail])
+        self.assertEqual(Client.objects.count(), 3)
+        self.assertEqual(search.employee_client_ids(self.employee.pk), {self.petrov.pk, wave.pk})
+
+    def test_unknown_employee_keeps_assignment(self):
+        Client.objects.filter(pk=self.petrov.pk).update(employee=self.employee)
+        summary = import_clients(self.rows([['ИП Петров', 'nobody', 'Розница', 'Лавка', '']]))
+        self.assertEqual((summary.unknown_employees, summary.updated, summary.unchanged), (1, 0, 1))
+        self.petrov.refresh_from_db()
+        self.assertEqual(self.petrov.employee, self.employee)
+
+    def test_import_in_other_process_reaches_search(self):
+        self.assertEqual(search.find_clients('волна'), [])
+        self.assertEqual(search.employee_client_ids(self.employee.pk), frozenset())
+        # Импорт командой: другой процесс со своим кэшем
+        with override_settings(CACHES=OTHER_WORKER_CACHES), self.captureOnCommitCallbacks(execute=True):
+            import_clients(self.rows([['Кафе Волна', 'field', '', 'Волна', '']]))
+        self.assertEqual([client.name for client in search.find_clients('волна')], ['Кафе Волна'])
+        self.assertEqual(
+            [client.name for client in search.find_clients('волна', employee_id=self.employee.pk)], ['Кафе Волна']
+        )
+
+    def test_dry_run_and_command(self):
+        summary = import_clients(self.rows([['Кафе Волна', '', 'Розница', '', '']]), dry_run=True)
+        self.assertEqual((summary.rows, summary.created, summary.memberships_added), (1, 1, 1))
+        self.assertFalse(Client.objects.filter(name='Кафе Волна').exists())
+
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['name', 'trading_point_name'])
+        workbook.active.append(['Кафе Волна', 'Волна'])
+        workbook.active.append(['ИП Петров', 'Лавка'])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'clients.xlsx')
+            workbook.save(path)
+            output = io.StringIO()
+            call_command('import_clients', path, stdout=output)
+        self.assertIn('created 1, updated 0, unchanged 1', output.getvalue())
+        self.assertIn('rows/s', output.getvalue())
+        # Группы не указаны в файле — не меняются
+        self.assertEqual(list(self.petrov.client_groups.all()), [self.retail])
+
+
+class ClientSyncTests(TestCase):
+    """Офлайн-справочник клиентов: снимок, дельта по журналу изменений и очистка журнала."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = CustomUser.objects.create_user('field', password='pass', role=UserRoles.EMPLOYEE)
+        cls.other = CustomUser.objects.create_user('other', password='pass', role=UserRoles.EMPLOYEE)
+        cls.petrov = Client.objects.create(name='ИП Петров', employee=cls.employee, trading_point_name='Лавка')
+        cls.wave = Client.objects.create(name='Кафе Волна', employee=cls.employee)
+        Client.objects.create(name='ООО Ромашка', employee=cls.other)
+
+    def setUp(self):
+        self.client.force_login(self.employee)
+
+    def changes(self, since):
+        return self.client.get(reverse('client-changes'), {'since': since})
+
+    def test_snapshot_is_gzipped_and_versioned(self):
+        response = self.client.get(reverse('client-snapshot'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(data['version'], current_version())
+        self.assertEqual(data['fields'][:2], ['id', 'name'])
+        self.assertEqual([client[1] for client in data['clients']], ['ИП Петров', 'Кафе Волна'])
+        self.assertEqual(data['clients'][0][2], 'Лавка')
+
+        response = self.client.get(reverse('client-snapshot'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('client-snapshot')).status_code, 401)
+
+    def test_changes_since_version(self):
+        version = current_version()
+        self.assertEqual(self.changes(version).json()['upserts'], [])
+
+        self.petrov.trading_point_name = 'Лавка у дома'
+        self.petrov.save()
+        self.wave.employee = self.other
+        self.wave.save()
+        new = Client.objects.create(name='Аптека Кедр', employee=self.employee)
+        Client.objects.get(name='ООО Ромашка').delete()
+        data = self.changes(version).json()
+        self.assertEqual(data['version'], current_version())
+        self.assertEqual([(client[1], client[2]) for client in data['upserts']], [
+            ('ИП Петров', 'Лавка у дома'), ('Аптека Кедр', None),
+        ])
+        # Переданный другому сотруднику клиент удаляется с устройства; чужой удаленный не упоминается
+        self.assertEqual(data['deletes'], [self.wave.pk])
+
+        new_id = new.pk
+        new.delete()
+        data = self.changes(data['version']).json()
+        self.assertEqual((data['upserts'], data['deletes']), ([], [new_id]))
+        self.assertEqual(self.changes('x').status_code, 400)
+        self.assertEqual(self.changes(current_version() + 1).status_code, 410)
+
+    def test_bulk_import_is_logged_and_log_is_pruned(self):
+        version = current_version()
+        text = 'name,employee__username\nКафе Волна,other\nАптека Кедр,field\n'
+        import_clients(read_client_rows(io.BytesIO(text.encode()), 'csv'))
+        data = self.changes(version).json()
+        self.assertEqual([client[1] for client in data['upserts']], ['Аптека Кедр'])
+        self.assertEqual(data['deletes'], [self.wave.pk])
+
+        ClientChange.objects.update(changed_at=timezone.now() - timedelta(days=100))
+        logged = ClientChange.objects.count()
+        # Последняя запись остается: по ней определяется текущая версия
+        self.assertEqual(prune_changes(), logged - 1)
+        self.assertEqual(ClientChange.objects.count(), 1)
+        self.assertEqual(self.changes(version).status_code, 410)
+        self.assertEqual(self.changes(current_version()).status_code, 200)
@@ -1,20 +1,70 @@
 from django.http import JsonResponse
 from django.views import View
-from clients.models import Client
-from django.db.models import Q
-import re
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
+from .search import SCOPE_ALL, SCOPE_OWN, SEARCH_SCOPES, find_clients
 
 
 class ClientSearchView(View):
+    """
+    Поиск клиента для формы анкеты.
+
+    По умолчанию (``scope=own``) ищет среди клиентов, закрепленных за
+    текущим пользователем; ``scope=all`` — среди всех клиентов.
+    """
+
     def get(self, request):
-        query = request.GET.get('q', '')
-        if len(query) < 2:
-            return JsonResponse([], safe=False)
-        
-        # Using icontains for case-insensitive substring search - more reliable for Cyrillic
-        clients = Client.objects.filter(
-            name__icontains=query
-        ).distinct()[:20]
-        
-        data = [{'id': c.id, 'name': c.name} for c in clients]
-        return JsonResponse(data, safe=False)
\ No newline at end of file
+        scope = request.GET.get('scope', SCOPE_OWN)
+        if scope not in SEARCH_SCOPES:
+            return JsonResponse({'error': 'Неизвестная область поиска'}, status=400)
+        if scope == SCOPE_ALL:
+            clients = find_clients(request.GET.get('q', ''))
+        elif request.user.is_authenticated:
+            clients = find_clients(request.GET.get('q', ''), employee_id=request.user.pk)
+        else:
+            clients = []
+        data = [{'id': client.id, 'name': client.name} for client in clients]
+        return JsonResponse(data, safe=False)
+
+
+def _sync_etag(request):
+    if not request.user.is_authenticated:
+        return None
+    from .sync import current_version
+    return f'{request.user.pk}:{current_version()}'
+
+
+@gzip_page
+@condition(etag_func=_sync_etag)
+def client_snapshot(request):
+    """
+    Снимок клиентов текущего сотрудника для офлайн-поиска на устройстве.
+
+    Ответ сжимается gzip; повторный запрос с ``If-None-Match`` получает 304,
+    пока справочник не изменился. Дальше устройство запрашивает
+    ``client_changes`` с версией снимка.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Требуется вход'}, status=401)
+    from .sync import snapshot
+    return JsonResponse(snapshot(request.user.pk))
+
+
+@gzip_page
+def client_changes(request):
+    """
+    Изменения клиентов текущего сотрудника после версии ``since``.
+
+    410 — версия устройства старше журнала изменений, нужен новый снимок.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Требуется вход'}, status=401)
+    from .sync import SyncExpired, changes_since
+    try:
+        since = int(request.GET.get('since', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Укажите версию since'}, status=400)
+    try:
+        return JsonResponse(changes_since(request.user.pk, since))
+    except SyncExpired:
+        return JsonResponse({'error': 'Версия устарела, загрузите снимок заново'}, status=410)
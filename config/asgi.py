@@ -3,6 +3,16 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The live feed of the survey answers page (``tasks.live``) needs this entry
+point; ``runserver`` and ``config.wsgi`` serve that page with polling. Run an
+ASGI server with a single worker process, since the feed is kept in process
+memory, for example::
+
+    uvicorn config.asgi:application --workers 1
+
+or ``daphne config.asgi:application``. The server is not a dependency of the
+project and has to be installed alongside it.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -15,6 +15,7 @@ urlpatterns = [
     path('users/', include('users.urls')),
     path('tasks/', include('tasks.urls')),
     path('api/clients/search/', include('clients.urls')),
+    path('api/clients/', include('clients.sync_urls')),
     path('clients/', include('clients.urls')),
     path('reports/', include('reports.urls')),  # Убедитесь, что эта строка есть
 ]
@@ -15,6 +15,7 @@ from django.core.paginator import Paginator
 import json
 
 # from .models import TaskStatistics
+from .models import ReportJob, ReportJobKind
 from tasks.models import Task, SurveyAnswer, SurveyQuestion, PhotoReport, PhotoReportItem
 from users.models import CustomUser
 from clients.models import Client, ClientGroup
@@ -112,6 +113,33 @@ from clients.models import Client, ClientGroup
 #     photo_gallery_display.short_description = _('Фотогалерея')
 #     photo_gallery_display.allow_tags = True
 
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    """
+    Background report jobs.
+
+    Read-only: jobs are started from the changelist (statistics) or the
+    survey answers page (exports) and run by ``run_report_jobs``.
+    """
+    
+    list_display = ('__str__', 'kind', 'status', 'done', 'total', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    list_select_related = ('created_by',)
+    
+    change_list_template = 'admin/reports/reportjob/change_list.html'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def changelist_view(self, request, extra_context=None):
+        """Adds the latest statistics generation job for the progress block."""
+        extra_context = extra_context or {}
+        extra_context['statistics_job'] = ReportJob.objects.filter(kind=ReportJobKind.STATISTICS).first()
+        return super().changelist_view(request, extra_context=extra_context)
+
 # Дополнительные админ-классы для прямого просмотра результатов
 
 class SurveyAnswerInline(admin.TabularInline):
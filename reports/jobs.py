@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Background report jobs.
+
+Long-running report work (statistics generation) is not done inside a
+request: the view enqueues a ``ReportJob`` and the ``run_report_jobs``
+management command executes it in chunks, storing progress on the job row.
+Enqueueing a job that is already pending or running with the same
+parameters returns the existing job instead of starting a second one.
+
+Export jobs write the survey answers of a task as xlsx, csv or gzip'd csv,
+one row per answer or pivoted to one row per submission, to the default
+storage (under MEDIA_ROOT) and keep the file for
+``EXPORT_TTL``. A repeated export request reuses a finished file while it
+has not expired and the task got no new submissions or photos since.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import tempfile
+import traceback
+from datetime import timedelta
+
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+
+from tasks.exports import (
+    EXPORT_LAYOUTS, XLSX_CONTENT_TYPE, export_row_count, write_answers_csv, write_answers_workbook,
+)
+from tasks.models import SurveyAnswerPhoto, SurveySubmission, Task
+from .models import ReportJob, ReportJobKind, ReportJobStatus, ACTIVE_JOB_STATUSES
+from .services import StatisticsGenerator, statistics_tasks
+
+logger = logging.getLogger(__name__)
+
+JOB_CHUNK_SIZE = 100
+# Задача без обновлений дольше этого срока считается брошенной (воркер упал).
+STALE_JOB_TIMEOUT = timedelta(minutes=15)
+EXPORT_TTL = timedelta(hours=24)
+
+# Формат выгрузки -> (расширение файла, Content-Type)
+EXPORT_FORMATS = {
+    'xlsx': ('xlsx', XLSX_CONTENT_TYPE),
+    'csv': ('csv', 'text/csv; charset=utf-8'),
+    'csv.gz': ('csv.gz', 'application/gzip'),
+}
+
+
+def params_hash(params):
+    """Хэш параметров задачи, не зависящий от порядка ключей."""
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def fail_stale_jobs(kind, digest):
+    """Помечает ошибочными выполняющиеся задачи, которые давно не обновлялись."""
+    now = timezone.now()
+    return ReportJob.objects.filter(
+        kind=kind,
+        params_hash=digest,
+        status=ReportJobStatus.RUNNING,
+        updated_at__lt=now - STALE_JOB_TIMEOUT,
+    ).update(status=ReportJobStatus.FAILED, error='Задача прервана', finished_at=now, updated_at=now)
+
+
+def enqueue_job(kind, params=None, user=None):
+    """
+    Ставит задачу в очередь или возвращает уже активную.
+
+    Returns
+    -------
+    tuple[ReportJob, bool]
+        Задача и признак того, что она создана этим вызовом.
+    """
+    params = params or {}
+    digest = params_hash(params)
+    fail_stale_jobs(kind, digest)
+
+    active = ReportJob.objects.filter(kind=kind, params_hash=digest, status__in=ACTIVE_JOB_STATUSES)
+    job = active.first()
+    if job is not None:
+        return job, False
+    try:
+        with transaction.atomic():
+            return ReportJob.objects.create(kind=kind, params=params, params_hash=digest, created_by=user), True
+    except IntegrityError:
+        # Параллельный запрос успел создать задачу раньше
+        return active.get(), False
+
+
+def claim_next_job():
+    """
+    Забирает самую старую задачу из очереди.
+
+    Статус меняется условным UPDATE, поэтому одну задачу не заберут
+    два воркера.
+    """
+    for job in ReportJob.objects.filter(status=ReportJobStatus.PENDING).order_by('created_at', 'id')[:10]:
+        now = timezone.now()
+        claimed = ReportJob.objects.filter(pk=job.pk, status=ReportJobStatus.PENDING).update(
+            status=ReportJobStatus.RUNNING, started_at=now, updated_at=now
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def set_total(job, total):
+    """Сохраняет общий объем работы."""
+    job.total = total
+    job.updated_at = timezone.now()
+    job.save(update_fields=['total', 'updated_at'])
+
+
+def advance(job, count):
+    """Отмечает выполнение еще ``count`` единиц работы."""
+    now = timezone.now()
+    ReportJob.objects.filter(pk=job.pk).update(done=F('done') + count, updated_at=now)
+    job.done += count
+    job.updated_at = now
+
+
+def run_job(job):
+    """
+    Выполняет захваченную задачу и сохраняет итоговый статус.
+
+    Итог пишется условным UPDATE: если задачу, пока она выполнялась, сочли
+    брошенной (``fail_stale_jobs``), ее статус не перезаписывается.
+    """
+    handler = JOB_HANDLERS[job.kind]
+    try:
+        handler(job)
+    except Exception:
+        logger.exception('Report job %s failed', job.pk)
+        status = ReportJobStatus.FAILED
+        error = traceback.format_exc()
+    else:
+        status = ReportJobStatus.DONE
+        error = ''
+    now = timezone.now()
+    finished = ReportJob.objects.filter(pk=job.pk, status=ReportJobStatus.RUNNING).update(
+        status=status, error=error, finished_at=now, updated_at=now
+    )
+    if not finished:
+        logger.warning('Report job %s was no longer running when it finished', job.pk)
+    job.refresh_from_db()
+    return job
+
+
+def job_progress(job):
+    """
+    Состояние задачи для JSON-эндпоинта.
+
+    ``eta`` считается по средней скорости с момента запуска.
+    """
+    now = job.finished_at or timezone.now()
+    elapsed = (now - job.started_at).total_seconds() if job.started_at else 0.0
+    eta = None
+    if job.status == ReportJobStatus.RUNNING and job.done and job.total:
+        eta = elapsed / job.done * (job.total - job.done)
+    has_file = bool(job.file) and job.expires_at is not None and job.expires_at > timezone.now()
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'total': job.total,
+        'done': job.done,
+        'percent': round(job.done / job.total * 100, 1) if job.total else 0.0,
+        'elapsed': round(elapsed, 1),
+        'eta': round(eta, 1) if eta is not None else None,
+        'error': job.error,
+        'is_active': job.is_active,
+        'download_url': reverse('reports:job_download', args=[job.pk]) if has_file else None,
+        'expires_at': job.expires_at.isoformat() if has_file else None,
+    }
+
+
+def run_statistics_job(job):
+    """Генерирует статистику завершенных задач частями по ``JOB_CHUNK_SIZE``."""
+    task_ids = list(statistics_tasks().values_list('id', flat=True))
+    set_total(job, len(task_ids))
+    for start in range(0, len(task_ids), JOB_CHUNK_SIZE):
+        chunk = task_ids[start:start + JOB_CHUNK_SIZE]
+        StatisticsGenerator.generate_all_statistics(
+            tasks=Task.objects.filter(id__in=chunk).select_related('client', 'assigned_to', 'created_by')
+        )
+        advance(job, len(chunk))
+
+
+def find_fresh_export(params):
+    """
+    Готовая выгрузка с теми же параметрами, которую можно отдать повторно.
+
+    Файл не должен истечь, а у задачи не должно появиться анкет или фото
+    после запуска выгрузки.
+    """
+    job = (
+        ReportJob.objects
+        .filter(
+            kind=ReportJobKind.EXPORT,
+            params_hash=params_hash(params),
+            status=ReportJobStatus.DONE,
+            expires_at__gt=timezone.now(),
+        )
+        .exclude(file='')
+        .order_by('-started_at')
+        .first()
+    )
+    if job is None:
+        return None
+    task_id = params['task']
+    if SurveySubmission.objects.filter(task_id=task_id, created_at__gte=job.started_at).exists():
+        return None
+    if SurveyAnswerPhoto.objects.filter(answer__question__task_id=task_id, created_at__gte=job.started_at).exists():
+        return None
+    return job
+
+
+def request_export(task_id, export_format, user=None, layout='answers'):
+    """
+    Ставит в очередь выгрузку ответов задачи или возвращает готовую/активную.
+
+    ``layout`` — вид таблицы из ``tasks.exports.EXPORT_LAYOUTS``.
+
+    Returns
+    -------
+    tuple[ReportJob, bool]
+        Задача и признак того, что она создана этим вызовом.
+    """
+    params = {'task': task_id, 'format': export_format, 'layout': layout}
+    job = find_fresh_export(params)
+    if job is not None:
+        return job, False
+    return enqueue_job(ReportJobKind.EXPORT, params, user=user)
+
+
+def export_filename(job, task):
+    """Имя файла выгрузки для скачивания."""
+    extension = EXPORT_FORMATS[job.params['format']][0]
+    day = timezone.localtime(job.started_at).strftime('%Y%m%d')
+    prefix = 'survey_pivot' if job.params.get('layout') == 'pivot' else 'survey_answers'
+    return f'{prefix}_{task.title.replace(" ", "_")}_{day}.{extension}'
+
+
+def run_export_job(job):
+    """Пишет ответы задачи во временный файл и сохраняет его в хранилище."""
+    task = Task.objects.get(pk=job.params['task'])
+    export_format = job.params['format']
+    layout = job.params.get('layout', 'answers')
+    set_total(job, export_row_count(task, layout))
+
+    def progress(count):
+        advance(job, count)
+
+    with tempfile.TemporaryFile() as file:
+        if export_format == 'xlsx':
+            write_answers_workbook(task, file, progress=progress, layout=layout)
+        elif export_format == 'csv':
+            write_answers_csv(task, file, progress=progress, layout=layout)
+        else:
+            with gzip.GzipFile(fileobj=file, mode='wb') as compressed:
+                write_answers_csv(task, compressed, progress=progress, layout=layout)
+        file.seek(0)
+        extension = EXPORT_FORMATS[export_format][0]
+        job.file.save(f'survey_answers_{task.pk}_{job.pk}.{extension}', File(file), save=False)
+    job.expires_at = timezone.now() + EXPORT_TTL
+    job.save(update_fields=['file', 'expires_at'])
+
+
+def purge_expired_exports():
+    """Удаляет файлы истекших выгрузок; возвращает их количество."""
+    expired = ReportJob.objects.filter(kind=ReportJobKind.EXPORT, expires_at__lte=timezone.now()).exclude(file='')
+    count = 0
+    for job in expired:
+        job.file.delete(save=False)
+        job.save(update_fields=['file'])
+        count += 1
+    return count
+
+
+JOB_HANDLERS = {
+    ReportJobKind.STATISTICS: run_statistics_job,
+    ReportJobKind.EXPORT: run_export_job,
+}
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from reports.services import SubmissionRollups
+import time
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily submission rollups from survey answers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', help='First day to rebuild (YYYY-MM-DD), default: all history')
+        parser.add_argument('--date-to', help='Last day to rebuild (YYYY-MM-DD), default: all history')
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ('date_from', 'date_to'):
+            value = options[name]
+            if value and parse_date(value) is None:
+                raise CommandError(f'Invalid date: {value}')
+            dates[name] = parse_date(value) if value else None
+
+        self.stdout.write('Rebuilding daily submission rollups...')
+        start_time = time.time()
+        rows = SubmissionRollups.backfill(**dates)
+        end_time = time.time()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Wrote {rows} rollup rows in {end_time - start_time:.2f} seconds')
+        )
@@ -0,0 +1,182 @@
+from collections import defaultdict
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from clients.models import Client
+from reports.services import StatisticsGenerator
+from tasks.models import Task, TaskType, TaskStatus, SurveyQuestion, SurveyQuestionChoice, SurveyAnswer
+from users.models import CustomUser, UserRoles
+import json
+import random
+import time
+
+QUESTION_TYPES = ['RADIO', 'CHECKBOX', 'SELECT_SINGLE', 'SELECT_MULTIPLE', 'RADIO', 'CHECKBOX',
+                  'SELECT_MULTIPLE', 'TEXT', 'TEXT_SHORT', 'PHOTO']
+
+
+class Rollback(Exception):
+    """Raised to discard benchmark data."""
+
+
+class QueryCounter:
+    """Counts executed queries without keeping them (the legacy run makes hundreds of thousands)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def legacy_generate_survey_statistics(task):
+    """
+    Previous per-answer implementation, kept for comparison.
+
+    Non-numeric values are not looked up as choice ids (the original crashed on them).
+    """
+    stats = {}
+    total_responses = 0
+
+    for question in task.questions.all():
+        question_stats = {
+            'question_text': question.question_text,
+            'question_type': question.question_type,
+            'answers': defaultdict(int),
+            'total': 0
+        }
+
+        answers = SurveyAnswer.objects.filter(question=question)
+        question_stats['total'] = answers.count()
+        total_responses = max(total_responses, question_stats['total'])
+
+        for answer in answers:
+            if question.question_type in ['RADIO', 'CHECKBOX', 'SELECT_SINGLE', 'SELECT_MULTIPLE']:
+                if answer.selected_choices.exists():
+                    for choice in answer.selected_choices.all():
+                        question_stats['answers'][choice.choice_text] += 1
+                elif answer.text_answer:
+                    if question.question_type in ['SELECT_SINGLE', 'SELECT_MULTIPLE']:
+                        if question.question_type == 'SELECT_MULTIPLE':
+                            selected = [item.strip() for item in answer.text_answer.split(',')]
+                            for item in selected:
+                                choice = question.choices.filter(id=item).first() if item.isdigit() else None
+                                if choice:
+                                    question_stats['answers'][choice.choice_text] += 1
+                                else:
+                                    question_stats['answers'][item] += 1
+                        else:
+                            text = answer.text_answer
+                            choice = question.choices.filter(id=text).first() if text.isdigit() else None
+                            if choice:
+                                question_stats['answers'][choice.choice_text] += 1
+                            else:
+                                question_stats['answers'][answer.text_answer] += 1
+                    elif question.question_type in ['RADIO', 'CHECKBOX']:
+                        if question.question_type == 'RADIO':
+                            question_stats['answers'][answer.text_answer] += 1
+                        else:
+                            selected = [item.strip() for item in answer.text_answer.split(',')]
+                            for item in selected:
+                                question_stats['answers'][item] += 1
+            elif question.question_type in ['TEXT', 'TEXT_SHORT', 'TEXTAREA']:
+                question_stats['answers']['Текстовые ответы'] += 1
+            elif question.question_type == 'PHOTO':
+                question_stats['answers']['Фотоответы'] += 1
+
+        stats[str(question.id)] = question_stats
+
+    return stats, total_responses
+
+
+class Command(BaseCommand):
+    help = 'Benchmark survey statistics generation: per-answer vs set-based implementation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--answers', type=int, default=100000, help='Number of answers to generate')
+        parser.add_argument('--skip-legacy', action='store_true',
+                            help='Do not run the per-answer implementation (it is slow)')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['answers'], options['skip_legacy'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, answer_count, skip_legacy):
+        task = self.create_survey(answer_count)
+
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            started = time.perf_counter()
+            stats, total = StatisticsGenerator.generate_survey_statistics(task)
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f'set-based:  {elapsed:8.2f} s, {queries.count} queries')
+
+        if skip_legacy:
+            return
+
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            started = time.perf_counter()
+            legacy_stats, legacy_total = legacy_generate_survey_statistics(task)
+            legacy_elapsed = time.perf_counter() - started
+        self.stdout.write(f'per-answer: {legacy_elapsed:8.2f} s, {queries.count} queries')
+        self.stdout.write(f'speedup:    {legacy_elapsed / elapsed:8.1f}x')
+
+        if (json.loads(json.dumps(stats)), total) != (json.loads(json.dumps(legacy_stats)), legacy_total):
+            raise CommandError('Set-based statistics differ from the per-answer implementation')
+        self.stdout.write(self.style.SUCCESS('Outputs are identical'))
+
+    def create_survey(self, answer_count):
+        """Creates a throwaway survey with `answer_count` answers spread over its questions."""
+        random.seed(0)
+        suffix = time.time_ns()
+        employee = CustomUser.objects.create(username=f'employee_bench_{suffix}', role=UserRoles.EMPLOYEE)
+        client = Client.objects.create(name=f'Client bench {suffix}')
+        task = Task.objects.create(
+            title=f'Benchmark {suffix}', task_type=TaskType.SURVEY, status=TaskStatus.COMPLETED, client=client
+        )
+
+        questions = SurveyQuestion.objects.bulk_create([
+            SurveyQuestion(task=task, question_text=f'Вопрос {order}', question_type=question_type, order=order)
+            for order, question_type in enumerate(QUESTION_TYPES)
+        ])
+        # Половина вопросов с выбором — с вариантами, остальные отвечают "да"/"нет" текстом
+        choices = {}
+        for question in questions[:4]:
+            choices[question.id] = [
+                choice.id for choice in SurveyQuestionChoice.objects.bulk_create([
+                    SurveyQuestionChoice(question=question, choice_text=f'Вариант {i}', order=i)
+                    for i in range(4)
+                ])
+            ]
+
+        answers = []
+        for number in range(answer_count):
+            question = questions[number % len(questions)]
+            answer = SurveyAnswer(question=question, user=employee, client=client)
+            choice_ids = choices.get(question.id)
+            if question.question_type == 'SELECT_SINGLE':
+                answer.text_answer = str(random.choice(choice_ids))
+            elif question.question_type == 'SELECT_MULTIPLE':
+                if choice_ids:
+                    answer.text_answer = ', '.join(str(i) for i in random.sample(choice_ids, 2))
+                else:
+                    answer.text_answer = random.choice(['да', 'нет', 'да, нет'])
+            elif question.question_type in ('RADIO', 'CHECKBOX') and not choice_ids:
+                answer.text_answer = random.choice(['да', 'нет', 'да, нет'])
+            elif question.question_type in ('TEXT', 'TEXT_SHORT'):
+                answer.text_answer = f'ответ {number}'
+            answers.append(answer)
+        answers = SurveyAnswer.objects.bulk_create(answers, batch_size=5000)
+
+        through = SurveyAnswer.selected_choices.through
+        through.objects.bulk_create([
+            through(surveyanswer_id=answer.pk, surveyquestionchoice_id=choice_id)
+            for answer in answers
+            if answer.question.question_type in ('RADIO', 'CHECKBOX') and answer.question_id in choices
+            for choice_id in random.sample(choices[answer.question_id], 1 if answer.question.question_type == 'RADIO' else 2)
+        ], batch_size=5000)
+        return task
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+from reports.services import StatisticsGenerator, STATISTICS_BATCH_SIZE, statistics_tasks
+import multiprocessing
+import time
+
+
+def init_worker():
+    """Worker processes open their own database connections."""
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def compute_batch(task_ids):
+    return StatisticsGenerator.compute_statistics(task_ids)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild task statistics and survey counters from scratch (repair only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--task', type=int, nargs='+', dest='task_ids', help='Rebuild only these task ids')
+        parser.add_argument('--all-tasks', action='store_true',
+                            help='Also rebuild survey counters of tasks that are not completed '
+                                 '(task statistics rows are written for completed tasks only)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of worker processes computing statistics')
+        parser.add_argument('--batch-size', type=int, default=STATISTICS_BATCH_SIZE,
+                            help='Tasks per worker batch')
+
+    def handle(self, *args, **options):
+        tasks = statistics_tasks(all_tasks=options['all_tasks'])
+        if options['task_ids']:
+            tasks = tasks.filter(id__in=options['task_ids'])
+
+        task_ids = list(tasks.values_list('id', flat=True))
+        batch_size = options['batch_size']
+        batches = [task_ids[i:i + batch_size] for i in range(0, len(task_ids), batch_size)]
+        workers = max(1, min(options['workers'], len(batches)))
+
+        self.stdout.write(f'Rebuilding statistics for {len(task_ids)} tasks with {workers} workers...')
+
+        start_time = time.time()
+        done = answers = 0
+        if workers == 1:
+            results = map(compute_batch, batches)
+            pool = None
+        else:
+            # Соединения родителя не должны наследоваться дочерними процессами
+            connections.close_all()
+            pool = multiprocessing.Pool(workers, initializer=init_worker)
+            results = pool.imap_unordered(compute_batch, batches)
+
+        try:
+            # Воркеры только читают; запись выполняет родитель пакетами
+            for result in results:
+                StatisticsGenerator.save_statistics(result)
+                done += len(result)
+                answers += sum(item['answers'] for item in result.values())
+                self.stdout.write(f'Rebuilt {done} of {len(task_ids)} tasks')
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        elapsed = max(time.time() - start_time, 1e-9)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Rebuilt statistics for {done} tasks in {elapsed:.2f} seconds '
+                f'({done / elapsed:.1f} tasks/s, {answers / elapsed:.1f} answers/s)'
+            )
+        )
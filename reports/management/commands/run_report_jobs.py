@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from reports.jobs import claim_next_job, purge_expired_exports, run_job
+from reports.models import ReportJobStatus
+import time
+
+
+class Command(BaseCommand):
+    help = 'Run queued report jobs (statistics generation, exports) in the background'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process queued jobs and exit')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds to wait between queue checks')
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_job()
+            if job is None:
+                purged = purge_expired_exports()
+                if purged:
+                    self.stdout.write(f'Removed {purged} expired export file(s)')
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'Running {job}...')
+            start_time = time.time()
+            run_job(job)
+            elapsed = time.time() - start_time
+
+            if job.status == ReportJobStatus.DONE:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Job #{job.pk}: {job.done} of {job.total} done in {elapsed:.2f} seconds'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f'Job #{job.pk} failed:\n{job.error}'))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0004_initial'),
+        ('tasks', '0009_alter_surveyanswerphoto_photo_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Всего ответов')),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='tasks.surveyquestion', verbose_name='Вопрос')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_statistics', to='tasks.task')),
+            ],
+            options={
+                'verbose_name': 'Статистика вопроса',
+                'verbose_name_plural': 'Статистика вопросов',
+            },
+        ),
+        migrations.CreateModel(
+            name='AnswerOptionStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=255, verbose_name='Значение')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='option_statistics', to='tasks.surveyquestion', verbose_name='Вопрос')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_option_statistics', to='tasks.task')),
+            ],
+            options={
+                'verbose_name': 'Статистика варианта ответа',
+                'verbose_name_plural': 'Статистика вариантов ответа',
+                'unique_together': {('question', 'label')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0005_questionstatistics_answeroptionstatistics'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('STATISTICS', 'Генерация статистики')], max_length=32, verbose_name='Вид')),
+                ('status', models.CharField(choices=[('PENDING', 'В очереди'), ('RUNNING', 'Выполняется'), ('DONE', 'Завершена'), ('FAILED', 'Ошибка')], default='PENDING', max_length=16, verbose_name='Статус')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='Параметры')),
+                ('params_hash', models.CharField(editable=False, max_length=64, verbose_name='Хэш параметров')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Всего')),
+                ('done', models.PositiveIntegerField(default=0, verbose_name='Выполнено')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Запущено')),
+                ('updated_at', models.DateTimeField(blank=True, null=True, verbose_name='Обновлено')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='report_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Создал')),
+            ],
+            options={
+                'verbose_name': 'Фоновая задача отчета',
+                'verbose_name_plural': 'Фоновые задачи отчетов',
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ('PENDING', 'RUNNING'))), fields=('kind', 'params_hash'), name='unique_active_report_job')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0003_client_trading_point_address_and_more'),
+        ('reports', '0006_reportjob'),
+        ('tasks', '0009_alter_surveyanswerphoto_photo_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySubmissionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('submissions', models.PositiveIntegerField(default=0, verbose_name='Анкет')),
+                ('answers', models.PositiveIntegerField(default=0, verbose_name='Ответов')),
+                ('photos', models.PositiveIntegerField(default=0, verbose_name='Фото')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='clients.client', verbose_name='Клиент')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='tasks.task')),
+            ],
+            options={
+                'verbose_name': 'Дневная сводка анкет',
+                'verbose_name_plural': 'Дневные сводки анкет',
+                'indexes': [models.Index(fields=['task', 'day'], name='reports_dai_task_id_2666a0_idx')],
+                'unique_together': {('day', 'task', 'client', 'employee')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0007_dailysubmissionrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Файл хранится до'),
+        ),
+        migrations.AddField(
+            model_name='reportjob',
+            name='file',
+            field=models.FileField(blank=True, upload_to='report_exports/', verbose_name='Файл'),
+        ),
+        migrations.AlterField(
+            model_name='reportjob',
+            name='kind',
+            field=models.CharField(choices=[('STATISTICS', 'Генерация статистики'), ('EXPORT', 'Выгрузка ответов')], max_length=32, verbose_name='Вид'),
+        ),
+    ]
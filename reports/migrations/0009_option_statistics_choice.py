@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_choices(apps, schema_editor):
+    """
+    Moves counters of choices from the choice text to the choice id.
+
+    A counter whose label is the text of one of its question's choices now
+    counts that choice; ``rebuild_statistics`` recounts everything exactly.
+    """
+    AnswerOptionStatistics = apps.get_model('reports', 'AnswerOptionStatistics')
+    SurveyQuestionChoice = apps.get_model('tasks', 'SurveyQuestionChoice')
+
+    choice_ids = {}
+    for choice_id, question_id, choice_text in (
+        SurveyQuestionChoice.objects.order_by('-id').values_list('id', 'question_id', 'choice_text')
+    ):
+        choice_ids[(question_id, choice_text)] = choice_id
+    linked = []
+    for option in AnswerOptionStatistics.objects.iterator():
+        choice_id = choice_ids.get((option.question_id, option.label))
+        if choice_id is not None:
+            option.choice_id = choice_id
+            option.label = ''
+            linked.append(option)
+    AnswerOptionStatistics.objects.bulk_update(linked, ['choice', 'label'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0008_report_job_file'),
+        ('tasks', '0012_data_version'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='answeroptionstatistics',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='answeroptionstatistics',
+            name='choice',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='option_statistics', to='tasks.surveyquestionchoice', verbose_name='Вариант'),
+        ),
+        migrations.AlterField(
+            model_name='answeroptionstatistics',
+            name='label',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Значение'),
+        ),
+        migrations.RunPython(link_choices, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='answeroptionstatistics',
+            constraint=models.UniqueConstraint(condition=models.Q(('choice__isnull', False)), fields=('question', 'choice'), name='unique_option_statistics_choice'),
+        ),
+        migrations.AddConstraint(
+            model_name='answeroptionstatistics',
+            constraint=models.UniqueConstraint(condition=models.Q(('choice__isnull', True)), fields=('question', 'label'), name='unique_option_statistics_label'),
+        ),
+    ]
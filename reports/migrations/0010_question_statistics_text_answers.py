@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:38
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_text_answers(apps, schema_editor):
+    """Fills the new counter of existing questions with one grouped query."""
+    QuestionStatistics = apps.get_model('reports', 'QuestionStatistics')
+    SurveyAnswer = apps.get_model('tasks', 'SurveyAnswer')
+
+    text_answers = dict(
+        SurveyAnswer.objects
+        .filter(text_answer__isnull=False)
+        .exclude(text_answer='')
+        .values_list('question_id')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    statistics = list(QuestionStatistics.objects.filter(question_id__in=text_answers))
+    for row in statistics:
+        row.text_answers = text_answers[row.question_id]
+    QuestionStatistics.objects.bulk_update(statistics, ['text_answers'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0009_option_statistics_choice'),
+        ('tasks', '0012_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionstatistics',
+            name='text_answers',
+            field=models.PositiveIntegerField(default=0, verbose_name='Непустых текстовых ответов'),
+        ),
+        migrations.RunPython(count_text_answers, migrations.RunPython.noop),
+    ]
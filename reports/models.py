@@ -8,7 +8,24 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 from users.models import CustomUser, UserRoles  # Исправленный импорт
 from clients.models import Client, ClientGroup
-from tasks.models import Task, TaskType
+from tasks.models import Task, TaskType, SurveyQuestion, SurveyQuestionChoice
+
+class ReportJobKind(models.TextChoices):
+    """Виды фоновых задач отчетов."""
+    STATISTICS = 'STATISTICS', _('Генерация статистики')
+    EXPORT = 'EXPORT', _('Выгрузка ответов')
+
+
+class ReportJobStatus(models.TextChoices):
+    """Статусы фоновых задач отчетов."""
+    PENDING = 'PENDING', _('В очереди')
+    RUNNING = 'RUNNING', _('Выполняется')
+    DONE = 'DONE', _('Завершена')
+    FAILED = 'FAILED', _('Ошибка')
+
+
+ACTIVE_JOB_STATUSES = (ReportJobStatus.PENDING, ReportJobStatus.RUNNING)
+
 
 class TaskStatistics(models.Model):
     """
@@ -67,3 +84,162 @@ class TaskStatistics(models.Model):
         verbose_name = _('Статистика задачи')
         verbose_name_plural = _('Статистика задач')
         unique_together = ('task', 'client', 'employee')
+
+
+
+class QuestionStatistics(models.Model):
+    """
+    Счетчик ответов на вопрос анкеты.
+
+    Обновляется приращениями при сохранении анкеты (см. ``reports.signals``),
+    полностью пересчитывается командой ``rebuild_statistics``.
+    """
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='question_statistics')
+    question = models.OneToOneField(
+        SurveyQuestion,
+        on_delete=models.CASCADE,
+        related_name='statistics',
+        verbose_name=_('Вопрос')
+    )
+    total = models.PositiveIntegerField(_('Всего ответов'), default=0)
+    text_answers = models.PositiveIntegerField(_('Непустых текстовых ответов'), default=0)
+
+    def __str__(self):
+        return f"{self.question} - {self.total}"
+
+    class Meta:
+        verbose_name = _('Статистика вопроса')
+        verbose_name_plural = _('Статистика вопросов')
+
+
+class AnswerOptionStatistics(models.Model):
+    """
+    Счетчик ответов с одним значением (вариантом) на вопрос анкеты.
+
+    Выбранный вариант учитывается по ``choice`` (текст варианта берется при
+    показе, поэтому переименование не сбрасывает счетчик), прочие значения —
+    по ``label``: значение из текстового ответа или
+    "Текстовые ответы"/"Фотоответы".
+    """
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='answer_option_statistics')
+    question = models.ForeignKey(
+        SurveyQuestion,
+        on_delete=models.CASCADE,
+        related_name='option_statistics',
+        verbose_name=_('Вопрос')
+    )
+    choice = models.ForeignKey(
+        SurveyQuestionChoice,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='option_statistics',
+        verbose_name=_('Вариант')
+    )
+    label = models.CharField(_('Значение'), max_length=255, blank=True)
+    count = models.PositiveIntegerField(_('Количество'), default=0)
+
+    def __str__(self):
+        return f"{self.label} - {self.count}"
+
+    class Meta:
+        verbose_name = _('Статистика варианта ответа')
+        verbose_name_plural = _('Статистика вариантов ответа')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['question', 'choice'],
+                condition=models.Q(choice__isnull=False),
+                name='unique_option_statistics_choice',
+            ),
+            models.UniqueConstraint(
+                fields=['question', 'label'],
+                condition=models.Q(choice__isnull=True),
+                name='unique_option_statistics_label',
+            ),
+        ]
+
+
+
+class DailySubmissionRollup(models.Model):
+    """
+    Дневная сводка отправленных анкет.
+
+    Одна строка на (день, задача, клиент, сотрудник). День — локальная дата
+    отправки анкеты; фото, добавленные позже, учитываются в дне анкеты.
+    Заполняется при сохранении анкет (см. ``reports.signals``), история —
+    командой ``backfill_rollups``.
+    """
+    day = models.DateField(_('День'))
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='daily_rollups')
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='daily_rollups', verbose_name=_('Клиент'))
+    employee = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name='daily_rollups', verbose_name=_('Сотрудник')
+    )
+    submissions = models.PositiveIntegerField(_('Анкет'), default=0)
+    answers = models.PositiveIntegerField(_('Ответов'), default=0)
+    photos = models.PositiveIntegerField(_('Фото'), default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.task_id}/{self.client_id}/{self.employee_id}: {self.submissions}"
+
+    class Meta:
+        verbose_name = _('Дневная сводка анкет')
+        verbose_name_plural = _('Дневные сводки анкет')
+        unique_together = ('day', 'task', 'client', 'employee')
+        # Уникальный индекс начинается с day и покрывает выборки по диапазону дат
+        indexes = [
+            models.Index(fields=['task', 'day']),
+        ]
+
+
+class ReportJob(models.Model):
+    """
+    Фоновая задача построения отчета.
+
+    Ставится в очередь из админки (см. ``reports.jobs``) и выполняется
+    по частям командой ``run_report_jobs``. Одновременно может быть только
+    одна активная задача одного вида с одинаковыми параметрами.
+    Выгрузки сохраняют результат в ``file`` до ``expires_at``.
+    """
+    kind = models.CharField(_('Вид'), max_length=32, choices=ReportJobKind.choices)
+    status = models.CharField(
+        _('Статус'), max_length=16, choices=ReportJobStatus.choices, default=ReportJobStatus.PENDING
+    )
+    params = models.JSONField(_('Параметры'), default=dict, blank=True)
+    params_hash = models.CharField(_('Хэш параметров'), max_length=64, editable=False)
+    total = models.PositiveIntegerField(_('Всего'), default=0)
+    done = models.PositiveIntegerField(_('Выполнено'), default=0)
+    error = models.TextField(_('Ошибка'), blank=True)
+    file = models.FileField(_('Файл'), upload_to='report_exports/', blank=True)
+    expires_at = models.DateTimeField(_('Файл хранится до'), null=True, blank=True)
+    created_by = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='report_jobs',
+        verbose_name=_('Создал')
+    )
+    created_at = models.DateTimeField(_('Создано'), auto_now_add=True)
+    started_at = models.DateTimeField(_('Запущено'), null=True, blank=True)
+    updated_at = models.DateTimeField(_('Обновлено'), null=True, blank=True)
+    finished_at = models.DateTimeField(_('Завершено'), null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def is_active(self):
+        return self.status in ACTIVE_JOB_STATUSES
+
+    class Meta:
+        verbose_name = _('Фоновая задача отчета')
+        verbose_name_plural = _('Фоновые задачи отчетов')
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'params_hash'],
+                condition=models.Q(status__in=ACTIVE_JOB_STATUSES),
+                name='unique_active_report_job',
+            ),
+        ]
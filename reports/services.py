@@ -12,77 +12,146 @@ This module provides business logic for generating and processing
 task statistics and analytics data.
 """
 
-from django.db.models import Count, Q
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Q
+from django.db.models.functions import Greatest, TruncDate
 from django.utils import timezone
 import json
-from collections import defaultdict
+import re
+from collections import Counter, defaultdict
+
+from tasks.aggregation import YES_NO_CHOICES, ChoiceCount, QuestionAggregate, SurveyAggregate, split_values
+from tasks.models import (
+    Task, TaskStatus, SurveyAnswer, SurveyAnswerPhoto, SurveyQuestion, SurveyQuestionChoice, SurveySubmission,
+    PhotoReport,
+)
+from tasks.schema import get_survey_schema
+from tasks.services import CHOICE_QUESTION_TYPES
+from .models import TaskStatistics, QuestionStatistics, AnswerOptionStatistics, DailySubmissionRollup
+
+LABEL_MAX_LENGTH = AnswerOptionStatistics._meta.get_field('label').max_length
+STATISTICS_BATCH_SIZE = 200
+
+
+def statistics_tasks(all_tasks=False):
+    """
+    Задачи, для которых строится ``TaskStatistics``.
+
+    Общий выбор для веб-задачи генерации, ``generate_all_statistics`` и
+    команды ``rebuild_statistics``: по умолчанию только завершенные задачи.
+
+    Parameters
+    ----------
+    all_tasks : bool
+        Все задачи (для пересчета счетчиков анкет незавершенных задач).
+    """
+    tasks = Task.objects.order_by('id')
+    if not all_tasks:
+        tasks = tasks.filter(status=TaskStatus.COMPLETED)
+    return tasks
+
+
+def answer_options(question, text_answer, selected_ids):
+    """
+    Значения одного ответа для счетчиков ``AnswerOptionStatistics``.
+
+    Используется и полным пересчетом (``StatisticsGenerator``), и
+    инкрементальным обновлением (``IncrementalStatistics``), поэтому оба
+    дают одинаковые счетчики. Варианты учитываются по id, чтобы счетчики не
+    зависели от текста варианта; остальные значения — по тексту.
+
+    Parameters
+    ----------
+    question : dict
+        Вопрос из скомпилированной схемы анкеты.
+    text_answer : str or None
+        Текстовый ответ.
+    selected_ids : list[int]
+        id выбранных вариантов.
+
+    Returns
+    -------
+    list[tuple]
+        ``(id варианта, '')`` или ``(None, значение)``.
+    """
+    question_type = question['question_type']
+    if question_type in CHOICE_QUESTION_TYPES:
+        if selected_ids:
+            return [(choice_id, '') for choice_id in selected_ids]
+        if not text_answer:
+            return []
+        choices = {str(choice['id']): choice['id'] for choice in question['choices']}
+
+        def option(item):
+            choice_id = choices.get(item)
+            return (choice_id, '') if choice_id is not None else (None, item[:LABEL_MAX_LENGTH])
+
+        if choices and question_type in ('SELECT_SINGLE', 'SELECT_MULTIPLE'):
+            # id вариантов: "3, 5" или, в старых ответах, "['3', '5']"
+            ids = list(dict.fromkeys(re.findall(r'\d+', text_answer)))
+            if ids:
+                return [option(item) for item in ids]
+        if question_type in ('RADIO', 'SELECT_SINGLE'):
+            return [(None, text_answer[:LABEL_MAX_LENGTH])]
+        items = dict.fromkeys(item.strip()[:LABEL_MAX_LENGTH] for item in text_answer.split(','))
+        return [(None, item) for item in items]
+    if question_type in ('TEXT', 'TEXT_SHORT', 'TEXTAREA'):
+        return [(None, 'Текстовые ответы')]
+    if question_type == 'PHOTO':
+        return [(None, 'Фотоответы')]
+    return []
+
+
+def survey_stats_from_counters(questions, totals, options):
+    """
+    Собирает ``survey_stats`` из счетчиков.
+
+    Тексты вариантов берутся из вопросов, поэтому переименованный вариант
+    сразу показывается под новым названием.
+
+    Parameters
+    ----------
+    questions : list[dict]
+        Вопросы в формате схемы анкеты, с вариантами.
+    totals : dict
+        id вопроса -> число ответов.
+    options : dict
+        id вопроса -> {(id варианта, значение): количество}.
+    """
+    survey_stats = {}
+    for question in questions:
+        choice_texts = {choice['id']: choice['choice_text'] for choice in question['choices']}
+        answers = {}
+        for (choice_id, label), count in options.get(question['id'], {}).items():
+            if choice_id is not None:
+                label = choice_texts.get(choice_id)
+                if label is None:
+                    continue
+            answers[label] = answers.get(label, 0) + count
+        survey_stats[str(question['id'])] = {
+            'question_text': question['question_text'],
+            'question_type': question['question_type'],
+            'answers': answers,
+            'total': totals.get(question['id'], 0),
+        }
+    return survey_stats
 
-from tasks.models import Task, SurveyAnswer, SurveyQuestion, PhotoReport
-from .models import TaskStatistics
 
 class StatisticsGenerator:
     """Service for generating task statistics."""
     
-    @staticmethod
-    def generate_survey_statistics(task):
-        """Generate statistics for survey tasks."""
-        stats = {}
-        total_responses = 0
-        
-        for question in task.questions.all():
-            question_stats = {
-                'question_text': question.question_text,
-                'question_type': question.question_type,
-                'answers': defaultdict(int),
-                'total': 0
-            }
-            
-            answers = SurveyAnswer.objects.filter(question=question)
-            question_stats['total'] = answers.count()
-            total_responses = max(total_responses, question_stats['total'])
-            
-            for answer in answers:
-                if question.question_type in ['RADIO', 'CHECKBOX', 'SELECT_SINGLE', 'SELECT_MULTIPLE']:
-                    # For RADIO and CHECKBOX with selected_choices
-                    if answer.selected_choices.exists():
-                        for choice in answer.selected_choices.all():
-                            question_stats['answers'][choice.choice_text] += 1
-                    # For SELECT_SINGLE and SELECT_MULTIPLE with text_answer
-                    elif answer.text_answer:
-                        if question.question_type in ['SELECT_SINGLE', 'SELECT_MULTIPLE']:
-                            # Handle comma-separated values for multiple selection
-                            if question.question_type == 'SELECT_MULTIPLE':
-                                selected = [item.strip() for item in answer.text_answer.split(',')]
-                                for item in selected:
-                                    # Try to find choice by ID first, otherwise use the text
-                                    choice = question.choices.filter(id=item).first()
-                                    if choice:
-                                        question_stats['answers'][choice.choice_text] += 1
-                                    else:
-                                        question_stats['answers'][item] += 1
-                            else:  # SELECT_SINGLE
-                                choice = question.choices.filter(id=answer.text_answer).first()
-                                if choice:
-                                    question_stats['answers'][choice.choice_text] += 1
-                                else:
-                                    question_stats['answers'][answer.text_answer] += 1
-                        elif question.question_type in ['RADIO', 'CHECKBOX']:
-                            # For RADIO and CHECKBOX without selected_choices, use text_answer
-                            if question.question_type == 'RADIO':
-                                question_stats['answers'][answer.text_answer] += 1
-                            else:  # CHECKBOX
-                                # Handle comma-separated values for checkbox
-                                selected = [item.strip() for item in answer.text_answer.split(',')]
-                                for item in selected:
-                                    question_stats['answers'][item] += 1
-                elif question.question_type in ['TEXT', 'TEXT_SHORT', 'TEXTAREA']:
-                    question_stats['answers']['Текстовые ответы'] += 1
-                elif question.question_type == 'PHOTO':
-                    question_stats['answers']['Фотоответы'] += 1
-            
-            stats[str(question.id)] = question_stats
-        
-        return stats, total_responses
+    @classmethod
+    def generate_survey_statistics(cls, task):
+        """
+        Generate statistics for survey tasks.
+
+        Returns
+        -------
+        tuple[dict, int]
+            ``survey_stats`` and total responses (see ``compute_statistics``).
+        """
+        result = cls.compute_statistics([task.id])[task.id]
+        return result['survey_stats'], result['total_responses']
     
     @staticmethod
     def generate_photo_statistics(task):
@@ -91,29 +160,553 @@ class StatisticsGenerator:
         total_responses = reports.count()
         return {}, total_responses
     
+    @staticmethod
+    def compute_statistics(task_ids):
+        """
+        Set-based statistics for a batch of tasks.
+
+        A fixed number of grouped queries per batch (independent of the
+        number of tasks, questions and answers) plus one pass over the
+        grouped rows. Safe to call from a worker process.
+
+        Returns
+        -------
+        dict
+            task id -> {'completed', 'client_id', 'employee_id', 'moderator_id',
+            'survey_stats', 'counters', 'total_responses', 'answers'};
+            ``counters`` — id вопроса -> (число ответов, число непустых
+            текстовых ответов, счетчики ``answer_options``).
+        """
+        results = {}
+        survey_ids = []
+        for task_id, task_type, status, client_id, employee_id, moderator_id in (
+            Task.objects.filter(id__in=task_ids)
+            .values_list('id', 'task_type', 'status', 'client_id', 'assigned_to_id', 'created_by_id')
+        ):
+            results[task_id] = {
+                'completed': status == TaskStatus.COMPLETED,
+                'client_id': client_id,
+                'employee_id': employee_id,
+                'moderator_id': moderator_id,
+                'survey_stats': {},
+                'counters': {},
+                'total_responses': 0,
+                'answers': 0,
+            }
+            if task_type == 'SURVEY':
+                survey_ids.append(task_id)
+
+        photo_ids = [task_id for task_id in results if task_id not in survey_ids]
+        for task_id, count in (
+            PhotoReport.objects.filter(task_id__in=photo_ids)
+            .values_list('task_id').annotate(count=Count('id')).order_by()
+        ):
+            results[task_id]['total_responses'] = count
+            results[task_id]['answers'] = count
+
+        if not survey_ids:
+            return results
+
+        questions = {}
+        for question_id, task_id, question_text, question_type in (
+            SurveyQuestion.objects.filter(task_id__in=survey_ids)
+            .order_by('task_id', 'order', 'id')
+            .values_list('id', 'task_id', 'question_text', 'question_type')
+        ):
+            questions[question_id] = {
+                'id': question_id,
+                'task_id': task_id,
+                'question_text': question_text,
+                'question_type': question_type,
+                'choices': [],
+            }
+        for choice_id, question_id, choice_text in (
+            SurveyQuestionChoice.objects.filter(question_id__in=questions)
+            .values_list('id', 'question_id', 'choice_text')
+        ):
+            questions[question_id]['choices'].append({'id': choice_id, 'choice_text': choice_text})
+
+        answers = SurveyAnswer.objects.filter(question_id__in=questions)
+        totals = {}
+        text_totals = {}
+        for question_id, total, text_total in (
+            answers.values_list('question_id')
+            .annotate(
+                total=Count('id'),
+                text_total=Count('id', filter=Q(text_answer__isnull=False) & ~Q(text_answer='')),
+            )
+            .order_by()
+        ):
+            totals[question_id] = total
+            text_totals[question_id] = text_total
+        options = defaultdict(Counter)
+
+        # Выбранные варианты: счетчик на каждый вариант
+        through = SurveyAnswer.selected_choices.through
+        for question_id, choice_id, count in (
+            through.objects.filter(surveyanswer__question_id__in=questions)
+            .values_list('surveyanswer__question_id', 'surveyquestionchoice_id')
+            .annotate(count=Count('id'))
+            .order_by()
+        ):
+            options[question_id][(choice_id, '')] += count
+
+        # Вопросы с выбором без выбранных вариантов: значения из текстового ответа
+        choice_question_ids = [
+            question_id for question_id, question in questions.items()
+            if question['question_type'] in CHOICE_QUESTION_TYPES
+        ]
+        has_selected = through.objects.filter(surveyanswer_id=OuterRef('pk'))
+        for question_id, text_answer, count in (
+            answers.filter(question_id__in=choice_question_ids, text_answer__isnull=False)
+            .exclude(text_answer='')
+            .exclude(Exists(has_selected))
+            .values_list('question_id', 'text_answer')
+            .annotate(count=Count('id'))
+            .order_by()
+        ):
+            for option in answer_options(questions[question_id], text_answer, []):
+                options[question_id][option] += count
+
+        questions_by_task = defaultdict(list)
+        for question_id, question in questions.items():
+            total = totals.get(question_id, 0)
+            if question['question_type'] not in CHOICE_QUESTION_TYPES and total:
+                # Текстовые и фотоответы считаются по одному на ответ
+                for option in answer_options(question, None, []):
+                    options[question_id][option] += total
+            questions_by_task[question['task_id']].append(question)
+
+            result = results[question['task_id']]
+            result['total_responses'] = max(result['total_responses'], total)
+            result['answers'] += total
+
+        for task_id, task_questions in questions_by_task.items():
+            result = results[task_id]
+            result['counters'] = {
+                question['id']: (
+                    totals.get(question['id'], 0), text_totals.get(question['id'], 0), dict(options[question['id']])
+                )
+                for question in task_questions
+            }
+            result['survey_stats'] = survey_stats_from_counters(task_questions, totals, options)
+        return results
+
+    @staticmethod
+    def save_statistics(results):
+        """
+        Writes ``compute_statistics`` results.
+
+        ``TaskStatistics`` rows are matched in memory by
+        (task, client, employee) — client and employee may be NULL, so a
+        database-level upsert on the unique key is not possible — and written
+        with one ``bulk_update`` and one ``bulk_create``; only completed tasks
+        get a row. Survey counters of every task of the batch are replaced
+        in bulk.
+        """
+        if not results:
+            return
+        now = timezone.now()
+        completed = {task_id: result for task_id, result in results.items() if result['completed']}
+        existing = {
+            (row.task_id, row.client_id, row.employee_id): row
+            for row in TaskStatistics.objects.filter(task_id__in=completed)
+        }
+        to_create, to_update = [], []
+        for task_id, result in completed.items():
+            key = (task_id, result['client_id'], result['employee_id'])
+            row = existing.get(key)
+            if row is None:
+                row = TaskStatistics(task_id=task_id, client_id=key[1], employee_id=key[2])
+                to_create.append(row)
+            else:
+                to_update.append(row)
+            row.moderator_id = result['moderator_id']
+            row.total_responses = result['total_responses']
+            row.completed_tasks = 1 if result['total_responses'] > 0 else 0
+            row.pending_tasks = 0
+            row.survey_stats = result['survey_stats']
+            row.last_updated = now
+
+        with transaction.atomic():
+            TaskStatistics.objects.bulk_update(
+                to_update,
+                ['moderator', 'total_responses', 'completed_tasks', 'pending_tasks', 'survey_stats', 'last_updated'],
+                batch_size=STATISTICS_BATCH_SIZE,
+            )
+            TaskStatistics.objects.bulk_create(to_create, batch_size=STATISTICS_BATCH_SIZE)
+            IncrementalStatistics.replace_counters({
+                task_id: result['counters'] for task_id, result in results.items()
+            })
+
     @classmethod
-    def generate_all_statistics(cls):
-        """Generate statistics for all tasks."""
-        tasks = Task.objects.filter(status='COMPLETED')
+    def generate_all_statistics(cls, tasks=None):
+        """
+        Generate statistics for all tasks.
+
+        Full rebuild from answers in batches of ``STATISTICS_BATCH_SIZE``
+        tasks (by default ``statistics_tasks()``); used only for repair
+        (``manage.py rebuild_statistics``). Day-to-day statistics are kept
+        up to date by ``IncrementalStatistics``.
+        """
+        if tasks is None:
+            tasks = statistics_tasks()
+        task_ids = list(tasks.order_by('id').values_list('id', flat=True))
         
-        for task in tasks:
-            if task.task_type == 'SURVEY':
-                survey_stats, total_responses = cls.generate_survey_statistics(task)
-                completed_tasks = 1 if total_responses > 0 else 0
+        for start in range(0, len(task_ids), STATISTICS_BATCH_SIZE):
+            batch = task_ids[start:start + STATISTICS_BATCH_SIZE]
+            cls.save_statistics(cls.compute_statistics(batch))
+
+
+class IncrementalStatistics:
+    """
+    Инкрементальное обновление и чтение статистики анкет.
+
+    Каждая сохраненная анкета добавляет приращения только к счетчикам своих
+    вопросов и вариантов (``QuestionStatistics``/``AnswerOptionStatistics``);
+    у завершенной задачи обновляется и ``TaskStatistics.total_responses``.
+    Счетчики вариантов хранятся по id варианта, а страницы результатов
+    читают их через ``survey_aggregate``/``build_survey_stats`` с текущими
+    текстами вариантов; ``TaskStatistics.survey_stats`` пишет только полный
+    пересчет. Удаленные ответы учитывает команда ``rebuild_statistics``.
+    """
+
+    @classmethod
+    def apply_submission(cls, task, answers, choice_ids):
+        """
+        Учитывает одну сохраненную анкету.
+
+        Parameters
+        ----------
+        task : Task
+        answers : list[SurveyAnswer]
+            Созданные ответы.
+        choice_ids : dict
+            pk ответа -> id выбранных вариантов.
+        """
+        schema = {question['id']: question for question in get_survey_schema(task.id)}
+
+        question_deltas = defaultdict(Counter)
+        option_deltas = Counter()
+        for answer in answers:
+            question = schema.get(answer.question_id)
+            if question is None:
+                continue
+            question_deltas[answer.question_id]['total'] += 1
+            if answer.text_answer:
+                question_deltas[answer.question_id]['text_answers'] += 1
+            for choice_id, label in answer_options(question, answer.text_answer, choice_ids.get(answer.pk, ())):
+                option_deltas[(answer.question_id, choice_id, label)] += 1
+
+        if not question_deltas:
+            return
+
+        with transaction.atomic():
+            QuestionStatistics.objects.bulk_create(
+                [QuestionStatistics(task_id=task.id, question_id=question_id) for question_id in question_deltas],
+                ignore_conflicts=True,
+            )
+            cls._increment(
+                QuestionStatistics.objects.filter(question_id__in=question_deltas),
+                {(question_id,): deltas for question_id, deltas in question_deltas.items()},
+                ('question_id',),
+            )
+
+            AnswerOptionStatistics.objects.bulk_create(
+                [
+                    AnswerOptionStatistics(task_id=task.id, question_id=question_id, choice_id=choice_id, label=label)
+                    for question_id, choice_id, label in option_deltas
+                ],
+                ignore_conflicts=True,
+            )
+            cls._increment(
+                AnswerOptionStatistics.objects.filter(
+                    question_id__in={question_id for question_id, _, _ in option_deltas}
+                ),
+                {key: {'count': delta} for key, delta in option_deltas.items()},
+                ('question_id', 'choice_id', 'label'),
+            )
+
+            # Как и полный пересчет, TaskStatistics ведется только для завершенных задач
+            if task.status == TaskStatus.COMPLETED:
+                cls._update_task_statistics(task)
+
+    @staticmethod
+    def _update_task_statistics(task):
+        """Поднимает ``total_responses`` завершенной задачи до счетчиков вопросов."""
+        # Каждая анкета отвечает на вопрос не больше одного раза
+        total_responses = (
+            QuestionStatistics.objects.filter(task_id=task.id).aggregate(total=Max('total'))['total'] or 0
+        )
+        statistics, created = TaskStatistics.objects.get_or_create(
+            task_id=task.id,
+            client_id=task.client_id,
+            employee_id=task.assigned_to_id,
+            defaults={
+                'moderator_id': task.created_by_id,
+                'total_responses': total_responses,
+                'completed_tasks': 1,
+            },
+        )
+        if not created:
+            TaskStatistics.objects.filter(pk=statistics.pk).update(
+                total_responses=Greatest(F('total_responses'), total_responses),
+                completed_tasks=1,
+                last_updated=timezone.now(),
+            )
+
+    @staticmethod
+    def _increment(queryset, deltas, key_fields):
+        """
+        Прибавляет приращения одним UPDATE на каждый различный набор приращений.
+
+        Parameters
+        ----------
+        deltas : dict
+            Ключ (значения ``key_fields``) -> {поле: приращение}.
+        """
+        by_delta = defaultdict(list)
+        for pk, *key in queryset.values_list('pk', *key_fields):
+            delta = deltas.get(tuple(key))
+            if delta:
+                by_delta[tuple(sorted(delta.items()))].append(pk)
+        for delta, pks in by_delta.items():
+            queryset.model.objects.filter(pk__in=pks).update(
+                **{field_name: F(field_name) + value for field_name, value in delta}
+            )
+
+    @staticmethod
+    def read_counters(task_id):
+        """
+        Счетчики анкеты двумя запросами.
+
+        Returns
+        -------
+        tuple[dict, dict, dict]
+            id вопроса -> число ответов, id вопроса -> число непустых
+            текстовых ответов, id вопроса -> {(id варианта, значение): количество}.
+        """
+        totals, text_totals = {}, {}
+        for question_id, total, text_answers in (
+            QuestionStatistics.objects.filter(task_id=task_id).values_list('question_id', 'total', 'text_answers')
+        ):
+            totals[question_id] = total
+            text_totals[question_id] = text_answers
+        options = defaultdict(dict)
+        for question_id, choice_id, label, count in (
+            AnswerOptionStatistics.objects
+            .filter(task_id=task_id, count__gt=0)
+            .order_by('id')
+            .values_list('question_id', 'choice_id', 'label', 'count')
+        ):
+            options[question_id][(choice_id, label)] = count
+        return totals, text_totals, options
+
+    @classmethod
+    def build_survey_stats(cls, task_id):
+        """
+        Собирает ``survey_stats`` задачи из счетчиков.
+
+        Returns
+        -------
+        dict
+            Формат ``StatisticsGenerator.generate_survey_statistics``.
+        """
+        totals, _, options = cls.read_counters(task_id)
+        return survey_stats_from_counters(get_survey_schema(task_id), totals, options)
+
+    @classmethod
+    def survey_aggregate(cls, task_id):
+        """
+        Сводка ответов по анкете из счетчиков.
+
+        Те же числа, что ``tasks.aggregation.aggregate_survey``, но
+        фиксированным числом запросов по счетчикам и дневной сводке
+        (уникальные клиенты), независимо от числа ответов.
+
+        Returns
+        -------
+        SurveyAggregate
+        """
+        schema = get_survey_schema(task_id)
+        result = SurveyAggregate(task_id=task_id)
+        result.questions = [QuestionAggregate(question=question) for question in schema]
+        if not schema:
+            return result
+
+        totals, text_totals, options = cls.read_counters(task_id)
+        for question in result.questions:
+            question.total_answers = totals.get(question.id, 0)
+            question.text_answers_count = text_totals.get(question.id, 0)
+            result.total_responses += question.total_answers
+            if not question.is_choice_question:
+                continue
+
+            question_options = options.get(question.id, {})
+            if question.has_custom_choices:
+                counts = Counter()
+                for (choice_id, _), count in question_options.items():
+                    if choice_id is not None:
+                        counts[choice_id] += count
+                question.choice_counts = [
+                    ChoiceCount(choice['id'], choice['choice_text'], counts[choice['id']], question.total_answers)
+                    for choice in question.question['choices']
+                ]
             else:
-                survey_stats, total_responses = cls.generate_photo_statistics(task)
-                completed_tasks = 1 if total_responses > 0 else 0
-            
-            # Update or create statistics record
-            TaskStatistics.objects.update_or_create(
-                task=task,
-                client=task.client,
-                employee=task.assigned_to,
-                moderator=task.created_by,
-                defaults={
-                    'total_responses': total_responses,
-                    'completed_tasks': completed_tasks,
-                    'pending_tasks': 0,
-                    'survey_stats': survey_stats
-                }
-            )
\ No newline at end of file
+                counts = Counter()
+                for (_, label), count in question_options.items():
+                    for value in split_values(label):
+                        counts[value] += count
+                question.choice_counts = [
+                    ChoiceCount(None, label, counts[value], question.total_answers)
+                    for value, label in YES_NO_CHOICES
+                ]
+
+        if result.total_responses:
+            result.unique_clients = (
+                DailySubmissionRollup.objects.filter(task_id=task_id).values('client_id').distinct().count()
+            )
+        return result
+
+    @staticmethod
+    def replace_counters(counters_by_task):
+        """
+        Заменяет счетчики задач значениями полного пересчета.
+
+        Parameters
+        ----------
+        counters_by_task : dict
+            id задачи -> ``counters`` из ``StatisticsGenerator.compute_statistics``
+            (задачи без анкеты — пустой словарь).
+        """
+        question_rows = []
+        option_rows = []
+        for task_id, counters in counters_by_task.items():
+            for question_id, (total, text_answers, options) in counters.items():
+                question_rows.append(QuestionStatistics(
+                    task_id=task_id, question_id=question_id, total=total, text_answers=text_answers
+                ))
+                option_rows.extend(
+                    AnswerOptionStatistics(
+                        task_id=task_id, question_id=question_id, choice_id=choice_id, label=label, count=count
+                    )
+                    for (choice_id, label), count in options.items()
+                )
+        with transaction.atomic():
+            QuestionStatistics.objects.filter(task_id__in=counters_by_task).delete()
+            AnswerOptionStatistics.objects.filter(task_id__in=counters_by_task).delete()
+            QuestionStatistics.objects.bulk_create(question_rows, batch_size=STATISTICS_BATCH_SIZE)
+            AnswerOptionStatistics.objects.bulk_create(option_rows, batch_size=STATISTICS_BATCH_SIZE)
+
+
+class SubmissionRollups:
+    """
+    Ведение ``DailySubmissionRollup``.
+
+    Новые анкеты и фото добавляются приращениями; история пересчитывается
+    ``backfill`` по сгруппированным анкетам, ответам и фото.
+    """
+
+    @staticmethod
+    def add(day, task_id, client_id, employee_id, submissions=0, answers=0, photos=0):
+        """Прибавляет значения к строке сводки, создавая ее при необходимости."""
+        DailySubmissionRollup.objects.bulk_create(
+            [DailySubmissionRollup(day=day, task_id=task_id, client_id=client_id, employee_id=employee_id)],
+            ignore_conflicts=True,
+        )
+        DailySubmissionRollup.objects.filter(
+            day=day, task_id=task_id, client_id=client_id, employee_id=employee_id
+        ).update(
+            submissions=F('submissions') + submissions,
+            answers=F('answers') + answers,
+            photos=F('photos') + photos,
+        )
+
+    @classmethod
+    def apply_submission(cls, task, user, client, answers, photos):
+        """Учитывает одну сохраненную анкету."""
+        if not answers:
+            return
+        cls.add(
+            timezone.localdate(answers[0].created_at), task.id, client.id, user.id,
+            submissions=1, answers=len(answers), photos=len(photos),
+        )
+
+    @classmethod
+    def apply_photo(cls, photo):
+        """Учитывает фото, добавленное к уже отправленной анкете."""
+        answer = SurveyAnswer.objects.select_related('question').get(pk=photo.answer_id)
+        cls.add(
+            timezone.localdate(answer.created_at), answer.question.task_id, answer.client_id, answer.user_id,
+            photos=1,
+        )
+
+    @staticmethod
+    def backfill(date_from=None, date_to=None, batch_size=1000):
+        """
+        Пересчитывает сводку за период (по умолчанию — за все время).
+
+        Анкеты считаются по ``SurveySubmission``, ответы и фото — по дню
+        создания ответа.
+
+        Returns
+        -------
+        int
+            Количество записанных строк сводки.
+        """
+        def in_range(queryset, prefix=''):
+            if date_from:
+                queryset = queryset.filter(**{f'{prefix}created_at__date__gte': date_from})
+            if date_to:
+                queryset = queryset.filter(**{f'{prefix}created_at__date__lte': date_to})
+            return queryset
+
+        rows = {}
+
+        def row_for(key):
+            day, task_id, client_id, employee_id = key
+            return rows.setdefault(
+                key, DailySubmissionRollup(day=day, task_id=task_id, client_id=client_id, employee_id=employee_id)
+            )
+
+        for day, task_id, client_id, employee_id, count in (
+            in_range(SurveySubmission.objects)
+            .annotate(day=TruncDate('created_at'))
+            .values_list('day', 'task_id', 'client_id', 'user_id')
+            .annotate(count=Count('id'))
+            .order_by()
+            .iterator()
+        ):
+            row_for((day, task_id, client_id, employee_id)).submissions = count
+
+        for day, task_id, client_id, employee_id, count in (
+            in_range(SurveyAnswer.objects)
+            .annotate(day=TruncDate('created_at'))
+            .values_list('day', 'question__task_id', 'client_id', 'user_id')
+            .annotate(count=Count('id'))
+            .order_by()
+            .iterator()
+        ):
+            row_for((day, task_id, client_id, employee_id)).answers = count
+
+        for day, task_id, client_id, employee_id, count in (
+            in_range(SurveyAnswerPhoto.objects, prefix='answer__')
+            .annotate(day=TruncDate('answer__created_at'))
+            .values_list('day', 'answer__question__task_id', 'answer__client_id', 'answer__user_id')
+            .annotate(count=Count('id'))
+            .order_by()
+            .iterator()
+        ):
+            row = rows.get((day, task_id, client_id, employee_id))
+            if row is not None:
+                row.photos = count
+
+        with transaction.atomic():
+            stale = DailySubmissionRollup.objects.all()
+            if date_from:
+                stale = stale.filter(day__gte=date_from)
+            if date_to:
+                stale = stale.filter(day__lte=date_to)
+            stale.delete()
+            DailySubmissionRollup.objects.bulk_create(rows.values(), batch_size=batch_size)
+        return len(rows)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Signal handlers for the reports app.
+
+Connected in ``ReportsConfig.ready``.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from tasks.models import SurveyAnswerPhoto
+from tasks.signals import survey_submitted
+from .services import IncrementalStatistics, SubmissionRollups
+
+
+@receiver(survey_submitted)
+def update_statistics_on_submit(sender, task, answers, choice_ids, **kwargs):
+    """
+    Обновляет статистику задачи после фиксации транзакции с ответами.
+
+    Ошибка обновления статистики не отменяет сохранение анкеты:
+    расхождение исправляется командой ``rebuild_statistics``.
+    """
+    transaction.on_commit(
+        lambda: IncrementalStatistics.apply_submission(task, answers, choice_ids),
+        robust=True,
+    )
+
+
+@receiver(survey_submitted)
+def update_rollup_on_submit(sender, task, user, client, answers, photos, **kwargs):
+    """Добавляет анкету в дневную сводку (расхождения исправляет ``backfill_rollups``)."""
+    transaction.on_commit(
+        lambda: SubmissionRollups.apply_submission(task, user, client, answers, photos),
+        robust=True,
+    )
+
+
+@receiver(post_save, sender=SurveyAnswerPhoto)
+def update_rollup_on_photo(sender, instance, created, **kwargs):
+    """Добавляет в дневную сводку фото, загруженное к отправленной анкете."""
+    if created:
+        transaction.on_commit(lambda: SubmissionRollups.apply_photo(instance), robust=True)
@@ -1,3 +1,435 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import shutil
+import tempfile
+from datetime import timedelta
+from multiprocessing.pool import ThreadPool
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import QueryDict
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from clients.models import Client
+from tasks import dashboard
+from tasks.forms import SurveyResponseForm
+from tasks.schema import invalidate_survey_schema
+from tasks.models import (
+    Task, TaskStatus, TaskType, SurveyAnswer, SurveyQuestion, SurveyQuestionChoice, SurveySubmission,
+)
+from users.models import CustomUser, UserRoles
+from . import jobs
+from .models import (
+    TaskStatistics, QuestionStatistics, AnswerOptionStatistics, ReportJob, ReportJobStatus, DailySubmissionRollup,
+)
+from .services import IncrementalStatistics, StatisticsGenerator, SubmissionRollups
+
+
+class IncrementalStatisticsTests(TestCase):
+    """Статистика, накопленная приращениями, совпадает с полным пересчетом."""
+
+    def setUp(self):
+        self.client_obj = Client.objects.create(name='Клиент')
+        self.employee = CustomUser.objects.create(username='employee', role=UserRoles.EMPLOYEE)
+        self.task = Task.objects.create(
+            title='Анкета', task_type=TaskType.SURVEY, status=TaskStatus.SENT, client=self.client_obj
+        )
+        self.radio = SurveyQuestion.objects.create(task=self.task, question_text='Радио', question_type='RADIO', order=0)
+        self.radio_choices = [
+            SurveyQuestionChoice.objects.create(question=self.radio, choice_text=f'Вариант {i}', order=i).id
+            for i in range(3)
+        ]
+        self.checkbox = SurveyQuestion.objects.create(
+            task=self.task, question_text='Флажки', question_type='CHECKBOX', order=1
+        )
+        self.select = SurveyQuestion.objects.create(
+            task=self.task, question_text='Список', question_type='SELECT_MULTIPLE', order=2
+        )
+        self.text = SurveyQuestion.objects.create(task=self.task, question_text='Текст', question_type='TEXT', order=3)
+
+    def submit(self, radio, checkbox, select, text):
+        form = SurveyResponseForm(self.task, self.employee, data={
+            f'question_{self.radio.id}': radio,
+            f'question_{self.checkbox.id}': checkbox,
+            f'question_{self.select.id}': select,
+            f'question_{self.text.id}': text,
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            form.save()
+
+    def counters(self):
+        return (
+            sorted(QuestionStatistics.objects.values_list('question_id', 'total', 'text_answers')),
+            sorted(
+                AnswerOptionStatistics.objects.filter(count__gt=0).values_list('question_id', 'choice_id', 'label', 'count'),
+                key=str,
+            ),
+        )
+
+    def complete_task(self):
+        self.task.status = TaskStatus.COMPLETED
+        self.task.save()
+
+    def test_incremental_matches_rebuild(self):
+        self.complete_task()
+        self.submit(self.radio_choices[0], ['да'], ['да', 'нет'], 'ответ')
+        self.submit(self.radio_choices[0], ['нет'], ['нет'], '')
+        self.submit(self.radio_choices[2], [], [], 'ещё')
+
+        statistics = TaskStatistics.objects.get(task=self.task)
+        self.assertEqual(statistics.total_responses, 3)
+        incremental = IncrementalStatistics.build_survey_stats(self.task.id)
+        radio_stats = incremental[str(self.radio.id)]
+        self.assertEqual(radio_stats['total'], 3)
+        self.assertEqual(radio_stats['answers'], {'Вариант 0': 2, 'Вариант 2': 1})
+        self.assertEqual(incremental[str(self.select.id)]['answers'], {'да': 1, 'нет': 2})
+
+        survey_stats, total_responses = StatisticsGenerator.generate_survey_statistics(self.task)
+        self.assertEqual(survey_stats, incremental)
+        self.assertEqual(total_responses, 3)
+        counters = self.counters()
+        StatisticsGenerator.generate_all_statistics(tasks=Task.objects.filter(pk=self.task.pk))
+        statistics.refresh_from_db()
+        self.assertEqual(statistics.survey_stats, incremental)
+        self.assertEqual(statistics.total_responses, 3)
+        self.assertEqual(counters, self.counters())
+
+    def test_in_progress_task_is_not_marked_completed(self):
+        self.submit(self.radio_choices[0], ['да'], ['да'], 'ответ')
+        self.submit(self.radio_choices[1], [], [], '')
+
+        # Счетчики анкеты ведутся, а TaskStatistics — только у завершенных задач
+        self.assertFalse(TaskStatistics.objects.filter(task=self.task).exists())
+        aggregate = IncrementalStatistics.survey_aggregate(self.task.id)
+        self.assertEqual(aggregate.get(self.radio.id).total_answers, 2)
+        self.assertEqual(aggregate.get(self.text.id).text_answers_count, 1)
+        StatisticsGenerator.generate_all_statistics()
+        self.assertFalse(TaskStatistics.objects.filter(task=self.task).exists())
+
+        self.complete_task()
+        self.submit(self.radio_choices[2], [], [], '')
+        statistics = TaskStatistics.objects.get(task=self.task)
+        self.assertEqual((statistics.completed_tasks, statistics.total_responses), (1, 3))
+
+    def test_submission_cost_does_not_grow_with_answers(self):
+        def apply_queries():
+            with self.captureOnCommitCallbacks(execute=False):
+                form = SurveyResponseForm(self.task, self.employee, data={
+                    f'question_{self.radio.id}': self.radio_choices[1],
+                    f'question_{self.select.id}': ['да'],
+                    f'question_{self.text.id}': 'ещё',
+                })
+                self.assertTrue(form.is_valid(), form.errors)
+                answers = form.save()
+            choice_ids = {answer.pk: [choice.pk for choice in answer.selected_choices.all()] for answer in answers}
+            with CaptureQueriesContext(connection) as queries:
+                IncrementalStatistics.apply_submission(self.task, answers, choice_ids)
+            return len(queries)
+
+        self.complete_task()
+        self.submit(self.radio_choices[0], ['да'], ['нет'], 'ответ')
+        first = apply_queries()
+        for _ in range(5):
+            self.submit(self.radio_choices[0], ['да'], ['нет'], 'ответ')
+        self.assertEqual(apply_queries(), first)
+        self.assertEqual(TaskStatistics.objects.get(task=self.task).total_responses, 8)
+        self.assertEqual(IncrementalStatistics.build_survey_stats(self.task.id)[str(self.radio.id)]['answers'], {
+            'Вариант 0': 6, 'Вариант 1': 2,
+        })
+
+    def test_renamed_choice_keeps_counter(self):
+        self.submit(self.radio_choices[1], [], [], '')
+        SurveyQuestionChoice.objects.filter(pk=self.radio_choices[1]).update(choice_text='Новое название')
+        invalidate_survey_schema(self.task.id)
+        self.submit(self.radio_choices[1], [], [], '')
+
+        survey_stats = IncrementalStatistics.build_survey_stats(self.task.id)
+        self.assertEqual(survey_stats[str(self.radio.id)]['answers'], {'Новое название': 2})
+        self.assertEqual(
+            StatisticsGenerator.generate_survey_statistics(self.task)[0][str(self.radio.id)]['answers'],
+            {'Новое название': 2},
+        )
+
+    def test_daily_rollup_matches_backfill(self):
+        self.submit(self.radio_choices[0], ['да'], ['да'], 'ответ')
+        self.submit(self.radio_choices[1], [], [], '')
+
+        fields = ('day', 'task_id', 'client_id', 'employee_id', 'submissions', 'answers', 'photos')
+        incremental = list(DailySubmissionRollup.objects.values_list(*fields))
+        today = timezone.localdate()
+        self.assertEqual(incremental, [(today, self.task.id, self.client_obj.id, self.employee.id, 2, 8, 0)])
+
+        self.assertEqual(SubmissionRollups.backfill(), 1)
+        self.assertEqual(list(DailySubmissionRollup.objects.values_list(*fields)), incremental)
+
+        filters = dashboard.normalize_filters(QueryDict(f'date_from={today}&date_to={today}'))
+        with self.assertNumQueries(1):
+            page = dashboard.get_survey_page(filters, self.task.id + 1, 10)
+        self.assertEqual(
+            [(row['id'], row['submissions'], row['total_answers'], row['unique_clients']) for row in page['results']],
+            [(self.task.id, 2, 8, 1)],
+        )
+        filters = dashboard.normalize_filters(QueryDict(f'date_to={today - timedelta(days=1)}'))
+        self.assertEqual(dashboard.get_survey_page(filters, None, 10)['results'], [])
+
+    def test_backfill_counts_submissions(self):
+        # Анкеты, в которых отвечены разные вопросы: по одному ответу на вопрос
+        for question in (self.radio, self.text):
+            submission = SurveySubmission.objects.create(
+                task=self.task, client=self.client_obj, user=self.employee
+            )
+            SurveyAnswer.objects.create(
+                question=question, user=self.employee, client=self.client_obj, submission=submission,
+                text_answer='ответ',
+            )
+
+        self.assertEqual(SubmissionRollups.backfill(), 1)
+        self.assertEqual(
+            list(DailySubmissionRollup.objects.values_list('submissions', 'answers', 'photos')), [(2, 2, 0)]
+        )
+
+    def test_statistics_not_updated_on_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.submit(self.radio_choices[1], [], [], 'ответ')
+                raise RuntimeError
+        self.assertEqual(callbacks, [])
+        self.assertFalse(TaskStatistics.objects.filter(task=self.task).exists())
+
+
+class StatisticsJobTests(TestCase):
+    """Фоновая генерация статистики: очередь, повторный запуск и прогресс."""
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser('admin', password='pass', role=UserRoles.MODERATOR)
+        self.client.force_login(self.admin)
+        for number in range(5):
+            Task.objects.create(title=f'Задача {number}', task_type=TaskType.SURVEY, status=TaskStatus.COMPLETED)
+
+    def test_retrigger_joins_active_job(self):
+        url = reverse('reports:generate_statistics')
+        self.client.post(url)
+        response = self.client.post(url, follow=True)
+        self.assertEqual(ReportJob.objects.count(), 1)
+        self.assertContains(response, reverse('reports:job_status', args=[ReportJob.objects.get().pk]))
+
+        job = jobs.claim_next_job()
+        self.assertEqual(job.status, ReportJobStatus.RUNNING)
+        self.client.post(url)
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+        jobs.run_job(job)
+        self.client.post(url)
+        self.assertEqual(ReportJob.objects.count(), 2)
+
+    def test_job_runs_in_chunks_and_reports_progress(self):
+        job, created = jobs.enqueue_job('STATISTICS')
+        self.assertTrue(created)
+        status_url = reverse('reports:job_status', args=[job.pk])
+        self.assertEqual(self.client.get(status_url).json()['status'], ReportJobStatus.PENDING)
+
+        with mock.patch.object(jobs, 'JOB_CHUNK_SIZE', 2):
+            jobs.run_job(jobs.claim_next_job())
+
+        data = self.client.get(status_url).json()
+        self.assertEqual(data['status'], ReportJobStatus.DONE)
+        self.assertEqual((data['done'], data['total'], data['percent']), (5, 5, 100.0))
+        self.assertFalse(data['is_active'])
+        self.assertEqual(TaskStatistics.objects.count(), 5)
+        self.assertIsNone(jobs.claim_next_job())
+
+    def test_stale_job_keeps_failed_status(self):
+        job, _ = jobs.enqueue_job('STATISTICS')
+        job = jobs.claim_next_job()
+        # Пока воркер работал, задачу сочли брошенной и запустили новую
+        ReportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - jobs.STALE_JOB_TIMEOUT * 2)
+        self.assertTrue(jobs.enqueue_job('STATISTICS')[1])
+
+        job = jobs.run_job(job)
+        self.assertEqual(job.status, ReportJobStatus.FAILED)
+        self.assertEqual(job.error, 'Задача прервана')
+        self.assertEqual(ReportJob.objects.filter(status=ReportJobStatus.PENDING).count(), 1)
+
+
+class ParallelRebuildTests(TransactionTestCase):
+    """
+    ``rebuild_statistics --workers``: воркеры считают, родитель пишет.
+
+    Тестовая база SQLite в памяти не видна другим процессам, поэтому пул
+    процессов заменен пулом потоков с тем же интерфейсом; каждый поток
+    открывает свое соединение, как процесс-воркер.
+    """
+
+    def setUp(self):
+        self.client_obj = Client.objects.create(name='Клиент')
+        self.employee = CustomUser.objects.create(username='employee', role=UserRoles.EMPLOYEE)
+        for number in range(3):
+            task = Task.objects.create(
+                title=f'Анкета {number}', task_type=TaskType.SURVEY, status=TaskStatus.COMPLETED,
+                client=self.client_obj,
+            )
+            question = SurveyQuestion.objects.create(
+                task=task, question_text='Вопрос', question_type='RADIO', order=0
+            )
+            choices = [
+                SurveyQuestionChoice.objects.create(question=question, choice_text=f'Вариант {i}', order=i).id
+                for i in range(2)
+            ]
+            for answer in range(number + 1):
+                form = SurveyResponseForm(task, self.employee, data={
+                    'selected_client_id': self.client_obj.id, f'question_{question.id}': choices[answer % 2],
+                })
+                self.assertTrue(form.is_valid(), form.errors)
+                form.save()
+        Task.objects.create(title='Фото', task_type=TaskType.SIMPLE_PHOTO, status=TaskStatus.COMPLETED)
+
+    def rebuild(self, workers):
+        TaskStatistics.objects.all().delete()
+        QuestionStatistics.objects.all().delete()
+        AnswerOptionStatistics.objects.all().delete()
+        output = io.StringIO()
+        with mock.patch('multiprocessing.Pool', ThreadPool):
+            call_command('rebuild_statistics', workers=workers, batch_size=1, stdout=output)
+        self.assertIn(f'4 tasks with {workers} workers', output.getvalue())
+        self.assertIn('Rebuilt statistics for 4 tasks', output.getvalue())
+        return (
+            sorted(TaskStatistics.objects.values_list('task_id', 'total_responses', 'completed_tasks')),
+            sorted(QuestionStatistics.objects.values_list('task_id', 'total')),
+            sorted(AnswerOptionStatistics.objects.values_list('task_id', 'choice__choice_text', 'count')),
+        )
+
+    def test_workers_write_same_rows_as_single_process(self):
+        parallel = self.rebuild(workers=2)
+        task_ids = list(Task.objects.order_by('id').values_list('id', flat=True))
+        self.assertEqual(parallel[0], [
+            (task_ids[0], 1, 1), (task_ids[1], 2, 1), (task_ids[2], 3, 1), (task_ids[3], 0, 0),
+        ])
+        self.assertEqual(parallel[2], [
+            (task_ids[0], 'Вариант 0', 1),
+            (task_ids[1], 'Вариант 0', 1), (task_ids[1], 'Вариант 1', 1),
+            (task_ids[2], 'Вариант 0', 2), (task_ids[2], 'Вариант 1', 1),
+        ])
+        self.assertEqual(self.rebuild(workers=1), parallel)
+
+    def test_rebuilds_completed_tasks_by_default(self):
+        task = Task.objects.create(
+            title='В работе', task_type=TaskType.SURVEY, status=TaskStatus.SENT, client=self.client_obj
+        )
+        question = SurveyQuestion.objects.create(task=task, question_text='Текст', question_type='TEXT', order=0)
+        SurveyAnswer.objects.create(question=question, user=self.employee, client=self.client_obj, text_answer='ответ')
+
+        # Тот же набор задач, что у веб-задачи генерации: только завершенные
+        self.assertNotIn(task.id, [row[0] for row in self.rebuild(workers=1)[1]])
+
+        output = io.StringIO()
+        call_command('rebuild_statistics', all_tasks=True, stdout=output)
+        self.assertIn('Rebuilt statistics for 5 tasks', output.getvalue())
+        self.assertEqual(
+            list(QuestionStatistics.objects.filter(task=task).values_list('total', 'text_answers')), [(1, 1)]
+        )
+        self.assertFalse(TaskStatistics.objects.filter(task=task).exists())
+        self.assertEqual(TaskStatistics.objects.count(), 4)
+
+
+class ExportJobTests(TestCase):
+    """Фоновая выгрузка ответов: файл, ссылка на скачивание и повторное использование."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+        self.admin = CustomUser.objects.create_superuser('admin', password='pass', role=UserRoles.MODERATOR)
+        self.client.force_login(self.admin)
+        self.employee = CustomUser.objects.create_user('employee', password='pass', role=UserRoles.EMPLOYEE)
+        self.client_obj = Client.objects.create(name='Клиент')
+        self.task = Task.objects.create(title='Анкета', task_type=TaskType.SURVEY)
+        self.question = SurveyQuestion.objects.create(
+            task=self.task, question_text='Вопрос', question_type='TEXT', order=0
+        )
+        for number in range(3):
+            self.submit(f'ответ {number}')
+
+    def submit(self, text):
+        form = SurveyResponseForm(self.task, self.employee, data={
+            'selected_client_id': self.client_obj.id, f'question_{self.question.id}': text,
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+    def request_export(self, export_format, layout='answers'):
+        return self.client.post(
+            reverse('reports:export_excel'), {'task': self.task.id, 'format': export_format, 'layout': layout}
+        )
+
+    def test_export_job_produces_download(self):
+        response = self.request_export('csv.gz')
+        self.assertEqual(response.status_code, 202)
+        self.assertIsNone(response.json()['download_url'])
+
+        with mock.patch('tasks.exports.EXPORT_CHUNK_SIZE', 2):
+            job = jobs.run_job(jobs.claim_next_job())
+        self.assertEqual(job.status, ReportJobStatus.DONE, job.error)
+        data = self.client.get(reverse('reports:job_status', args=[job.pk])).json()
+        self.assertEqual((data['done'], data['total']), (3, 3))
+
+        response = self.client.get(data['download_url'])
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        content = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8-sig')
+        rows = list(csv.reader(io.StringIO(content), delimiter=';'))
+        self.assertEqual(rows[0][0], 'Клиент')
+        self.assertEqual(sorted(row[6] for row in rows[1:]), ['ответ 0', 'ответ 1', 'ответ 2'])
+
+    def test_pivot_export_job(self):
+        self.assertEqual(self.request_export('csv', layout='wide').status_code, 400)
+        self.assertTrue(self.request_export('csv', layout='pivot').json()['created'])
+        job = jobs.run_job(jobs.claim_next_job())
+        self.assertEqual(job.status, ReportJobStatus.DONE, job.error)
+        self.assertEqual((job.done, job.total), (3, 3))
+
+        response = self.client.get(jobs.job_progress(job)['download_url'])
+        self.assertIn('survey_pivot_', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        rows = list(csv.reader(io.StringIO(content), delimiter=';'))
+        self.assertEqual(rows[0], ['Задача', 'Клиент', 'Сотрудник', 'Дата анкеты', 'Вопрос'])
+        self.assertEqual([row[4] for row in rows[1:]], ['ответ 0', 'ответ 1', 'ответ 2'])
+        # Строка на ответ — отдельная выгрузка
+        self.assertTrue(self.request_export('csv').json()['created'])
+
+    def test_fresh_export_is_reused(self):
+        self.request_export('xlsx')
+        # Повторный запрос во время выполнения присоединяется к активной задаче
+        self.assertFalse(self.request_export('xlsx').json()['created'])
+        job = jobs.run_job(jobs.claim_next_job())
+
+        response = self.request_export('xlsx')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], job.pk)
+        self.assertEqual(ReportJob.objects.count(), 1)
+        # Другой формат — отдельная выгрузка
+        self.assertTrue(self.request_export('csv').json()['created'])
+
+        # Новая анкета делает готовый файл устаревшим
+        self.submit('новый ответ')
+        self.assertNotEqual(self.request_export('xlsx').json()['id'], job.pk)
+
+    def test_expired_export_is_purged(self):
+        self.request_export('csv')
+        job = jobs.run_job(jobs.claim_next_job())
+        path = job.file.path
+        ReportJob.objects.filter(pk=job.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self.client.get(reverse('reports:job_download', args=[job.pk]))
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(jobs.purge_expired_exports(), 1)
+        job.refresh_from_db()
+        self.assertFalse(job.file)
+        with self.assertRaises(FileNotFoundError):
+            open(path)
+        self.assertNotEqual(self.request_export('csv').json()['id'], job.pk)
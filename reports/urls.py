@@ -5,6 +5,8 @@ app_name = 'reports'
 
 urlpatterns = [
     path('generate-statistics/', views.generate_statistics, name='generate_statistics'),
+    path('jobs/<int:job_id>/status/', views.job_status, name='job_status'),
+    path('jobs/<int:job_id>/download/', views.job_download, name='job_download'),
     path('export-excel/', views.export_to_excel, name='export_excel'),
     path('task/<int:task_id>/analysis/', views.task_analysis, name='task_analysis'),
 ]
\ No newline at end of file
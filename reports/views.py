@@ -4,25 +4,86 @@ Reporting views for analytics and statistics.
 This module provides views for generating and displaying reports.
 """
 
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, JsonResponse
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.translation import gettext as _
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_POST
+
+from tasks.exports import EXPORT_LAYOUTS
+from tasks.models import Task
+from .jobs import EXPORT_FORMATS, enqueue_job, export_filename, job_progress, request_export
+from .models import ReportJob, ReportJobKind, ReportJobStatus
 
 @staff_member_required
+@require_POST
 def generate_statistics(request):
-    """Generate statistics for all completed tasks."""
-    # TODO: Implement actual statistics generation
-    messages.info(request, _("Генерация статистики будет реализована"))
-    return redirect('admin:reports_taskstatistics_changelist')
+    """
+    Ставит в очередь генерацию статистики по всем завершенным задачам.
+
+    Если генерация уже идет, возвращает к ней вместо запуска второй.
+    Выполняется командой ``run_report_jobs``.
+    """
+    job, created = enqueue_job(ReportJobKind.STATISTICS, user=request.user)
+    if created:
+        messages.info(request, _("Генерация статистики поставлена в очередь"))
+    else:
+        messages.info(request, _("Генерация статистики уже выполняется"))
+    return redirect('admin:reports_reportjob_changelist')
+
+@staff_member_required
+@require_GET
+def job_status(request, job_id):
+    """JSON с прогрессом фоновой задачи: выполнено/всего, прошедшее время и ETA в секундах."""
+    job = get_object_or_404(ReportJob, pk=job_id)
+    return JsonResponse(job_progress(job))
 
 @staff_member_required
 def export_to_excel(request):
-    """Export statistics to Excel."""
-    messages.info(request, _("Экспорт в Excel будет реализован"))
-    return redirect('admin:reports_taskstatistics_changelist')
+    """
+    Ставит в очередь выгрузку ответов задачи.
+
+    POST-параметры: ``task`` — id задачи, ``format`` — xlsx (по умолчанию),
+    csv или csv.gz, ``layout`` — answers (строка на ответ, по умолчанию)
+    или pivot (строка на анкету, столбец на вопрос). Возвращает JSON с прогрессом задачи и ``status_url``;
+    свежая готовая выгрузка с теми же параметрами отдается повторно.
+    Выполняется командой ``run_report_jobs``.
+    """
+    if request.method != 'POST':
+        messages.info(request, _("Выберите задачу для выгрузки на странице ответов на анкеты"))
+        return redirect('admin:tasks_surveyanswer_changelist')
+
+    task_id = request.POST.get('task', '')
+    export_format = request.POST.get('format') or 'xlsx'
+    layout = request.POST.get('layout') or 'answers'
+    if not task_id.isdigit() or export_format not in EXPORT_FORMATS or layout not in EXPORT_LAYOUTS:
+        return JsonResponse({'error': 'Invalid task, format or layout'}, status=400)
+    if not Task.objects.filter(pk=task_id).exists():
+        return JsonResponse({'error': 'Task not found'}, status=404)
+
+    job, created = request_export(int(task_id), export_format, user=request.user, layout=layout)
+    data = job_progress(job)
+    data['created'] = created
+    data['status_url'] = reverse('reports:job_status', args=[job.pk])
+    return JsonResponse(data, status=202 if job.is_active else 200)
+
+@staff_member_required
+@require_GET
+def job_download(request, job_id):
+    """Файл готовой выгрузки; после истечения срока хранения — 410."""
+    job = get_object_or_404(ReportJob, pk=job_id, kind=ReportJobKind.EXPORT, status=ReportJobStatus.DONE)
+    if not job.file or job.expires_at is None or job.expires_at <= timezone.now():
+        return HttpResponse(_("Срок хранения выгрузки истек"), status=410)
+    task = get_object_or_404(Task, pk=job.params['task'])
+    return FileResponse(
+        job.file.open('rb'),
+        as_attachment=True,
+        filename=export_filename(job, task),
+        content_type=EXPORT_FORMATS[job.params['format']][1],
+    )
 
 @staff_member_required
 def task_analysis(request, task_id):
@@ -6,21 +6,148 @@ document.addEventListener('DOMContentLoaded', function() {
     if (clientInput && clientList) {
         let searchTimeout = null;
         
-        // Function to perform search
-        function performSearch(query) {
+        // Offline copy of the user's clients: a snapshot plus deltas since its version
+        const DIRECTORY_KEY = 'clientDirectory';
+        let directory = null;
+        
+        function loadDirectory() {
+            try {
+                return JSON.parse(localStorage.getItem(DIRECTORY_KEY));
+            } catch (e) {
+                return null;
+            }
+        }
+        
+        function saveDirectory() {
+            try {
+                localStorage.setItem(DIRECTORY_KEY, JSON.stringify(directory));
+            } catch (e) {
+                // Storage is full or disabled: the copy lives until the page is closed
+            }
+        }
+        
+        function fetchSnapshot() {
+            return fetch('/api/clients/snapshot/')
+                .then(response => response.ok ? response.json() : Promise.reject(response.status))
+                .then(data => {
+                    directory = data;
+                    saveDirectory();
+                });
+        }
+        
+        function syncDirectory() {
+            directory = loadDirectory();
+            if (!directory) {
+                return fetchSnapshot();
+            }
+            return fetch(`/api/clients/changes/?since=${directory.version}`)
+                .then(response => {
+                    // 410: the copy is older than the change log
+                    if (response.status === 410) {
+                        return fetchSnapshot();
+                    }
+                    return response.ok ? response.json().then(applyChanges) : Promise.reject(response.status);
+                });
+        }
+        
+        function applyChanges(data) {
+            // Another user logged in on this device
+            if (data.employee !== directory.employee) {
+                return fetchSnapshot();
+            }
+            const removed = new Set(data.deletes.concat(data.upserts.map(client => client[0])));
+            directory.clients = directory.clients.filter(client => !removed.has(client[0])).concat(data.upserts);
+            directory.version = data.version;
+            saveDirectory();
+        }
+        
+        // Same ranking as clients.search_index on the server: exact match,
+        // prefix, word prefix, substring; then by field (name, trading point
+        // name, address), then by the lower-cased value and id
+        const MATCH_EXACT = 0;
+        const MATCH_PREFIX = 1;
+        const MATCH_WORD_PREFIX = 2;
+        const MATCH_SUBSTRING = 3;
+        const ALNUM = /[\p{L}\p{N}]/u;
+        
+        function fold(value) {
+            return (value || '').toLowerCase();
+        }
+        
+        function matchRank(folded, needle) {
+            if (folded === needle) {
+                return MATCH_EXACT;
+            }
+            if (folded.startsWith(needle)) {
+                return MATCH_PREFIX;
+            }
+            let start = folded.indexOf(needle, 1);
+            if (start === -1) {
+                return null;
+            }
+            if (ALNUM.test(needle[0])) {
+                while (start !== -1) {
+                    if (!ALNUM.test(folded[start - 1])) {
+                        return MATCH_WORD_PREFIX;
+                    }
+                    start = folded.indexOf(needle, start + 1);
+                }
+            }
+            return MATCH_SUBSTRING;
+        }
+        
+        function compareKeys(a, b) {
+            for (let i = 0; i < a.length; i++) {
+                if (a[i] !== b[i]) {
+                    return a[i] < b[i] ? -1 : 1;
+                }
+            }
+            return 0;
+        }
+        
+        function searchDirectory(query) {
+            const needle = fold(query.split(/\s+/).filter(Boolean).join(' '));
+            const found = [];
+            directory.clients.forEach(client => {
+                let best = null;
+                // Name, trading point name and address
+                for (let field = 1; field <= 3; field++) {
+                    const folded = fold(client[field]);
+                    if (!folded.includes(needle)) {
+                        continue;
+                    }
+                    const key = [matchRank(folded, needle), field, folded, client[0]];
+                    if (best === null || compareKeys(key, best) < 0) {
+                        best = key;
+                    }
+                }
+                if (best !== null) {
+                    found.push({id: client[0], name: client[1], key: best});
+                }
+            });
+            found.sort((a, b) => compareKeys(a.key, b.key));
+            return found.slice(0, 20).map(client => ({id: client.id, name: client.name}));
+        }
+        
+        // Function to perform search: scope 'own' - clients assigned to the user, 'all' - every client
+        function performSearch(query, scope = 'own') {
             if (query.length < 2) {
                 clientList.innerHTML = '';
                 clientList.style.display = 'none';
                 return;
             }
             
-            fetch(`/api/clients/search/?q=${encodeURIComponent(query)}`, {
-                method: 'GET',
-                headers: {
-                    'Content-Type': 'application/json',
-                }
-            })
-            .then(response => response.json())
+            // Own clients are searched locally when the copy is available
+            const results = scope === 'own' && directory
+                ? Promise.resolve(searchDirectory(query))
+                : fetch(`/api/clients/search/?q=${encodeURIComponent(query)}&scope=${scope}`, {
+                    method: 'GET',
+                    headers: {
+                        'Content-Type': 'application/json',
+                    }
+                }).then(response => response.json());
+            
+            results
             .then(data => {
                 clientList.innerHTML = '';
                 
@@ -40,14 +167,25 @@ document.addEventListener('DOMContentLoaded', function() {
                         
                         clientList.appendChild(item);
                     });
-                    clientList.style.display = 'block';
                 } else {
                     const noResultsItem = document.createElement('div');
                     noResultsItem.className = 'client-item-message';
-                    noResultsItem.textContent = 'Клиенты не найдены';
+                    noResultsItem.textContent = scope === 'own' ? 'Среди ваших клиентов не найдено' : 'Клиенты не найдены';
                     clientList.appendChild(noResultsItem);
-                    clientList.style.display = 'block';
                 }
+                
+                // Explicit fallback to the whole client list
+                if (scope === 'own') {
+                    const searchAllItem = document.createElement('div');
+                    searchAllItem.className = 'client-item client-item-search-all';
+                    searchAllItem.textContent = 'Искать среди всех клиентов';
+                    searchAllItem.addEventListener('click', function(e) {
+                        e.stopPropagation();
+                        performSearch(query, 'all');
+                    });
+                    clientList.appendChild(searchAllItem);
+                }
+                clientList.style.display = 'block';
             })
             .catch(error => {
                 console.error('Ошибка:', error);
@@ -98,6 +236,12 @@ document.addEventListener('DOMContentLoaded', function() {
         // Add styling to the input group
         inputGroup.style.display = 'flex';
         
+        syncDirectory().catch(error => {
+            // Offline: the last saved copy (if any) is used as is
+            directory = directory || loadDirectory();
+            console.warn('Справочник клиентов не обновлен:', error);
+        });
+        
         document.addEventListener('click', function(e) {
             if (!clientInputContainer.contains(e.target)) {
                 clientList.style.display = 'none';
@@ -6,21 +6,28 @@ from django.db import models
 from django.urls import path, reverse
 from django.shortcuts import render, get_object_or_404
 from django.utils.html import format_html
-from django.http import HttpResponse
+from django.utils.http import content_disposition_header
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.utils import timezone
 from datetime import timedelta
+import tempfile
 from nested_admin import NestedModelAdmin, NestedStackedInline, NestedTabularInline
+from reports.services import IncrementalStatistics
 from .models import (
     Task, TaskStatus, TaskType, SurveyQuestion, 
     SurveyQuestionChoice, SurveyAnswer, PhotoReport, PhotoReportItem,
-    SurveyAnswerPhoto, SurveyAnswerGroupReadStatus
+    SurveyAnswerPhoto, SurveySubmission
 )
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
+
+from . import answer_groups, live, photo_archive
+from .exports import XLSX_CONTENT_TYPE, write_answers_workbook
 
 # Import the new API functions
-from .views import getGroupedAnswers, markAsRead, autocomplete_clients, autocomplete_tasks
+from .views import (
+    getGroupedAnswers, getGroupedAnswerDetail, markAsRead, markAsReadBulk, submission_events,
+    autocomplete_clients, autocomplete_tasks,
+)
 
 class SurveyQuestionChoiceInline(NestedTabularInline):
     """Inline choices for survey questions."""
@@ -56,6 +63,7 @@ class TaskAdmin(NestedModelAdmin):
     list_filter = ('task_type', 'status', 'is_active', 'assigned_to', 'client', 'created_by')
     search_fields = ('title', 'description')
     list_per_page = 20
+    actions = ['download_photos_archive']
     fieldsets = (
         (_('Основная информация'), {
             'fields': ('title', 'description', 'task_type', 'status', 'is_active')
@@ -106,150 +114,89 @@ class TaskAdmin(NestedModelAdmin):
             path('survey-stats/<int:task_id>/', 
                  self.admin_site.admin_view(self.survey_statistics_view), 
                  name='survey_statistics'),
+            path('photos-archive/<int:task_id>/', 
+                 self.admin_site.admin_view(self.photos_archive_view), 
+                 name='task_photos_archive'),
         ]
         return custom_urls + urls
     
+    @admin.action(description=_('Скачать все фото задачи (ZIP)'))
+    def download_photos_archive(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, _('Выберите одну задачу для выгрузки фото'), level='warning')
+            return None
+        return HttpResponseRedirect(reverse('admin:task_photos_archive', args=[queryset.get().pk]))
+    
+    def photos_archive_view(self, request, task_id):
+        """
+        ZIP всех фото задачи (ответы на анкеты и фотоотчеты), отдается потоком.
+        
+        GET-параметры как у страницы ответов: ``clientId``, ``date_from``,
+        ``date_to`` (YYYY-MM-DD), ``date_filter``.
+        """
+        task = get_object_or_404(Task, id=task_id)
+        filters = answer_groups.normalize_filters(request.GET)
+        chunks = photo_archive.stream_photo_archive(photo_archive.task_photos(
+            task,
+            client_id=filters.get('client'),
+            date_from=filters.get('date_from'),
+            date_to=filters.get('date_to'),
+        ))
+        if isinstance(request, ASGIRequest):
+            chunks = photo_archive.async_chunks(chunks)
+        response = StreamingHttpResponse(chunks, content_type=photo_archive.ZIP_CONTENT_TYPE)
+        filename = f'photos_{task.title.replace(" ", "_")}_{timezone.localdate().strftime("%Y%m%d")}.zip'
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        return response
+    
     def survey_statistics_view(self, request, task_id):
         """View for detailed survey statistics."""
         task = get_object_or_404(Task, id=task_id)
         
-        # Общая статистика
-        total_responses = SurveyAnswer.objects.filter(question__task=task).count()
-        unique_clients = SurveyAnswer.objects.filter(question__task=task).values('client').distinct().count()
+        # Все счетчики по анкете — из предрасчитанной статистики
+        aggregate = IncrementalStatistics.survey_aggregate(task.id)
+        
+        # Ответы на все фото-вопросы одним запросом (плюс prefetch фото)
+        photo_question_ids = [
+            question.id for question in aggregate.questions if question.question_type == 'PHOTO'
+        ]
+        answers_by_question = {}
+        if photo_question_ids:
+            answers_with_photos = SurveyAnswer.objects.filter(
+                question_id__in=photo_question_ids
+            ).select_related('client').prefetch_related('photos').order_by('client__name', 'created_at')
+            for answer in answers_with_photos:
+                answers_by_question.setdefault(answer.question_id, []).append(answer)
         
         # Статистика по вопросам
         questions_stats = []
-        for question in task.questions.all():
+        for question in aggregate.questions:
             question_stats = {
-                'question': question,
-                'total_answers': SurveyAnswer.objects.filter(question=question).count()
+                'question': question.question,
+                'total_answers': question.total_answers
             }
             
-            # Обработка всех типов вопросов с выбором
-            if question.question_type in ['RADIO', 'CHECKBOX', 'SELECT_SINGLE', 'SELECT_MULTIPLE']:
-                choice_stats = []
-                
-                # 1. Обработка кастомных вариантов ответов (если есть)
-                if question.has_custom_choices():
-                    for choice in question.choices.all():
-                        # Подсчет ответов для разных типов вопросов
-                        if question.question_type == 'RADIO':
-                            # Для радиокнопок - через selected_choices
-                            count = SurveyAnswer.objects.filter(
-                                question=question,
-                                selected_choices=choice
-                            ).count()
-                        elif question.question_type == 'CHECKBOX':
-                            # Для чекбоксов - через selected_choices
-                            count = SurveyAnswer.objects.filter(
-                                question=question,
-                                selected_choices=choice
-                            ).count()
-                        elif question.question_type == 'SELECT_SINGLE':
-                            # Для одиночного выбора - через text_answer (ID варианта)
-                            count = SurveyAnswer.objects.filter(
-                                question=question,
-                                text_answer=str(choice.id)
-                            ).count()
-                        elif question.question_type == 'SELECT_MULTIPLE':
-                            # Для множественного выбора - через text_answer (ID вариантов через запятую)
-                            count = SurveyAnswer.objects.filter(
-                                question=question,
-                                text_answer__contains=str(choice.id)
-                            ).count()
-                        
-                        percentage = (count / question_stats['total_answers'] * 100) if question_stats['total_answers'] > 0 else 0
-                        # Округление до 0.5%
-                        percentage = round(percentage * 2) / 2.0
-                        choice_stats.append({
-                            'choice': choice,
-                            'count': count,
-                            'percentage': percentage
-                        })
-                
-                # 2. Обработка стандартных вариантов (если нет кастомных)
-                else:
-                    # Для вопросов с типом RADIO - стандартные варианты "Да" и "Нет"
-                    if question.question_type == 'RADIO':
-                        # Стандартные варианты "Да" и "Нет"
-                        yes_count = SurveyAnswer.objects.filter(
-                            question=question,
-                            text_answer__iexact='да'
-                        ).count()
-                        no_count = SurveyAnswer.objects.filter(
-                            question=question,
-                            text_answer__iexact='нет'
-                        ).count()
-                        
-                        yes_percentage = (yes_count / question_stats['total_answers'] * 100) if question_stats['total_answers'] > 0 else 0
-                        no_percentage = (no_count / question_stats['total_answers'] * 100) if question_stats['total_answers'] > 0 else 0
+            # Все типы вопросов с выбором: кастомные варианты или стандартные "Да"/"Нет"
+            if question.is_choice_question:
+                question_stats['choice_stats'] = [
+                    {
+                        'choice': choice,
+                        'count': choice.count,
                         # Округление до 0.5%
-                        yes_percentage = round(yes_percentage * 2) / 2.0
-                        no_percentage = round(no_percentage * 2) / 2.0
-                        
-                        choice_stats.extend([
-                            {
-                                'choice': type('Choice', (), {'choice_text': 'Да'}),
-                                'count': yes_count,
-                                'percentage': yes_percentage
-                            },
-                            {
-                                'choice': type('Choice', (), {'choice_text': 'Нет'}),
-                                'count': no_count,
-                                'percentage': no_percentage
-                            }
-                        ])
-                    
-                    # Для вопросов с типом CHECKBOX - стандартные варианты "Да" и "Нет"
-                    elif question.question_type == 'CHECKBOX':
-                        # Стандартные варианты "Да" и "Нет"
-                        yes_count = SurveyAnswer.objects.filter(
-                            question=question,
-                            text_answer__icontains='да'
-                        ).count()
-                        no_count = SurveyAnswer.objects.filter(
-                            question=question,
-                            text_answer__icontains='нет'
-                        ).count()
-                        
-                        yes_percentage = (yes_count / question_stats['total_answers'] * 100) if question_stats['total_answers'] > 0 else 0
-                        no_percentage = (no_count / question_stats['total_answers'] * 100) if question_stats['total_answers'] > 0 else 0
-                        # Округление до 0.5%
-                        yes_percentage = round(yes_percentage * 2) / 2.0
-                        no_percentage = round(no_percentage * 2) / 2.0
-                        
-                        choice_stats.extend([
-                            {
-                                'choice': type('Choice', (), {'choice_text': 'Да'}),
-                                'count': yes_count,
-                                'percentage': yes_percentage
-                            },
-                            {
-                                'choice': type('Choice', (), {'choice_text': 'Нет'}),
-                                'count': no_count,
-                                'percentage': no_percentage
-                            }
-                        ])
-                
-                question_stats['choice_stats'] = choice_stats
+                        'percentage': round(choice.percentage * 2) / 2.0
+                    }
+                    for choice in question.choice_counts
+                ]
                 
             # Текстовые вопросы
             elif question.question_type in ['TEXT', 'TEXT_SHORT', 'TEXTAREA']:
-                text_answers = SurveyAnswer.objects.filter(
-                    question=question
-                ).exclude(text_answer__isnull=True).exclude(text_answer='')
-                question_stats['text_answers_count'] = text_answers.count()
+                question_stats['text_answers_count'] = question.text_answers_count
                 
             # Фото вопросы
             elif question.question_type == 'PHOTO':
-                # Получаем все ответы с фото для этого вопроса
-                answers_with_photos = SurveyAnswer.objects.filter(
-                    question=question
-                ).prefetch_related('photos', 'client').order_by('client__name', 'created_at')
-                
                 # Группируем фото по ответам (клиентам)
                 photo_groups = []
-                for answer in answers_with_photos:
+                for answer in answers_by_question.get(question.id, []):
                     photos_data = []
                     for photo in answer.photos.all():
                         # Попытка извлечь EXIF данные
@@ -278,8 +225,8 @@ class TaskAdmin(NestedModelAdmin):
         context = {
             'title': f'Статистика: {task.title}',
             'task': task,
-            'total_responses': total_responses,
-            'unique_clients': unique_clients,
+            'total_responses': aggregate.total_responses,
+            'unique_clients': aggregate.unique_clients,
             'questions_stats': questions_stats,
             'opts': self.model._meta,
         }
@@ -417,6 +364,9 @@ class SurveyAnswerAdmin(admin.ModelAdmin):
             'moderators': moderators,
             'tasks': tasks,
             'current_filters': request.GET,
+            # Живая лента (SSE) работает только под ASGI, иначе страница опрашивает список
+            'live_feed': isinstance(request, ASGIRequest),
+            'poll_interval_ms': live.POLL_INTERVAL_MS,
             'opts': self.model._meta,
         }
         context.update(extra_context or {})
@@ -433,9 +383,19 @@ class SurveyAnswerAdmin(admin.ModelAdmin):
             path('api/grouped-answers/', 
                  self.admin_site.admin_view(getGroupedAnswers), 
                  name='grouped_answers_api'),
+            path('api/grouped-answers/<int:submission_id>/', 
+                 self.admin_site.admin_view(getGroupedAnswerDetail), 
+                 name='grouped_answer_detail_api'),
+            # Асинхронный поток: admin_view синхронный, права проверяет сам view
+            path('api/events/', 
+                 submission_events, 
+                 name='submission_events_api'),
             path('api/mark-as-read/', 
                  self.admin_site.admin_view(markAsRead), 
                  name='mark_as_read_api'),
+            path('api/mark-as-read/bulk/', 
+                 self.admin_site.admin_view(markAsReadBulk), 
+                 name='mark_as_read_bulk_api'),
             path('autocomplete_clients/', 
                  self.admin_site.admin_view(autocomplete_clients), 
                  name='autocomplete_clients'),
@@ -454,89 +414,29 @@ class SurveyAnswerAdmin(admin.ModelAdmin):
         except Task.DoesNotExist:
             return HttpResponse("Task not found", status=404)
         
-        # Get all answers for this task
-        answers = SurveyAnswer.objects.filter(
-            question__task=task
-        ).select_related(
-            'user', 'question', 'client'
-        ).prefetch_related(
-            'photos', 'selected_choices'
-        ).order_by('client__name', 'question__order', 'created_at')
-        
-        # Create Excel workbook
-        workbook = openpyxl.Workbook()
-        worksheet = workbook.active
-        worksheet.title = f"Ответы {task.title[:30]}"  # Limit sheet name length
-        
-        # Define headers
-        headers = [
-            'Клиент', 'Сотрудник', 'Дата ответа', 'Вопрос', 'Тип вопроса', 
-            'Выбранные варианты', 'Текстовый ответ', 'Количество фото'
-        ]
-        
-        # Write headers
-        for col_num, header in enumerate(headers, 1):
-            cell = worksheet.cell(row=1, column=col_num, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color='D3D3D3', end_color='D3D3D3', fill_type='solid')
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Write data
-        row_num = 2
-        for answer in answers:
-            # Get selected choices as text
-            selected_choices_text = ', '.join([choice.choice_text for choice in answer.selected_choices.all()])
-            
-            # Count photos
-            photo_count = answer.photos.count()
-            
-            row_data = [
-                answer.client.name,
-                answer.user.get_full_name() or answer.user.username,
-                answer.created_at.strftime('%d.%m.%Y %H:%M:%S'),
-                answer.question.question_text,
-                answer.question.get_question_type_display(),
-                selected_choices_text,
-                answer.text_answer,
-                photo_count
-            ]
-            
-            for col_num, value in enumerate(row_data, 1):
-                cell = worksheet.cell(row=row_num, column=col_num, value=str(value) if value is not None else '')
-                cell.alignment = Alignment(wrap_text=True, vertical='top')
-            
-            row_num += 1
-        
-        # Auto-adjust column widths
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            
-            adjusted_width = min(max_length + 2, 50)  # Limit width to 50
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        # Prepare response
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="survey_answers_{task.title.replace(" ", "_")}_{timezone.now().strftime("%Y%m%d")}.xlsx"'
-        
-        workbook.save(response)
-        return response
+        # Книга пишется построчно во временный файл и отдается потоком
+        file = tempfile.TemporaryFile()
+        write_answers_workbook(task, file)
+        file.seek(0)
+        return FileResponse(
+            file,
+            as_attachment=True,
+            filename=f'survey_answers_{task.title.replace(" ", "_")}_{timezone.now().strftime("%Y%m%d")}.xlsx',
+            content_type=XLSX_CONTENT_TYPE,
+        )
 
-@admin.register(SurveyAnswerGroupReadStatus)
-class SurveyAnswerGroupReadStatusAdmin(admin.ModelAdmin):
-    list_display = ('task', 'client', 'user', 'date_created', 'read_at', 'read_by')
-    list_filter = ('date_created', 'read_at', 'task', 'client', 'user')
+@admin.register(SurveySubmission)
+class SurveySubmissionAdmin(admin.ModelAdmin):
+    list_display = ('task', 'client', 'user', 'created_at', 'read_at', 'read_by')
+    list_filter = ('created_at', 'read_at', 'task', 'client', 'user')
+    list_select_related = ('task', 'client', 'user', 'read_by')
     search_fields = ('task__title', 'client__name', 'user__username')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('task', 'client', 'user', 'created_at')
     list_per_page = 20
 
+    def has_add_permission(self, request):
+        return False
+
 
 @admin.register(SurveyAnswer)
 class SurveyAnswerAdminWrapper(SurveyAnswerAdmin):
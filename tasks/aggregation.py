@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Survey answer aggregation.
+
+Result structures shared by all survey result pages. The pages read them from
+the precomputed counters of the reports app
+(``reports.services.IncrementalStatistics.survey_aggregate``);
+``aggregate_survey`` computes the same numbers from the raw answers with a
+fixed number of GROUP BY queries and is the reference the counters are checked
+against (``manage.py rebuild_statistics`` repairs them).
+"""
+
+import re
+from dataclasses import dataclass, field
+
+from django.db.models import Count, Q
+
+from .models import SurveyAnswer
+from .schema import get_survey_schema
+from .services import CHOICE_QUESTION_TYPES
+
+YES_NO_CHOICES = (('да', 'Да'), ('нет', 'Нет'))
+
+
+@dataclass
+class ChoiceCount:
+    """Количество ответов с выбранным вариантом."""
+    choice_id: int | None
+    choice_text: str
+    count: int = 0
+    total: int = 0
+
+    @property
+    def percentage(self):
+        """Доля ответов на вопрос с этим вариантом, в процентах."""
+        return self.count / self.total * 100 if self.total else 0.0
+
+
+@dataclass
+class QuestionAggregate:
+    """Сводка ответов на один вопрос."""
+    question: dict
+    total_answers: int = 0
+    text_answers_count: int = 0
+    choice_counts: list = field(default_factory=list)
+
+    @property
+    def id(self):
+        return self.question['id']
+
+    @property
+    def question_type(self):
+        return self.question['question_type']
+
+    @property
+    def has_custom_choices(self):
+        return bool(self.question['choices'])
+
+    @property
+    def is_choice_question(self):
+        return self.question_type in CHOICE_QUESTION_TYPES
+
+
+@dataclass
+class SurveyAggregate:
+    """Сводка ответов по анкете."""
+    task_id: int
+    total_responses: int = 0
+    unique_clients: int = 0
+    questions: list = field(default_factory=list)
+
+    def get(self, question_id):
+        """Сводка по вопросу или None."""
+        for question in self.questions:
+            if question.id == question_id:
+                return question
+        return None
+
+
+def split_values(text):
+    """Значения ответа, сохраненного строкой через запятую."""
+    return {value.strip().casefold() for value in text.split(',')}
+
+
+def aggregate_survey(task_id):
+    """
+    Считает ответы по всем вопросам анкеты.
+
+    Четыре GROUP BY запроса (плюс компиляция схемы при промахе кэша):
+    итоги по вопросам, уникальные клиенты, выбранные варианты через
+    промежуточную таблицу и текстовые значения вопросов с выбором
+    (id вариантов для SELECT_* и "да"/"нет" для вопросов без вариантов).
+
+    Returns
+    -------
+    SurveyAggregate
+    """
+    schema = get_survey_schema(task_id)
+    result = SurveyAggregate(task_id=task_id)
+    result.questions = [QuestionAggregate(question=question) for question in schema]
+    if not schema:
+        return result
+
+    by_question = {question.id: question for question in result.questions}
+    answers = SurveyAnswer.objects.filter(question_id__in=by_question)
+
+    for row in answers.values('question_id').annotate(
+        total=Count('id'),
+        text_count=Count('id', filter=Q(text_answer__isnull=False) & ~Q(text_answer='')),
+    ).order_by():
+        question = by_question[row['question_id']]
+        question.total_answers = row['total']
+        question.text_answers_count = row['text_count']
+        result.total_responses += row['total']
+
+    result.unique_clients = answers.values('client_id').distinct().count()
+
+    choice_questions = [question for question in result.questions if question.is_choice_question]
+    if not choice_questions:
+        return result
+
+    counts = {}
+    through = SurveyAnswer.selected_choices.through
+    for choice_id, count in (
+        through.objects
+        .filter(surveyanswer__question_id__in=[question.id for question in choice_questions])
+        .values_list('surveyquestionchoice_id')
+        .annotate(count=Count('surveyanswer_id'))
+        .order_by()
+    ):
+        counts[choice_id] = count
+
+    text_values = (
+        answers
+        .filter(question_id__in=[question.id for question in choice_questions], text_answer__isnull=False)
+        .exclude(text_answer='')
+        .values_list('question_id', 'text_answer')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    # Ключи: (id вопроса, id варианта) или (id вопроса, "да"/"нет")
+    text_counts = {}
+    for question_id, text, count in text_values:
+        if by_question[question_id].has_custom_choices:
+            # SELECT_* хранят id вариантов в тексте ответа
+            values = {int(value) for value in re.findall(r'\d+', text)}
+        else:
+            values = split_values(text)
+        for value in values:
+            key = (question_id, value)
+            text_counts[key] = text_counts.get(key, 0) + count
+
+    for question in choice_questions:
+        if question.has_custom_choices:
+            question.choice_counts = [
+                ChoiceCount(
+                    choice['id'],
+                    choice['choice_text'],
+                    counts.get(choice['id'], 0) + text_counts.get((question.id, choice['id']), 0),
+                    question.total_answers,
+                )
+                for choice in question.question['choices']
+            ]
+        else:
+            question.choice_counts = [
+                ChoiceCount(None, label, text_counts.get((question.id, value), 0), question.total_answers)
+                for value, label in YES_NO_CHOICES
+            ]
+    return result
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Grouped survey answers for the admin answers page.
+
+A group is one ``SurveySubmission`` (one filled-in form); its id is the
+submission id, which ``markAsRead`` accepts. The list endpoint returns
+one-line summaries paginated with a keyset cursor over (created_at, id);
+task, client and employee names are sent once per page in lookup maps
+instead of on every row. Answers, choices and photos of a submission are
+loaded by the detail endpoint when a row is expanded. New submissions and
+read marks reach open pages through the live feed (``tasks.live``).
+"""
+
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import live, versions
+from .models import SurveyAnswer, SurveyAnswerPhoto, SurveySubmission, TaskType
+
+GROUPS_PAGE_SIZE = 20
+GROUPS_MAX_PAGE_SIZE = 1000
+NEW_GROUP_AGE = timedelta(hours=24)
+# Шаг, с которым меняется ETag страницы из-за снятия флага «новая»
+NEW_STATUS_ETAG_STEP = timedelta(minutes=5)
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def normalize_filters(params):
+    """
+    Фильтры страницы ответов из параметров запроса.
+
+    Принимает ``taskId``, ``clientId``, ``userId``, ``moderator``,
+    ``task_type``, ``date_filter`` (today/yesterday/week), ``date_from``
+    и ``date_to``; пустые и некорректные значения отбрасываются.
+    """
+    filters = {}
+    for name, param in (('task', 'taskId'), ('client', 'clientId'), ('user', 'userId'), ('moderator', 'moderator')):
+        value = params.get(param, '')
+        if value.isdigit():
+            filters[name] = int(value)
+    if params.get('task_type') in TaskType.values:
+        filters['task_type'] = params['task_type']
+
+    today = timezone.localdate()
+    date_filter = params.get('date_filter')
+    if date_filter == 'today':
+        filters['date_from'] = today
+    elif date_filter == 'yesterday':
+        filters['date_from'] = filters['date_to'] = today - timedelta(days=1)
+    elif date_filter == 'week':
+        filters['date_from'] = today - timedelta(days=7)
+    # Явный диапазон сужает быстрый фильтр по дате
+    for name, narrower in (('date_from', max), ('date_to', min)):
+        try:
+            value = parse_date(params.get(name) or '')
+        except ValueError:
+            value = None
+        if value:
+            filters[name] = narrower(value, filters[name]) if name in filters else value
+    return filters
+
+
+def page_size(params):
+    """Размер страницы из параметра ``limit``."""
+    value = params.get('limit', '')
+    if not value.isdigit() or int(value) == 0:
+        return GROUPS_PAGE_SIZE
+    return min(int(value), GROUPS_MAX_PAGE_SIZE)
+
+
+def day_bounds(day):
+    """Начало и конец локального дня как aware datetime."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def submission_filter_q(filters):
+    """Условие на анкеты по нормализованным фильтрам."""
+    q = Q()
+    lookups = {
+        'task': 'task_id',
+        'client': 'client_id',
+        'user': 'user_id',
+        'moderator': 'task__created_by_id',
+        'task_type': 'task__task_type',
+    }
+    for name, lookup in lookups.items():
+        if name in filters:
+            q &= Q(**{lookup: filters[name]})
+    # Границы дня вместо __date, чтобы условие использовало индекс по created_at
+    if 'date_from' in filters:
+        q &= Q(created_at__gte=day_bounds(filters['date_from'])[0])
+    if 'date_to' in filters:
+        q &= Q(created_at__lt=day_bounds(filters['date_to'])[1])
+    return q
+
+
+def encode_cursor(submission):
+    """Курсор последней анкеты страницы: "<мкс с эпохи>:<id>"."""
+    timestamp = (submission.created_at - EPOCH) // timedelta(microseconds=1)
+    return f'{timestamp}:{submission.pk}'
+
+
+def parse_cursor(value):
+    """Разбирает курсор ``encode_cursor``; некорректный курсор — None."""
+    timestamp, _, pk = (value or '').partition(':')
+    if not (timestamp.isdigit() and pk.isdigit()):
+        return None
+    return EPOCH + timedelta(microseconds=int(timestamp)), int(pk)
+
+
+def _count_subquery(queryset, submission_field):
+    """Коррелированный COUNT по анкете: считается только для строк страницы."""
+    counts = queryset.order_by().values(submission_field).annotate(count=Count('id')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def _display_name(user):
+    return user.get_full_name() or user.username
+
+
+def serialize_summary(submission, new_since):
+    """Строка списка анкет без ответов."""
+    return {
+        'id': submission.pk,
+        'taskId': submission.task_id,
+        'clientId': submission.client_id,
+        'userId': submission.user_id,
+        'dateCreated': timezone.localtime(submission.created_at).strftime(DATE_FORMAT),
+        'answerCount': submission.answer_count,
+        'photoCount': submission.photo_count,
+        'isNew': submission.created_at > new_since and not submission.is_read,
+        'isRead': submission.is_read,
+        'readAt': timezone.localtime(submission.read_at).strftime(DATE_FORMAT) if submission.is_read else None,
+    }
+
+
+def page_etag(request):
+    """ETag страницы списка анкет: параметры, версии данных и шаг флага «новая»."""
+    return versions.request_etag(
+        request,
+        [versions.SUBMISSIONS, versions.READS, versions.TASKS, versions.CLIENTS, versions.USERS],
+        new_status_step=timezone.now().timestamp() // NEW_STATUS_ETAG_STEP.total_seconds(),
+    )
+
+
+def get_group_page(filters, cursor, limit):
+    """
+    Страница кратких строк анкет от новых к старым.
+
+    Returns
+    -------
+    dict
+        ``results`` — строки страницы; ``tasks``, ``clients``, ``users`` —
+        названия и имена по id для строк страницы; ``next`` — курсор
+        следующей страницы или None.
+    """
+    submissions = (
+        SurveySubmission.objects
+        .filter(submission_filter_q(filters))
+        .select_related('task__created_by', 'client', 'user')
+        .only(
+            'id', 'created_at', 'read_at',
+            'task__title', 'task__created_by__username', 'task__created_by__first_name',
+            'task__created_by__last_name', 'client__name',
+            'user__username', 'user__first_name', 'user__last_name',
+        )
+        .annotate(
+            answer_count=_count_subquery(
+                SurveyAnswer.objects.filter(submission=OuterRef('pk')), 'submission_id'
+            ),
+            photo_count=_count_subquery(
+                SurveyAnswerPhoto.objects.filter(answer__submission=OuterRef('pk')), 'answer__submission_id'
+            ),
+        )
+    )
+    if cursor is not None:
+        created_at, pk = cursor
+        submissions = submissions.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    submissions = list(submissions.order_by('-created_at', '-id')[:limit + 1])
+    has_next = len(submissions) > limit
+    submissions = submissions[:limit]
+
+    page = serialize_summaries(submissions)
+    page['next'] = encode_cursor(submissions[-1]) if has_next else None
+    return page
+
+
+def serialize_summaries(submissions):
+    """
+    Краткие строки анкет со справочниками названий.
+
+    У анкет должны быть загружены задача с модератором, клиент и сотрудник,
+    а также заданы ``answer_count`` и ``photo_count``.
+    """
+    new_since = timezone.now() - NEW_GROUP_AGE
+    tasks, clients, users = {}, {}, {}
+    for submission in submissions:
+        task = submission.task
+        tasks[task.pk] = {
+            'name': task.title,
+            'moderatorName': _display_name(task.created_by) if task.created_by else '-',
+        }
+        clients[submission.client_id] = submission.client.name
+        users[submission.user_id] = _display_name(submission.user)
+    return {
+        'results': [serialize_summary(submission, new_since) for submission in submissions],
+        'tasks': tasks,
+        'clients': clients,
+        'users': users,
+    }
+
+
+def serialize_answer(answer):
+    """Ответ анкеты для детального эндпоинта."""
+    return {
+        'question': answer.question.question_text,
+        'questionType': answer.question.get_question_type_display(),
+        'selectedChoices': [choice.choice_text for choice in answer.selected_choices.all()],
+        'textAnswer': answer.text_answer,
+        'photos': [
+            {'id': photo.id, 'url': photo.photo.url, 'name': photo.photo.name.split('/')[-1]}
+            for photo in answer.photos.all()
+        ],
+        'createdAt': timezone.localtime(answer.created_at).strftime(DATE_FORMAT),
+        'questionId': answer.question_id,
+    }
+
+
+def get_group_detail(submission_id):
+    """
+    Ответы одной анкеты с вариантами и фото (три запроса).
+
+    Returns
+    -------
+    dict or None
+        ``id`` и ``answers`` от новых к старым; None, если анкеты нет.
+    """
+    answers = list(
+        SurveyAnswer.objects
+        .filter(submission_id=submission_id)
+        .select_related('question')
+        .prefetch_related('selected_choices', Prefetch('photos', queryset=SurveyAnswerPhoto.objects.order_by('id')))
+        .order_by('-created_at', '-id')
+    )
+    if not answers and not SurveySubmission.objects.filter(pk=submission_id).exists():
+        return None
+    return {'id': submission_id, 'answers': [serialize_answer(answer) for answer in answers]}
+
+
+def mark_read(user, ids=None, filters=None):
+    """
+    Отмечает прочитанными анкеты по списку id или по фильтрам страницы.
+
+    Уже прочитанные анкеты не меняются. Одно UPDATE в транзакции;
+    после фиксации id отмеченных анкет уходят в живую ленту.
+
+    Returns
+    -------
+    tuple[int, datetime]
+        Количество отмеченных анкет и время отметки.
+    """
+    submissions = SurveySubmission.objects.filter(read_at__isnull=True)
+    if ids is not None:
+        submissions = submissions.filter(pk__in=ids)
+    else:
+        submissions = submissions.filter(submission_filter_q(filters or {}))
+    read_at = timezone.now()
+    with transaction.atomic():
+        # Id для живой ленты; сверх лимита вкладкам уйдет reset
+        read_ids = list(submissions.values_list('pk', flat=True)[:live.MAX_EVENT_IDS + 1])
+        updated = submissions.update(read_at=read_at, read_by=user)
+        notify_read(read_ids, read_at)
+    return updated, read_at
+
+
+def notify_read(ids, read_at):
+    """
+    После фиксации транзакции публикует отметку прочтения в живую ленту
+    и меняет версию статусов прочтения (ETag списка анкет).
+    """
+    if ids:
+        versions.bump_on_commit(versions.READS)
+        read_at = timezone.localtime(read_at).strftime(DATE_FORMAT)
+        transaction.on_commit(lambda: live.publish_read(ids, read_at), robust=True)
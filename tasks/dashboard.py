@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Statistics dashboard data.
+
+The dashboard (``StatisticsView``) renders only the summary counters; the
+survey, employee and client tables are loaded page by page from JSON
+endpoints. Submission numbers are read from ``DailySubmissionRollup``, so a
+date range touches rollup rows rather than individual answers. Every
+section is computed with one or two queries and cached under a key built
+from the normalized filter set, so repeated requests with the same filters
+(in any parameter order or spelling of "all") hit the cache.
+"""
+
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Count, Exists, OuterRef, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_date
+
+from clients.models import Client
+from reports.models import DailySubmissionRollup
+from reports.services import IncrementalStatistics
+from users.models import CustomUser, UserRoles
+from .models import Task, TaskStatus, TaskType
+
+DASHBOARD_CACHE_VERSION = 1
+DASHBOARD_CACHE_TIMEOUT = 60
+DASHBOARD_PAGE_SIZE = 50
+DASHBOARD_MAX_PAGE_SIZE = 200
+
+FILTER_FIELDS = ('task_type', 'client', 'employee', 'moderator', 'date_from', 'date_to')
+
+
+def normalize_filters(params):
+    """
+    Приводит параметры запроса к каноническому набору фильтров.
+
+    Пустые значения, "all" и некорректные значения отбрасываются,
+    id приводятся к int, даты — к ISO-строкам.
+    """
+    filters = {}
+    task_type = params.get('task_type')
+    if task_type in TaskType.values:
+        filters['task_type'] = task_type
+    for name in ('client', 'employee', 'moderator'):
+        value = params.get(name, '')
+        if value.isdigit():
+            filters[name] = int(value)
+    for name in ('date_from', 'date_to'):
+        try:
+            value = parse_date(params.get(name) or '')
+        except ValueError:
+            value = None
+        if value:
+            filters[name] = value.isoformat()
+    return filters
+
+
+def task_filter_q(filters, prefix='', include_dates=True):
+    """Условие на задачи по фильтрам; ``prefix`` — путь к задаче от модели запроса."""
+    lookups = {
+        'task_type': 'task_type',
+        'client': 'client_id',
+        'employee': 'assigned_to_id',
+        'moderator': 'created_by_id',
+        'date_from': 'created_at__date__gte',
+        'date_to': 'created_at__date__lte',
+    }
+    return Q(**{
+        f'{prefix}{lookups[name]}': value
+        for name, value in filters.items()
+        if include_dates or name not in ('date_from', 'date_to')
+    })
+
+
+def day_range_q(filters, prefix=''):
+    """Условие на день ``DailySubmissionRollup`` по диапазону дат фильтров."""
+    q = Q()
+    if 'date_from' in filters:
+        q &= Q(**{f'{prefix}day__gte': filters['date_from']})
+    if 'date_to' in filters:
+        q &= Q(**{f'{prefix}day__lte': filters['date_to']})
+    return q
+
+
+def cache_key(section, filters, **extra):
+    """Ключ кэша раздела дашборда для нормализованных фильтров и страницы."""
+    payload = json.dumps([filters, extra], sort_keys=True)
+    digest = hashlib.md5(payload.encode('utf-8')).hexdigest()
+    return f'statistics_dashboard:v{DASHBOARD_CACHE_VERSION}:{section}:{digest}'
+
+
+def cached(section, filters, compute, **extra):
+    """Возвращает раздел из кэша, вычисляя его при промахе."""
+    key = cache_key(section, filters, **extra)
+    data = cache.get(key)
+    if data is None:
+        data = compute()
+        cache.set(key, data, DASHBOARD_CACHE_TIMEOUT)
+    return data
+
+
+def page_size(params):
+    """Размер страницы из параметра ``limit``."""
+    value = params.get('limit', '')
+    if not value.isdigit() or int(value) == 0:
+        return DASHBOARD_PAGE_SIZE
+    return min(int(value), DASHBOARD_MAX_PAGE_SIZE)
+
+
+def parse_cursor(value):
+    """Курсор — id последней строки предыдущей страницы, или None."""
+    return int(value) if value and value.isdigit() else None
+
+
+def get_summary(filters):
+    """
+    Счетчики задач и отправленных анкет.
+
+    Задачи фильтруются по дате создания, анкеты/ответы/фото — по дню
+    отправки из дневной сводки. Два агрегирующих запроса.
+    """
+    def compute():
+        summary = Task.objects.filter(task_filter_q(filters)).aggregate(
+            total_tasks=Count('id'),
+            completed_tasks=Count('id', filter=Q(status=TaskStatus.COMPLETED)),
+            on_check_tasks=Count('id', filter=Q(status=TaskStatus.ON_CHECK)),
+            sent_tasks=Count('id', filter=Q(status=TaskStatus.SENT)),
+            survey_tasks=Count('id', filter=Q(task_type=TaskType.SURVEY)),
+            photo_tasks=Count('id', filter=Q(task_type__in=[TaskType.EQUIPMENT_PHOTO, TaskType.SIMPLE_PHOTO])),
+        )
+        summary.update(
+            DailySubmissionRollup.objects
+            .filter(task_filter_q(filters, prefix='task__', include_dates=False), day_range_q(filters))
+            .aggregate(
+                submissions=Coalesce(Sum('submissions'), 0),
+                answers=Coalesce(Sum('answers'), 0),
+                photos=Coalesce(Sum('photos'), 0),
+            )
+        )
+        return summary
+    return cached('summary', filters, compute)
+
+
+def _completion(completed, total):
+    return round(completed / total * 100, 1) if total else 0.0
+
+
+def _keyset_page(queryset, cursor, limit):
+    """
+    Страница по убыванию id.
+
+    Курсор попадает в WHERE, а порядок идет по первичному ключу, поэтому
+    счетчики считаются только для строк страницы, а не для всей таблицы,
+    и страница не требует OFFSET.
+    """
+    if cursor is not None:
+        queryset = queryset.filter(id__lt=cursor)
+    rows = list(queryset.order_by('-id')[:limit + 1])
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = str(rows[-1]['id']) if has_next else None
+    return rows, next_cursor
+
+
+def _task_counts(relation, filters):
+    q = task_filter_q(filters, prefix=f'{relation}__')
+    return {
+        'total_tasks': Count(relation, filter=q),
+        'completed_tasks': Count(relation, filter=q & Q(**{f'{relation}__status': TaskStatus.COMPLETED})),
+        'on_check_tasks': Count(relation, filter=q & Q(**{f'{relation}__status': TaskStatus.ON_CHECK})),
+    }
+
+
+def get_employee_page(filters, cursor, limit):
+    """Страница статистики по сотрудникам, по убыванию id."""
+    def compute():
+        employees = CustomUser.objects.filter(role=UserRoles.EMPLOYEE)
+        if 'employee' in filters:
+            employees = employees.filter(id=filters['employee'])
+        rows, next_cursor = _keyset_page(
+            employees.values('id', 'username', 'role').annotate(**_task_counts('task', filters)),
+            cursor, limit,
+        )
+        for row in rows:
+            row['completion'] = _completion(row['completed_tasks'], row['total_tasks'])
+        return {'results': rows, 'next': next_cursor}
+    return cached('employees', filters, compute, cursor=cursor, limit=limit)
+
+
+def get_client_page(filters, cursor, limit):
+    """Страница статистики по клиентам, по убыванию id."""
+    def compute():
+        clients = Client.objects.all()
+        if 'client' in filters:
+            clients = clients.filter(id=filters['client'])
+        rows, next_cursor = _keyset_page(
+            clients.values('id', 'name').annotate(**_task_counts('task', filters)),
+            cursor, limit,
+        )
+        for row in rows:
+            row['completion'] = _completion(row['completed_tasks'], row['total_tasks'])
+        return {'results': rows, 'next': next_cursor}
+    return cached('clients', filters, compute, cursor=cursor, limit=limit)
+
+
+def get_survey_page(filters, cursor, limit):
+    """
+    Страница статистики анкет одним запросом по дневной сводке.
+
+    Диапазон дат ограничивает дни отправки: в таблицу попадают анкеты,
+    отправленные в этот период, и считаются только их ответы.
+    Страницы идут по убыванию id задачи; курсор — id последней задачи.
+    На первой странице есть данные графика по первой анкете.
+    """
+    def compute():
+        in_range = day_range_q(filters, prefix='daily_rollups__')
+        surveys = (
+            Task.objects
+            .filter(task_filter_q(filters, include_dates=False), task_type=TaskType.SURVEY)
+            .values('id', 'title', 'target_count', 'current_count')
+            .annotate(
+                submissions=Coalesce(Sum('daily_rollups__submissions', filter=in_range), 0),
+                total_answers=Coalesce(Sum('daily_rollups__answers', filter=in_range), 0),
+                unique_clients=Count('daily_rollups__client', distinct=True, filter=in_range),
+            )
+        )
+        if 'date_from' in filters or 'date_to' in filters:
+            surveys = surveys.filter(Exists(
+                DailySubmissionRollup.objects.filter(day_range_q(filters), task=OuterRef('pk'))
+            ))
+        rows, next_cursor = _keyset_page(surveys, cursor, limit)
+        for row in rows:
+            row['completion_rate'] = (
+                min(100, int(row['current_count'] / row['target_count'] * 100)) if row['target_count'] > 0 else 0
+            )
+        data = {'results': rows, 'next': next_cursor}
+        if cursor is None and rows:
+            data['chart'] = survey_chart_data(rows[0]['id'])
+        return data
+    return cached('surveys', filters, compute, cursor=cursor, limit=limit)
+
+
+def survey_chart_data(task_id):
+    """Данные графика: количество ответов по вопросам анкеты."""
+    data = {
+        'labels': [],
+        'datasets': [{
+            'label': 'Количество ответов',
+            'data': [],
+            'backgroundColor': [
+                'rgba(255, 99, 132, 0.2)',
+                'rgba(54, 162, 235, 0.2)',
+                'rgba(255, 206, 86, 0.2)',
+                'rgba(75, 192, 192, 0.2)',
+                'rgba(153, 102, 255, 0.2)',
+                'rgba(255, 159, 64, 0.2)'
+            ],
+            'borderColor': [
+                'rgba(255, 99, 132, 1)',
+                'rgba(54, 162, 235, 1)',
+                'rgba(255, 206, 86, 1)',
+                'rgba(75, 192, 192, 1)',
+                'rgba(153, 102, 255, 1)',
+                'rgba(255, 159, 64, 1)'
+            ],
+            'borderWidth': 1
+        }]
+    }
+    for question in IncrementalStatistics.survey_aggregate(task_id).questions:
+        data['labels'].append(question.question['question_text'][:30])
+        data['datasets'][0]['data'].append(question.total_answers)
+    return data
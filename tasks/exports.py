@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+"""
+Excel export of survey answers.
+
+The workbook is written with openpyxl in write-only mode: answers are read
+from the database in chunks with ``QuerySet.iterator`` and every row is
+written to the sheet as soon as it is built, so memory does not grow with
+the number of answers. Rows are read as value tuples, photo counts come
+from a subquery annotation and selected choices from one query per chunk.
+Column widths are estimated from the first ``WIDTH_SAMPLE_SIZE`` rows,
+since a write-only sheet needs them before the first row and cannot be
+re-read afterwards. The same rows are written to CSV by
+``write_answers_csv``; background export jobs live in ``reports.jobs``.
+
+Two layouts are available (``EXPORT_LAYOUTS``): one row per answer, and a
+pivot with one row per submission and one column per question, where
+multi-choice questions are expanded into 0/1 columns per choice. The pivot is
+read submission by submission in chunks, with three ``values_list``
+queries per chunk for its answers, choices and photo counts.
+"""
+
+import csv
+import io
+import re
+from collections import namedtuple
+from itertools import chain, islice
+
+import openpyxl
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from .models import SurveyAnswer, SurveyAnswerPhoto, SurveyQuestion, SurveySubmission
+from .schema import get_survey_schema
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_DELIMITER = ';'
+EXPORT_CHUNK_SIZE = 2000
+PIVOT_CHUNK_SIZE = 500
+WIDTH_SAMPLE_SIZE = 500
+MAX_COLUMN_WIDTH = 50
+
+ANSWER_HEADERS = [
+    'Клиент', 'Сотрудник', 'Дата ответа', 'Вопрос', 'Тип вопроса',
+    'Выбранные варианты', 'Текстовый ответ', 'Количество фото'
+]
+PIVOT_HEADERS = ['Задача', 'Клиент', 'Сотрудник', 'Дата анкеты']
+# Вопросы, для которых в сводной выгрузке по столбцу-признаку на вариант
+MULTI_CHOICE_TYPES = ('CHECKBOX', 'SELECT_MULTIPLE')
+# Вопросы, которые хранят id выбранных вариантов в тексте ответа
+CHOICE_ID_TEXT_TYPES = ('SELECT_SINGLE', 'SELECT_MULTIPLE')
+
+# Лист xlsx, заголовки, итератор строк (списков значений), столбцы с переносом
+ExportTable = namedtuple('ExportTable', 'title headers rows wrapped_columns')
+
+HEADER_FONT = Font(bold=True)
+HEADER_FILL = PatternFill(start_color='D3D3D3', end_color='D3D3D3', fill_type='solid')
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='center')
+ROW_ALIGNMENT = Alignment(wrap_text=True, vertical='top')
+# Перенос строк только в столбцах со свободным текстом: стиль каждой ячейки
+# удваивает время записи
+WRAPPED_COLUMNS = {3, 5, 6}
+DATETIME_FORMAT = '%d.%m.%Y %H:%M:%S'
+
+
+def _choice_texts(answer_ids):
+    """Тексты выбранных вариантов по id ответа одним запросом на порцию."""
+    through = SurveyAnswer.selected_choices.through
+    texts = {}
+    rows = (
+        through.objects
+        .filter(surveyanswer_id__in=answer_ids)
+        .order_by('surveyquestionchoice__order', 'surveyquestionchoice_id')
+        .values_list('surveyanswer_id', 'surveyquestionchoice__choice_text')
+    )
+    for answer_id, choice_text in rows:
+        texts.setdefault(answer_id, []).append(choice_text)
+    return texts
+
+
+def format_datetime(value):
+    """Дата и время в часовом поясе проекта, одинаково для обоих видов выгрузки."""
+    return timezone.localtime(value).strftime(DATETIME_FORMAT)
+
+
+def answer_rows(task):
+    """
+    Строки выгрузки ответов задачи в порядке клиент, вопрос, дата.
+
+    Генератор: ответы читаются порциями по ``EXPORT_CHUNK_SIZE`` как
+    кортежи значений (без создания моделей), варианты — одним запросом
+    на порцию.
+    """
+    photo_counts = (
+        SurveyAnswerPhoto.objects
+        .filter(answer=OuterRef('pk'))
+        .order_by()
+        .values('answer')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    answers = (
+        SurveyAnswer.objects
+        .filter(question__task=task)
+        .annotate(photo_count=Coalesce(Subquery(photo_counts, output_field=IntegerField()), 0))
+        .order_by('client__name', 'question__order', 'created_at')
+        .values_list(
+            'id', 'client__name', 'user__username', 'user__first_name', 'user__last_name', 'created_at',
+            'question__question_text', 'question__question_type', 'text_answer', 'photo_count',
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    question_types = dict(SurveyQuestion.QUESTION_TYPE_CHOICES)
+    while True:
+        chunk = list(islice(answers, EXPORT_CHUNK_SIZE))
+        if not chunk:
+            return
+        choice_texts = _choice_texts([row[0] for row in chunk])
+        for (pk, client_name, username, first_name, last_name, created_at,
+             question_text, question_type, text_answer, photo_count) in chunk:
+            yield [
+                client_name,
+                f'{first_name} {last_name}'.strip() or username,
+                format_datetime(created_at),
+                question_text,
+                str(question_types.get(question_type, question_type)),
+                ', '.join(choice_texts.get(pk, ())),
+                text_answer or '',
+                str(photo_count),
+            ]
+
+
+def _pivot_columns(schema):
+    """
+    Столбцы вопросов сводной выгрузки в порядке вопросов анкеты.
+
+    Returns
+    -------
+    tuple[list[str], dict, dict]
+        Заголовки; номер столбца по id вопроса; номер столбца-признака по
+        (id вопроса, id варианта) для вопросов с несколькими вариантами.
+    """
+    headers, question_columns, choice_columns = list(PIVOT_HEADERS), {}, {}
+    for question in schema:
+        if question['question_type'] in MULTI_CHOICE_TYPES and question['choices']:
+            for choice in question['choices']:
+                choice_columns[question['id'], choice['id']] = len(headers)
+                headers.append(f"{question['question_text']}: {choice['choice_text']}")
+        else:
+            question_columns[question['id']] = len(headers)
+            headers.append(question['question_text'])
+    return headers, question_columns, choice_columns
+
+
+def _mark_choice(row, question_id, choice_id, question_columns, choice_columns, choice_texts):
+    """Отмечает выбранный вариант: 1 в столбце-признаке или текст варианта в столбце вопроса."""
+    if (question_id, choice_id) in choice_columns:
+        row[choice_columns[question_id, choice_id]] = 1
+    elif question_id in question_columns and choice_id in choice_texts:
+        index = question_columns[question_id]
+        text = choice_texts[choice_id]
+        row[index] = f'{row[index]}, {text}' if row[index] else text
+
+
+def pivot_rows(task, schema):
+    """
+    Строки сводной выгрузки: одна строка на анкету, столбец на вопрос.
+
+    Анкеты читаются порциями по ``PIVOT_CHUNK_SIZE``; ответы, выбранные
+    варианты и количество фото порции загружаются тремя запросами
+    ``values_list``, так что в памяти держится только одна порция.
+    Вопрос с несколькими вариантами дает по столбцу-признаку на вариант
+    (1 — выбран), фото-вопрос — количество фото, остальные — текст ответа
+    или выбранного варианта. Варианты SELECT_* берутся из id в тексте
+    ответа, как в ``tasks.aggregation``.
+    """
+    headers, question_columns, choice_columns = _pivot_columns(schema)
+    photo_columns = [
+        question_columns[question['id']] for question in schema if question['question_type'] == 'PHOTO'
+    ]
+    choice_texts = {choice['id']: choice['choice_text'] for question in schema for choice in question['choices']}
+    choice_id_questions = {
+        question['id'] for question in schema
+        if question['question_type'] in CHOICE_ID_TEXT_TYPES and question['choices']
+    }
+    through = SurveyAnswer.selected_choices.through
+
+    submissions = (
+        SurveySubmission.objects
+        .filter(task=task)
+        .order_by('created_at', 'id')
+        .values_list('id', 'client__name', 'user__username', 'user__first_name', 'user__last_name', 'created_at')
+        .iterator(chunk_size=PIVOT_CHUNK_SIZE)
+    )
+    while True:
+        chunk = list(islice(submissions, PIVOT_CHUNK_SIZE))
+        if not chunk:
+            return
+        rows = {}
+        for pk, client_name, username, first_name, last_name, created_at in chunk:
+            row = rows[pk] = [''] * len(headers)
+            row[:len(PIVOT_HEADERS)] = [
+                task.title,
+                client_name,
+                f'{first_name} {last_name}'.strip() or username,
+                format_datetime(created_at),
+            ]
+            for index in chain(choice_columns.values(), photo_columns):
+                row[index] = 0
+        submission_ids = list(rows)
+
+        answers = (
+            SurveyAnswer.objects
+            .filter(submission_id__in=submission_ids)
+            .exclude(text_answer__isnull=True)
+            .exclude(text_answer='')
+            .order_by('id')
+            .values_list('submission_id', 'question_id', 'text_answer')
+        )
+        for submission_id, question_id, text_answer in answers:
+            row = rows[submission_id]
+            if question_id in choice_id_questions:
+                for choice_id in map(int, re.findall(r'\d+', text_answer)):
+                    _mark_choice(row, question_id, choice_id, question_columns, choice_columns, choice_texts)
+            elif question_id in question_columns:
+                index = question_columns[question_id]
+                row[index] = f'{row[index]}; {text_answer}' if row[index] else text_answer
+
+        selected = (
+            through.objects
+            .filter(surveyanswer__submission_id__in=submission_ids)
+            .order_by('surveyquestionchoice__order', 'surveyquestionchoice_id')
+            .values_list('surveyanswer__submission_id', 'surveyanswer__question_id', 'surveyquestionchoice_id')
+        )
+        for submission_id, question_id, choice_id in selected:
+            _mark_choice(rows[submission_id], question_id, choice_id, question_columns, choice_columns, choice_texts)
+
+        photos = (
+            SurveyAnswerPhoto.objects
+            .filter(answer__submission_id__in=submission_ids)
+            .values_list('answer__submission_id', 'answer__question_id')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        for submission_id, question_id, count in photos:
+            if question_id in question_columns:
+                rows[submission_id][question_columns[question_id]] += count
+
+        yield from rows.values()
+
+
+def answer_table(task):
+    """Выгрузка «строка на ответ»."""
+    return ExportTable(f"Ответы {task.title[:30]}", ANSWER_HEADERS, answer_rows(task), WRAPPED_COLUMNS)
+
+
+def pivot_table(task):
+    """Сводная выгрузка «строка на анкету, столбец на вопрос»."""
+    schema = get_survey_schema(task.pk)
+    return ExportTable(f"Анкеты {task.title[:24]}", _pivot_columns(schema)[0], pivot_rows(task, schema), ())
+
+
+# Вид выгрузки -> построение таблицы
+EXPORT_LAYOUTS = {
+    'answers': answer_table,
+    'pivot': pivot_table,
+}
+
+
+def export_row_count(task, layout):
+    """Количество строк выгрузки без заголовка (для прогресса фоновой задачи)."""
+    if layout == 'pivot':
+        return SurveySubmission.objects.filter(task=task).count()
+    return SurveyAnswer.objects.filter(question__task=task).count()
+
+
+def _with_progress(rows, progress):
+    """Передает строки дальше, сообщая ``progress(n)`` о каждой записанной порции."""
+    count = 0
+    for row in rows:
+        yield row
+        count += 1
+        if progress and count % EXPORT_CHUNK_SIZE == 0:
+            progress(EXPORT_CHUNK_SIZE)
+    if progress and count % EXPORT_CHUNK_SIZE:
+        progress(count % EXPORT_CHUNK_SIZE)
+
+
+def column_widths(rows, count):
+    """Ширины ``count`` столбцов по самым длинным значениям (не больше ``MAX_COLUMN_WIDTH``)."""
+    widths = [0] * count
+    for row in rows:
+        for index, value in enumerate(row):
+            widths[index] = max(widths[index], len(str(value)))
+    return [min(width + 2, MAX_COLUMN_WIDTH) for width in widths]
+
+
+def write_answers_workbook(task, file, progress=None, layout='answers'):
+    """
+    Пишет xlsx с ответами задачи в ``file`` (путь или файловый объект).
+
+    ``layout`` — ключ ``EXPORT_LAYOUTS``. ``progress(n)`` вызывается после
+    каждых ``EXPORT_CHUNK_SIZE`` строк.
+
+    Returns
+    -------
+    int
+        Количество выгруженных строк.
+    """
+    table = EXPORT_LAYOUTS[layout](task)
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet(table.title)
+
+    rows = iter(table.rows)
+    sample = list(islice(rows, WIDTH_SAMPLE_SIZE))
+    for index, width in enumerate(column_widths([table.headers] + sample, len(table.headers)), 1):
+        worksheet.column_dimensions[get_column_letter(index)].width = width
+
+    header = []
+    for title in table.headers:
+        cell = WriteOnlyCell(worksheet, value=title)
+        cell.font = HEADER_FONT
+        cell.fill = HEADER_FILL
+        cell.alignment = HEADER_ALIGNMENT
+        header.append(cell)
+    worksheet.append(header)
+
+    count = 0
+    for row in _with_progress(chain(sample, rows), progress):
+        for index in table.wrapped_columns:
+            row[index] = cell = WriteOnlyCell(worksheet, value=row[index])
+            cell.alignment = ROW_ALIGNMENT
+        worksheet.append(row)
+        count += 1
+
+    workbook.save(file)
+    return count
+
+
+def write_answers_csv(task, file, progress=None, layout='answers'):
+    """
+    Пишет CSV с ответами задачи в двоичный файловый объект ``file``.
+
+    UTF-8 с BOM и разделитель «;», чтобы файл открывался в Excel.
+    ``layout`` — ключ ``EXPORT_LAYOUTS``. ``progress(n)`` вызывается после
+    каждых ``EXPORT_CHUNK_SIZE`` строк.
+
+    Returns
+    -------
+    int
+        Количество выгруженных строк.
+    """
+    table = EXPORT_LAYOUTS[layout](task)
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    writer = csv.writer(text, delimiter=CSV_DELIMITER)
+    writer.writerow(table.headers)
+    count = 0
+    for row in _with_progress(table.rows, progress):
+        writer.writerow(row)
+        count += 1
+    text.flush()
+    text.detach()
+    return count
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Live feed of survey submissions for the moderator answers page.
+
+Committed submissions and read-status changes are published to an
+in-process pub/sub (``feed``); the async ``submission_events`` view keeps
+one Server-Sent Events stream per open moderator tab and pushes only those
+events, so open tabs do not query the database. Events carry increasing
+ids and the last ``FEED_HISTORY`` of them are kept, so a reconnecting
+browser (``Last-Event-ID``) gets what it missed; when the gap is older, or
+a tab cannot keep up, it receives a ``reset`` event and reloads the list.
+
+The feed lives in process memory: it needs an ASGI server (``config.asgi``)
+and reaches only the tabs connected to the process that handled the write.
+Served over WSGI (``runserver``, ``config.wsgi``) the stream is refused with
+501 and the answers page polls the first page of the list every
+``POLL_INTERVAL_MS`` instead; unchanged pages are answered 304 by their ETag.
+"""
+
+import asyncio
+import json
+import threading
+from collections import deque, namedtuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+FEED_HISTORY = 500
+SUBSCRIBER_QUEUE_SIZE = 100
+KEEPALIVE_INTERVAL = 15
+RECONNECT_DELAY_MS = 3000
+# Без живой ленты (WSGI) страница запрашивает первую страницу списка с этим интервалом
+POLL_INTERVAL_MS = 30000
+# Больше id в одном событии не отправляем — вкладки перезагружают список
+MAX_EVENT_IDS = 1000
+
+Event = namedtuple('Event', 'id type data')
+
+
+class Subscription:
+    """Очередь событий одной открытой вкладки в ее event loop."""
+
+    def __init__(self, feed, loop):
+        self.feed = feed
+        self.loop = loop
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def put(self, event):
+        """Потокобезопасно передает событие в очередь подписчика."""
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Вкладка не успевает: вместо накопления событий просим перезагрузку
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(Event(event.id, 'reset', {}))
+
+    def close(self):
+        self.feed.unsubscribe(self)
+
+
+class SubmissionFeed:
+    """Внутрипроцессный pub/sub событий по анкетам."""
+
+    def __init__(self, history=FEED_HISTORY):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._history = deque(maxlen=history)
+        self._last_id = 0
+
+    def publish(self, event_type, data):
+        """Отправляет событие всем подписчикам; вызывается после коммита."""
+        with self._lock:
+            self._last_id += 1
+            event = Event(self._last_id, event_type, data)
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(event)
+        return event
+
+    def subscribe(self, last_event_id=None):
+        """
+        Подписывает текущий event loop.
+
+        Parameters
+        ----------
+        last_event_id : str, optional
+            Заголовок ``Last-Event-ID`` переподключившегося браузера;
+            пропущенные события ставятся в очередь сразу.
+        """
+        subscription = Subscription(self, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(subscription)
+            if last_event_id and last_event_id.isdigit() and int(last_event_id) != self._last_id:
+                missed_after = int(last_event_id)
+                missed = [event for event in self._history if event.id > missed_after]
+                # Пропуск старше истории (или id из прошлого запуска процесса)
+                if not missed or missed[0].id != missed_after + 1 or len(missed) > SUBSCRIBER_QUEUE_SIZE:
+                    missed = [Event(self._last_id, 'reset', {})]
+                for event in missed:
+                    subscription.queue.put_nowait(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def last_event_id(self):
+        return self._last_id
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+
+feed = SubmissionFeed()
+
+
+def format_event(event):
+    """Событие в формате text/event-stream."""
+    data = json.dumps(event.data, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f'id: {event.id}\nevent: {event.type}\ndata: {data}\n\n'
+
+
+async def event_stream(subscription, keepalive=KEEPALIVE_INTERVAL):
+    """
+    Поток SSE одной вкладки.
+
+    Раз в ``keepalive`` секунд без событий отправляется комментарий, чтобы
+    прокси не закрывали соединение. Поток завершается после ``reset``.
+    """
+    try:
+        yield f'retry: {RECONNECT_DELAY_MS}\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield format_event(event)
+            if event.type == 'reset':
+                break
+    finally:
+        subscription.close()
+
+
+def publish_submission(summary):
+    """Публикует краткую строку новой анкеты (формат страницы ``getGroupedAnswers``)."""
+    feed.publish('submission', summary)
+
+
+def publish_read(ids, read_at):
+    """Публикует отметку анкет прочитанными."""
+    if len(ids) > MAX_EVENT_IDS:
+        feed.publish('reset', {})
+    else:
+        feed.publish('read', {'ids': list(ids), 'readAt': read_at})
@@ -0,0 +1,162 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from clients.models import Client
+from tasks.exports import write_answers_workbook
+from tasks.models import (
+    Task, TaskType, TaskStatus, SurveyQuestion, SurveyQuestionChoice, SurveyAnswer, SurveyAnswerPhoto, SurveySubmission,
+)
+from users.models import CustomUser, UserRoles
+import functools
+import openpyxl
+import random
+import tempfile
+import time
+import tracemalloc
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
+
+QUESTION_TYPES = ['RADIO', 'CHECKBOX', 'TEXT', 'TEXT_SHORT', 'PHOTO']
+
+
+class Rollback(Exception):
+    """Raised to discard benchmark data."""
+
+
+def legacy_write_answers_workbook(task, file):
+    """Previous in-memory export with per-cell styles and a photo count query per row, kept for comparison."""
+    answers = SurveyAnswer.objects.filter(
+        question__task=task
+    ).select_related(
+        'user', 'question', 'client'
+    ).prefetch_related(
+        'photos', 'selected_choices'
+    ).order_by('client__name', 'question__order', 'created_at')
+
+    workbook = openpyxl.Workbook()
+    worksheet = workbook.active
+    worksheet.title = f"Ответы {task.title[:30]}"
+    headers = [
+        'Клиент', 'Сотрудник', 'Дата ответа', 'Вопрос', 'Тип вопроса',
+        'Выбранные варианты', 'Текстовый ответ', 'Количество фото'
+    ]
+    for col_num, header in enumerate(headers, 1):
+        cell = worksheet.cell(row=1, column=col_num, value=header)
+        cell.font = Font(bold=True)
+        cell.fill = PatternFill(start_color='D3D3D3', end_color='D3D3D3', fill_type='solid')
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+
+    row_num = 2
+    for answer in answers:
+        row_data = [
+            answer.client.name,
+            answer.user.get_full_name() or answer.user.username,
+            answer.created_at.strftime('%d.%m.%Y %H:%M:%S'),
+            answer.question.question_text,
+            answer.question.get_question_type_display(),
+            ', '.join([choice.choice_text for choice in answer.selected_choices.all()]),
+            answer.text_answer,
+            answer.photos.count(),
+        ]
+        for col_num, value in enumerate(row_data, 1):
+            cell = worksheet.cell(row=row_num, column=col_num, value=str(value) if value is not None else '')
+            cell.alignment = Alignment(wrap_text=True, vertical='top')
+        row_num += 1
+
+    for column in worksheet.columns:
+        max_length = max(len(str(cell.value)) for cell in column)
+        worksheet.column_dimensions[get_column_letter(column[0].column)].width = min(max_length + 2, 50)
+    workbook.save(file)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark survey answer Excel export: rows per second and peak memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--answers', type=int, default=200000, help='Number of answers to generate')
+        parser.add_argument('--layout', choices=['answers', 'pivot'], default='answers',
+                            help='Export layout: one row per answer or one row per submission')
+        parser.add_argument('--legacy', action='store_true',
+                            help='Also run the previous in-memory export (slow, needs a lot of memory)')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['answers'], options['layout'], options['legacy'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, answer_count, layout, legacy):
+        task = self.create_survey(answer_count)
+        row_count = answer_count if layout == 'answers' else SurveySubmission.objects.filter(task=task).count()
+        self.stdout.write(f"{'export':>10} {'rows/s':>10} {'seconds':>8} {'peak MB':>8} {'file MB':>8}")
+        self.measure('streaming', functools.partial(write_answers_workbook, layout=layout), task, row_count)
+        if legacy and layout == 'answers':
+            self.measure('in-memory', legacy_write_answers_workbook, task, answer_count)
+
+    def measure(self, name, export, task, row_count):
+        """Times the export, then repeats it under tracemalloc for the peak Python memory."""
+        with tempfile.TemporaryFile() as file:
+            started = time.perf_counter()
+            export(task, file)
+            elapsed = time.perf_counter() - started
+            size = file.tell()
+        with tempfile.TemporaryFile() as file:
+            tracemalloc.start()
+            export(task, file)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.stdout.write(
+            f"{name:>10} {row_count / elapsed:>10.0f} {elapsed:>8.2f} "
+            f"{peak / 2 ** 20:>8.1f} {size / 2 ** 20:>8.1f}"
+        )
+
+    def create_survey(self, answer_count):
+        """Creates a throwaway survey with `answer_count` answers from 50 clients, one submission per questionnaire."""
+        random.seed(0)
+        suffix = time.time_ns()
+        employee = CustomUser.objects.create(
+            username=f'employee_bench_{suffix}', first_name='Иван', last_name='Петров', role=UserRoles.EMPLOYEE
+        )
+        clients = Client.objects.bulk_create([Client(name=f'Клиент {suffix} {i}') for i in range(50)])
+        task = Task.objects.create(
+            title=f'Benchmark {suffix}', task_type=TaskType.SURVEY, status=TaskStatus.COMPLETED, client=clients[0]
+        )
+        questions = SurveyQuestion.objects.bulk_create([
+            SurveyQuestion(task=task, question_text=f'Вопрос {order}', question_type=question_type, order=order)
+            for order, question_type in enumerate(QUESTION_TYPES)
+        ])
+        choices = {
+            question.id: SurveyQuestionChoice.objects.bulk_create([
+                SurveyQuestionChoice(question=question, choice_text=f'Вариант {i}', order=i) for i in range(4)
+            ])
+            for question in questions if question.question_type in ('RADIO', 'CHECKBOX')
+        }
+
+        submissions = SurveySubmission.objects.bulk_create([
+            SurveySubmission(task=task, client=clients[number % len(clients)], user=employee)
+            for number in range(-(-answer_count // len(questions)))
+        ], batch_size=5000)
+        answers = SurveyAnswer.objects.bulk_create([
+            SurveyAnswer(
+                question=questions[number % len(questions)],
+                submission=submissions[number // len(questions)],
+                user=employee,
+                client=clients[number // len(questions) % len(clients)],
+                text_answer=f'Ответ {number} ' * random.randint(1, 8)
+                if questions[number % len(questions)].question_type in ('TEXT', 'TEXT_SHORT') else None,
+            )
+            for number in range(answer_count)
+        ], batch_size=5000)
+
+        through = SurveyAnswer.selected_choices.through
+        through.objects.bulk_create([
+            through(surveyanswer_id=answer.pk, surveyquestionchoice_id=choice.pk)
+            for answer in answers if answer.question_id in choices
+            for choice in random.sample(choices[answer.question_id], 2)
+        ], batch_size=5000)
+        SurveyAnswerPhoto.objects.bulk_create([
+            SurveyAnswerPhoto(answer=answer, photo=f'survey_answer_photos/bench_{answer.pk}.jpg')
+            for answer in answers if answer.question.question_type == 'PHOTO'
+        ], batch_size=5000)
+        return task
@@ -0,0 +1,93 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.http import QueryDict
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from clients.models import Client
+from tasks.forms import SurveyResponseForm
+from tasks.models import Task, TaskType, TaskStatus, SurveyQuestion, SurveyQuestionChoice
+from users.models import CustomUser, UserRoles
+import time
+
+QUESTION_TYPES = ['RADIO', 'CHECKBOX', 'TEXT', 'TEXT_SHORT', 'SELECT_SINGLE', 'SELECT_MULTIPLE']
+
+
+class Rollback(Exception):
+    """Raised to discard benchmark data."""
+
+
+class Command(BaseCommand):
+    help = 'Benchmark survey submission: query count and latency against question count'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, nargs='+', default=[10, 30, 60, 120],
+                            help='Question counts to benchmark')
+        parser.add_argument('--repeat', type=int, default=20, help='Submissions per question count')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'questions':>10} {'queries':>8} {'avg ms':>10} {'min ms':>10}")
+        for question_count in options['questions']:
+            try:
+                with transaction.atomic():
+                    queries, timings = self.run_case(question_count, options['repeat'])
+                    raise Rollback
+            except Rollback:
+                pass
+            self.stdout.write(
+                f"{question_count:>10} {queries:>8} "
+                f"{sum(timings) / len(timings) * 1000:>10.2f} {min(timings) * 1000:>10.2f}"
+            )
+
+    def run_case(self, question_count, repeat):
+        """Creates a throwaway survey and submits it `repeat` times."""
+        suffix = f'bench_{question_count}_{time.time_ns()}'
+        employee = CustomUser.objects.create(username=f'employee_{suffix}', role=UserRoles.EMPLOYEE)
+        client = Client.objects.create(name=f'Client {suffix}')
+        task = Task.objects.create(
+            title=f'Benchmark {suffix}',
+            task_type=TaskType.SURVEY,
+            status=TaskStatus.SENT,
+            client=client,
+        )
+
+        data = QueryDict(mutable=True)
+        for order in range(question_count):
+            question_type = QUESTION_TYPES[order % len(QUESTION_TYPES)]
+            question = SurveyQuestion.objects.create(
+                task=task, question_text=f'Вопрос {order}', order=order, question_type=question_type
+            )
+            field_name = f'question_{question.id}'
+            if question_type in ('RADIO', 'CHECKBOX'):
+                choices = SurveyQuestionChoice.objects.bulk_create([
+                    SurveyQuestionChoice(question=question, choice_text=f'Вариант {i}', order=i)
+                    for i in range(4)
+                ])
+                if question_type == 'RADIO':
+                    data[field_name] = str(choices[0].id)
+                else:
+                    data.setlist(field_name, [str(choices[0].id), str(choices[2].id)])
+            elif question_type == 'SELECT_SINGLE':
+                data[field_name] = 'да'
+            elif question_type == 'SELECT_MULTIPLE':
+                data.setlist(field_name, ['да', 'нет'])
+            else:
+                data[field_name] = 'ответ'
+
+        queries = 0
+        timings = []
+        for _ in range(repeat):
+            form = SurveyResponseForm(task, employee, data=data)
+            if not form.is_valid():
+                raise ValueError(form.errors)
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                # Как SurveyResponseView.form_valid. Данные откатываются внешней
+                # транзакцией, поэтому работа после фиксации (статистика, сводки,
+                # живая лента, версии данных) выполняется явно внутри замера
+                with TestCase.captureOnCommitCallbacks(execute=True):
+                    with transaction.atomic():
+                        form.save()
+                        task.register_survey_submission()
+                timings.append(time.perf_counter() - started)
+            queries = len(context.captured_queries)
+        return queries, timings
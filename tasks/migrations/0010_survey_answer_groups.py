@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0003_client_trading_point_address_and_more'),
+        ('tasks', '0009_alter_surveyanswerphoto_photo_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='surveyanswergroupreadstatus',
+            name='date_created',
+            field=models.DateField(verbose_name='Дата создания группы'),
+        ),
+        migrations.AddIndex(
+            model_name='surveyanswer',
+            index=models.Index(fields=['user', 'client', 'created_at'], name='surveyanswer_group_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='surveyanswer',
+            index=models.Index(fields=['created_at'], name='surveyanswer_created_idx'),
+        ),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 2000
+
+
+def backfill_submissions(apps, schema_editor):
+    """
+    Creates a submission for every former answer group.
+
+    Existing answers had no link to the form they came from, so they are
+    grouped the way the admin page grouped them: by task, client, user and
+    local day. Answers are processed in id batches; read statuses of the
+    groups are copied to the submissions.
+    """
+    SurveyAnswer = apps.get_model('tasks', 'SurveyAnswer')
+    SurveySubmission = apps.get_model('tasks', 'SurveySubmission')
+    SurveyAnswerGroupReadStatus = apps.get_model('tasks', 'SurveyAnswerGroupReadStatus')
+
+    submission_ids = {}
+    last_id = 0
+    while True:
+        batch = list(
+            SurveyAnswer.objects
+            .filter(id__gt=last_id)
+            .order_by('id')
+            .values('id', 'question__task_id', 'client_id', 'user_id', 'created_at', 'submission_id')[:BACKFILL_BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1]['id']
+
+        groups = {}
+        for row in batch:
+            if row['submission_id'] is not None:
+                continue
+            key = (row['question__task_id'], row['client_id'], row['user_id'],
+                   django.utils.timezone.localdate(row['created_at']))
+            groups.setdefault(key, []).append(row)
+
+        new_keys = [key for key in groups if key not in submission_ids]
+        created = SurveySubmission.objects.bulk_create([
+            SurveySubmission(
+                task_id=key[0], client_id=key[1], user_id=key[2],
+                created_at=min(row['created_at'] for row in groups[key]),
+            )
+            for key in new_keys
+        ])
+        submission_ids.update(zip(new_keys, (submission.pk for submission in created)))
+
+        # Одно UPDATE на группу: bulk_update строит CASE на каждую строку и медленнее в разы
+        for key, rows in groups.items():
+            SurveyAnswer.objects.filter(id__in=[row['id'] for row in rows]).update(submission_id=submission_ids[key])
+
+    statuses = SurveyAnswerGroupReadStatus.objects.filter(read_at__isnull=False)
+    read = []
+    for status in statuses.iterator():
+        submission_id = submission_ids.get((status.task_id, status.client_id, status.user_id, status.date_created))
+        if submission_id is not None:
+            read.append(SurveySubmission(id=submission_id, read_at=status.read_at, read_by_id=status.read_by_id))
+    SurveySubmission.objects.bulk_update(read, ['read_at', 'read_by'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0003_client_trading_point_address_and_more'),
+        ('tasks', '0010_survey_answer_groups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SurveySubmission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Создано')),
+                ('read_at', models.DateTimeField(blank=True, null=True, verbose_name='Отмечено как прочитано')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='survey_submissions', to='clients.client', verbose_name='Клиент')),
+                ('read_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='read_survey_submissions', to=settings.AUTH_USER_MODEL, verbose_name='Прочитано пользователем')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submissions', to='tasks.task', verbose_name='Задача')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='survey_submissions', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Заполненная анкета',
+                'verbose_name_plural': 'Заполненные анкеты',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [
+                    models.Index(fields=['created_at', 'id'], name='submission_created_idx'),
+                    models.Index(fields=['task', 'created_at'], name='submission_task_idx'),
+                    models.Index(fields=['user', 'created_at'], name='submission_user_idx'),
+                    models.Index(fields=['client', 'created_at'], name='submission_client_idx'),
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name='surveyanswer',
+            name='submission',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='tasks.surveysubmission', verbose_name='Анкета'),
+        ),
+        migrations.RunPython(backfill_submissions, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='surveyanswer',
+            name='surveyanswer_group_idx',
+        ),
+        migrations.DeleteModel(
+            name='SurveyAnswerGroupReadStatus',
+        ),
+    ]
@@ -6,7 +6,8 @@ Implements SOLID principles by separating different task types into
 specialized models while maintaining a common base.
 """
 
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import FileExtensionValidator
 from users.models import CustomUser, UserRoles
@@ -133,6 +134,43 @@ class Task(models.Model):
         """Проверяет, может ли пользователь редактировать задачу."""
         return user.role == UserRoles.MODERATOR
     
+    def register_survey_submission(self):
+        """
+        Атомарно учитывает заполненную анкету.
+        
+        Счетчик увеличивается одним условным UPDATE через F-выражения:
+        в том же запросе задача переводится в статус "На проверке" и
+        становится неактивной, если план достигнут. Перечитанная строка
+        обновляет экземпляр.
+        
+        Returns
+        -------
+        bool
+            True, если именно эта анкета выполнила план.
+        """
+        new_count = models.F('current_count') + 1
+        plan_reached = models.Q(target_count__gt=0) & models.Q(target_count__lte=new_count)
+        with transaction.atomic():
+            Task.objects.filter(pk=self.pk).update(
+                current_count=new_count,
+                status=models.Case(
+                    models.When(plan_reached, then=models.Value(TaskStatus.ON_CHECK)),
+                    default=models.F('status'),
+                ),
+                is_active=models.Case(
+                    models.When(plan_reached, then=models.Value(False)),
+                    default=models.F('is_active'),
+                ),
+                updated_at=timezone.now(),
+            )
+            row = Task.objects.filter(pk=self.pk).values(
+                'current_count', 'target_count', 'status', 'is_active', 'updated_at'
+            ).get()
+        for field, value in row.items():
+            setattr(self, field, value)
+        # План выполнен ровно той анкетой, на которой счетчик сравнялся с целью
+        return self.target_count > 0 and self.current_count == self.target_count
+    
     def get_completion_percentage(self):
         """Возвращает процент выполнения для анкет."""
         if self.task_type == TaskType.SURVEY and self.target_count > 0:
@@ -235,6 +273,61 @@ class SurveyQuestionChoice(models.Model):
         verbose_name_plural = _('Варианты ответов')
         ordering = ['order']
 
+class SurveySubmission(models.Model):
+    """
+    One filled-in survey form.
+
+    Created once per ``SurveyResponseForm.save``; all answers of the form
+    point to it. Moderators mark submissions as read.
+    """
+    task = models.ForeignKey(
+        'Task',
+        on_delete=models.CASCADE,
+        related_name='submissions',
+        verbose_name=_('Задача')
+    )
+    client = models.ForeignKey(
+        Client,
+        on_delete=models.CASCADE,
+        related_name='survey_submissions',
+        verbose_name=_('Клиент')
+    )
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='survey_submissions',
+        verbose_name=_('Пользователь')
+    )
+    created_at = models.DateTimeField(_('Создано'), default=timezone.now)
+    read_at = models.DateTimeField(_('Отмечено как прочитано'), null=True, blank=True)
+    read_by = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='read_survey_submissions',
+        verbose_name=_('Прочитано пользователем')
+    )
+
+    def __str__(self):
+        return f"Анкета: {self.task.title} - {self.client.name} - {self.user.username} ({self.created_at:%Y-%m-%d %H:%M})"
+
+    @property
+    def is_read(self):
+        return self.read_at is not None
+
+    class Meta:
+        verbose_name = _('Заполненная анкета')
+        verbose_name_plural = _('Заполненные анкеты')
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='submission_created_idx'),
+            models.Index(fields=['task', 'created_at'], name='submission_task_idx'),
+            models.Index(fields=['user', 'created_at'], name='submission_user_idx'),
+            models.Index(fields=['client', 'created_at'], name='submission_client_idx'),
+        ]
+
+
 # УДАЛИТЕ поле photo из SurveyAnswer
 class SurveyAnswer(models.Model):
     """
@@ -251,6 +344,14 @@ class SurveyAnswer(models.Model):
         on_delete=models.CASCADE,
         verbose_name=_('Пользователь')
     )
+    submission = models.ForeignKey(
+        SurveySubmission,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='answers',
+        verbose_name=_('Анкета')
+    )
     selected_choices = models.ManyToManyField(
         SurveyQuestionChoice,
         blank=True,
@@ -270,53 +371,14 @@ class SurveyAnswer(models.Model):
     class Meta:
         verbose_name = _('Ответ на вопрос')
         verbose_name_plural = _('Ответы на вопросы')
+        indexes = [
+            models.Index(fields=['created_at'], name='surveyanswer_created_idx'),
+        ]
 
 # ДОБАВЬТЕ новую модель для фото
 import os
 from datetime import datetime
 
-class SurveyAnswerGroupReadStatus(models.Model):
-    """
-    Model to track when a group of survey answers is marked as read.
-    A group is defined by task, client, user, and date.
-    """
-    task = models.ForeignKey(
-        'Task',
-        on_delete=models.CASCADE,
-        verbose_name=_('Задача')
-    )
-    client = models.ForeignKey(
-        Client,
-        on_delete=models.CASCADE,
-        verbose_name=_('Клиент')
-    )
-    user = models.ForeignKey(
-        CustomUser,
-        on_delete=models.CASCADE,
-        verbose_name=_('Пользователь')
-    )
-    date_created = models.DateField(_('Дата создания группы'), auto_now_add=True)
-    read_at = models.DateTimeField(_('Отмечено как прочитано'), null=True, blank=True)
-    read_by = models.ForeignKey(
-        CustomUser,
-        on_delete=models.SET_NULL,
-        null=True,
-        blank=True,
-        related_name='read_survey_groups',
-        verbose_name=_('Прочитано пользователем')
-    )
-    created_at = models.DateTimeField(_('Создано'), auto_now_add=True)
-    
-    def __str__(self):
-        return f"Группа: {self.task.title} - {self.client.name} - {self.user.username} ({self.date_created})"
-    
-    class Meta:
-        verbose_name = _('Статус прочтения группы ответов')
-        verbose_name_plural = _('Статусы прочтения групп ответов')
-        unique_together = ['task', 'client', 'user', 'date_created']
-        ordering = ['-created_at']
-
-
 class SurveyAnswerPhoto(models.Model):
     """
     Multiple photos for a single survey answer.
@@ -336,6 +398,15 @@ class SurveyAnswerPhoto(models.Model):
     created_at = models.DateTimeField(_('Создано'), auto_now_add=True)
     
     def save(self, *args, **kwargs):
+        self.apply_storage_path()
+        super().save(*args, **kwargs)
+    
+    def apply_storage_path(self):
+        """
+        Раскладывает фото по папкам клиента и даты.
+        
+        Вызывается из save() и перед bulk_create, который save() не вызывает.
+        """
         # Only modify the path if the file is being saved for the first time
         # and we have the required data
         if self.answer and self.answer.client and self.photo and hasattr(self.photo, 'name'):
@@ -356,7 +427,6 @@ class SurveyAnswerPhoto(models.Model):
             # Construct the new path using forward slashes only (Django handles this correctly)
             # Avoid duplication by not adding survey_answer_photos/ again since the upload_to already does this
             self.photo.name = f"survey_answer_photos/{client_name}/{date_path}/{new_filename}".replace('\\', '/')
-        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"Фото для ответа {self.answer.id}"
@@ -582,3 +652,22 @@ class TaskStatistics(models.Model):
     
     def __str__(self):
         return f"Статистика: {self.task.title}"
+
+
+class DataVersion(models.Model):
+    """
+    Counter of changes of one kind of data, shared by all processes.
+
+    Read and bumped by ``tasks.versions``; the counters are used in ETags
+    and cache keys so that a change committed by one worker is seen by
+    every other.
+    """
+    name = models.CharField(_('Данные'), max_length=100, primary_key=True)
+    value = models.BigIntegerField(_('Версия'))
+
+    class Meta:
+        verbose_name = _('Версия данных')
+        verbose_name_plural = _('Версии данных')
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled survey form schema.
+
+The question/choice layout of a survey task is compiled once into plain
+dicts and lists and kept in the Django cache. A cache hit costs exactly one
+query: the primary key read of the task's schema version.
+
+Each task has its own schema version that is part of the cache key. It is a
+``DataVersion`` row (``tasks.versions``) rather than a cache entry because
+the default cache is per-process ``LocMemCache``: a question edited in one
+worker has to invalidate the schema cached by every other worker, which a
+version kept in the local cache cannot do. The one indexed read per form is
+the accepted cost of that cross-process invalidation. Signal handlers in
+``tasks.signals`` bump it whenever a question or a choice is saved or
+deleted, in the transaction of the change. A schema compiled concurrently
+from the old questions is stored under the old version and never read
+again, where deleting the key could let it be written back after the
+invalidation.
+"""
+
+from django.core.cache import cache
+
+from . import versions
+from .models import SurveyQuestion
+
+# Bump when the layout of the compiled schema changes.
+SCHEMA_FORMAT = 1
+SCHEMA_CACHE_TIMEOUT = 60 * 60
+
+
+def schema_version_name(task_id):
+    """Name of the data version of a task's questions and choices."""
+    return f'survey_schema:{task_id}'
+
+
+def schema_cache_key(task_id, version):
+    """Cache key of the compiled schema of a task at a schema version."""
+    return f'survey_schema:v{SCHEMA_FORMAT}:{task_id}:{version}'
+
+
+def compile_survey_schema(task_id):
+    """
+    Compiles the survey layout of a task.
+
+    Returns
+    -------
+    list[dict]
+        Questions ordered by ``order`` with their choices::
+
+            {'id', 'question_text', 'question_type', 'question_type_display',
+             'order', 'choices': [{'id', 'choice_text'}, ...]}
+    """
+    questions = (
+        SurveyQuestion.objects
+        .filter(task_id=task_id)
+        .prefetch_related('choices')
+        .order_by('order', 'id')
+    )
+    return [
+        {
+            'id': question.id,
+            'question_text': question.question_text,
+            'question_type': question.question_type,
+            'question_type_display': question.get_question_type_display(),
+            'order': question.order,
+            'choices': [
+                {'id': choice.id, 'choice_text': choice.choice_text}
+                for choice in question.choices.all()
+            ],
+        }
+        for question in questions
+    ]
+
+
+def get_survey_schema(task_id):
+    """
+    Returns the compiled schema of a task, compiling it on a cache miss.
+
+    One query (the schema version) on a cache hit, see the module docstring.
+    """
+    name = schema_version_name(task_id)
+    key = schema_cache_key(task_id, versions.get_versions(name)[name])
+    schema = cache.get(key)
+    if schema is None:
+        schema = compile_survey_schema(task_id)
+        cache.set(key, schema, SCHEMA_CACHE_TIMEOUT)
+    return schema
+
+
+def invalidate_survey_schema(task_id):
+    """Moves a task to a new schema version, so its cached schema is no longer used."""
+    versions.bump(schema_version_name(task_id))
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Survey services.
+
+This module provides business logic for persisting filled-in surveys,
+separated from forms and views.
+"""
+
+from django.db import transaction
+
+from .models import SurveyAnswer, SurveyAnswerPhoto, SurveySubmission
+from .signals import survey_submitted
+
+CHOICE_QUESTION_TYPES = ('RADIO', 'CHECKBOX', 'SELECT_SINGLE', 'SELECT_MULTIPLE')
+TEXT_QUESTION_TYPES = ('TEXT', 'TEXT_SHORT', 'SELECT_SINGLE', 'SELECT_MULTIPLE')
+MAX_PHOTOS_PER_ANSWER = 10
+
+
+class SurveySubmissionService:
+    """
+    Пакетное сохранение заполненной анкеты.
+
+    Ответы сначала проверяются и собираются в памяти, затем в одной
+    транзакции создается ``SurveySubmission`` и выполняются три
+    bulk-вставки: ответы, выбранные варианты и фото. Количество запросов
+    не зависит от числа вопросов.
+    """
+
+    def __init__(self, task, user, client):
+        self.task = task
+        self.user = user
+        self.client = client
+
+    def submit(self, schema, cleaned_data, files):
+        """
+        Сохраняет ответы на анкету.
+
+        Parameters
+        ----------
+        schema : list[dict]
+            Скомпилированная схема анкеты (см. ``tasks.schema``).
+        cleaned_data : dict
+            Очищенные данные формы.
+        files : MultiValueDict
+            Загруженные файлы формы.
+
+        Returns
+        -------
+        list[SurveyAnswer]
+            Созданные ответы.
+
+        Raises
+        ------
+        ValueError
+            Если выбран вариант ответа, не относящийся к вопросу.
+        """
+        pending = []
+        for question in schema:
+            field_name = f"question_{question['id']}"
+            if field_name not in cleaned_data:
+                continue
+            pending.append(self._build_answer(question, cleaned_data[field_name], files.getlist(field_name)))
+
+        if not pending:
+            return []
+
+        through = SurveyAnswer.selected_choices.through
+        with transaction.atomic():
+            submission = SurveySubmission.objects.create(task=self.task, user=self.user, client=self.client)
+            for answer, _, _ in pending:
+                answer.submission = submission
+            answers = SurveyAnswer.objects.bulk_create([answer for answer, _, _ in pending])
+
+            through.objects.bulk_create([
+                through(surveyanswer_id=answer.pk, surveyquestionchoice_id=choice_id)
+                for answer, choice_ids, _ in pending
+                for choice_id in choice_ids
+            ])
+
+            photos = []
+            for answer, _, uploaded_files in pending:
+                for photo_file in uploaded_files:
+                    photo = SurveyAnswerPhoto(answer=answer, photo=photo_file)
+                    photo.apply_storage_path()
+                    photos.append(photo)
+            SurveyAnswerPhoto.objects.bulk_create(photos)
+
+            survey_submitted.send(
+                sender=self.task.__class__,
+                task=self.task,
+                user=self.user,
+                client=self.client,
+                submission=submission,
+                answers=answers,
+                choice_ids={answer.pk: choice_ids for answer, choice_ids, _ in pending if choice_ids},
+                photos=photos,
+            )
+
+        return answers
+
+    def _build_answer(self, question, answer_data, uploaded_files):
+        """Собирает несохраненный ответ, id выбранных вариантов и файлы фото."""
+        answer = SurveyAnswer(question_id=question['id'], user=self.user, client=self.client)
+        choice_ids = []
+        photo_files = []
+        has_choices = bool(question['choices'])
+
+        if question['question_type'] == 'RADIO':
+            if has_choices:
+                if answer_data:
+                    choice_ids = self._validate_choices(question, [answer_data])
+            else:
+                answer.text_answer = answer_data
+
+        elif question['question_type'] == 'CHECKBOX':
+            if has_choices:
+                if answer_data:
+                    choice_ids = self._validate_choices(question, answer_data)
+            else:
+                answer.text_answer = self._join(answer_data)
+
+        elif question['question_type'] in TEXT_QUESTION_TYPES:
+            answer.text_answer = self._join(answer_data)
+
+        elif question['question_type'] == 'PHOTO':
+            if answer_data:
+                photo_files = uploaded_files[:MAX_PHOTOS_PER_ANSWER]
+
+        return answer, choice_ids, photo_files
+
+    @staticmethod
+    def _validate_choices(question, raw_ids):
+        """Проверяет, что выбранные варианты принадлежат вопросу."""
+        allowed = {choice['id'] for choice in question['choices']}
+        error = f"Некорректный вариант ответа для вопроса '{question['question_text']}'"
+        try:
+            choice_ids = [int(raw_id) for raw_id in raw_ids]
+        except (TypeError, ValueError):
+            raise ValueError(error)
+        if not set(choice_ids) <= allowed:
+            raise ValueError(error)
+        return list(dict.fromkeys(choice_ids))
+
+    @staticmethod
+    def _join(answer_data):
+        """Приводит ответ к строке (списки значений — через запятую)."""
+        if isinstance(answer_data, (list, tuple)):
+            return ', '.join(answer_data)
+        return answer_data or ''
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Signals and signal handlers for the tasks app.
+
+Handlers are connected in ``TasksConfig.ready``.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from users.models import CustomUser
+from . import live, versions
+from .answer_groups import serialize_summaries
+from .models import SurveyAnswer, SurveyAnswerPhoto, SurveyQuestion, SurveyQuestionChoice, SurveySubmission, Task
+from .schema import invalidate_survey_schema
+
+# Отправляется SurveySubmissionService внутри транзакции сохранения анкеты.
+# Ответы вставляются через bulk_create, поэтому post_save для них не вызывается.
+# Аргументы: task, user, client, submission (SurveySubmission), answers (list[SurveyAnswer] с pk),
+# choice_ids (dict: pk ответа -> list id выбранных вариантов), photos (list[SurveyAnswerPhoto]).
+survey_submitted = Signal()
+
+
+@receiver([post_save, post_delete], sender=SurveyQuestion)
+def drop_schema_on_question_change(sender, instance, **kwargs):
+    """Сбрасывает схему анкеты при изменении вопроса."""
+    invalidate_survey_schema(instance.task_id)
+
+
+@receiver([post_save, post_delete], sender=SurveyQuestionChoice)
+def drop_schema_on_choice_change(sender, instance, **kwargs):
+    """Сбрасывает схему анкеты при изменении варианта ответа."""
+    task_id = (
+        SurveyQuestion.objects
+        .filter(pk=instance.question_id)
+        .values_list('task_id', flat=True)
+        .first()
+    )
+    if task_id is not None:
+        invalidate_survey_schema(task_id)
+
+
+@receiver(survey_submitted)
+def publish_submission_on_submit(sender, submission, answers, photos, **kwargs):
+    """Отправляет строку новой анкеты в живую ленту после фиксации транзакции."""
+    submission.answer_count = len(answers)
+    submission.photo_count = len(photos)
+    transaction.on_commit(
+        lambda: live.publish_submission(serialize_summaries([submission])),
+        robust=True,
+    )
+
+
+@receiver([post_save, post_delete], sender=SurveySubmission)
+@receiver([post_save, post_delete], sender=SurveyAnswer)
+@receiver([post_save, post_delete], sender=SurveyAnswerPhoto)
+def bump_submissions_version(sender, **kwargs):
+    """Меняет версию анкет (ETag списка) после фиксации транзакции."""
+    versions.bump_on_commit(versions.SUBMISSIONS)
+
+
+@receiver([post_save, post_delete], sender=Task)
+def bump_tasks_version(sender, **kwargs):
+    versions.bump_on_commit(versions.TASKS)
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def bump_users_version(sender, **kwargs):
+    versions.bump_on_commit(versions.USERS)
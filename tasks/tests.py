@@ -1,3 +1,887 @@
-from django.test import TestCase
+import asyncio
+import io
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
 
-# Create your tests here.
+from types import SimpleNamespace
+from unittest import mock
+
+from datetime import timedelta
+
+import openpyxl
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, transaction
+from django.http import QueryDict
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
+
+from clients.models import Client
+from reports.services import IncrementalStatistics, StatisticsGenerator, statistics_tasks
+from users.models import CustomUser, UserRoles
+from . import answer_groups, dashboard, exports, live
+from .aggregation import aggregate_survey
+from .forms import SurveyResponseForm
+from .schema import get_survey_schema
+from .services import CHOICE_QUESTION_TYPES, SurveySubmissionService
+from .models import (
+    Task, TaskStatus, TaskType, PhotoReport, PhotoReportItem, SurveyAnswer, SurveyAnswerPhoto, SurveyQuestion,
+    SurveyQuestionChoice, SurveySubmission,
+)
+from .views import StatisticsView, survey_statistics_view
+
+
+def run_in_threads(thread_count, target):
+    """Запускает target в нескольких потоках одновременно и ждет завершения."""
+    barrier = threading.Barrier(thread_count)
+    errors = []
+
+    def worker(index):
+        try:
+            barrier.wait()
+            target(index)
+        except Exception as exc:  # pragma: no cover - surfaced by the assertion below
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def retry_when_locked(func, attempts=2000):
+    """SQLite сериализует запись: повторяет транзакцию, если база занята."""
+    for attempt in range(attempts):
+        try:
+            return func()
+        except OperationalError as exc:
+            if 'locked' not in str(exc) or attempt == attempts - 1:
+                raise
+            time.sleep(0.001)
+
+
+class SurveySubmissionServiceTests(TestCase):
+    """Пакетное сохранение анкеты: число запросов не зависит от числа вопросов."""
+
+    QUESTION_TYPES = ['RADIO', 'CHECKBOX', 'SELECT_MULTIPLE', 'TEXT', 'PHOTO']
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.client_obj = Client.objects.create(name='Клиент')
+        self.employee = CustomUser.objects.create(username='employee', role=UserRoles.EMPLOYEE)
+
+    def create_survey(self, question_count):
+        """Анкета из вопросов всех видов и данные формы с ответами на все вопросы."""
+        task = Task.objects.create(title=f'Анкета {question_count}', task_type=TaskType.SURVEY, client=self.client_obj)
+        cleaned_data = {}
+        files = MultiValueDict()
+        for order in range(question_count):
+            question_type = self.QUESTION_TYPES[order % len(self.QUESTION_TYPES)]
+            question = SurveyQuestion.objects.create(
+                task=task, question_text=f'Вопрос {order}', question_type=question_type, order=order
+            )
+            field_name = f'question_{question.id}'
+            choice_ids = [
+                str(SurveyQuestionChoice.objects.create(question=question, choice_text=f'Вариант {i}', order=i).id)
+                for i in range(3 if question_type in CHOICE_QUESTION_TYPES else 0)
+            ]
+            if question_type == 'RADIO':
+                cleaned_data[field_name] = choice_ids[0]
+            elif question_type in ('CHECKBOX', 'SELECT_MULTIPLE'):
+                cleaned_data[field_name] = choice_ids[:2]
+            elif question_type == 'PHOTO':
+                photos = [SimpleUploadedFile(f'photo{i}.jpg', b'photo', content_type='image/jpeg') for i in range(2)]
+                cleaned_data[field_name] = photos
+                files.setlist(field_name, photos)
+            else:
+                cleaned_data[field_name] = 'ответ'
+        return task, cleaned_data, files
+
+    def submit(self, question_count):
+        task, cleaned_data, files = self.create_survey(question_count)
+        schema = get_survey_schema(task.id)
+        # Точка сохранения, анкета, три bulk-вставки (ответы, варианты, фото)
+        with self.assertNumQueries(6):
+            answers = SurveySubmissionService(task, self.employee, self.client_obj).submit(schema, cleaned_data, files)
+        self.assertEqual(len(answers), question_count)
+        self.assertEqual(
+            SurveyAnswer.selected_choices.through.objects.filter(surveyanswer__question__task=task).count(),
+            3 * question_count // len(self.QUESTION_TYPES),
+        )
+        self.assertEqual(
+            SurveyAnswerPhoto.objects.filter(answer__question__task=task).count(),
+            2 * question_count // len(self.QUESTION_TYPES),
+        )
+
+    def test_query_count_does_not_grow_with_questions(self):
+        self.submit(10)
+        self.submit(20)
+
+    def test_select_multiple_is_read_in_both_formats(self):
+        task = Task.objects.create(title='Список', task_type=TaskType.SURVEY, status=TaskStatus.COMPLETED)
+        question = SurveyQuestion.objects.create(
+            task=task, question_text='Список', question_type='SELECT_MULTIPLE', order=0
+        )
+        choices = [
+            SurveyQuestionChoice.objects.create(question=question, choice_text=f'Вариант {i}', order=i).id
+            for i in range(3)
+        ]
+        # Раньше список сохранялся как str(list), теперь — id через запятую
+        for text_answer in (str([str(choices[0]), str(choices[1])]), f'{choices[1]}, {choices[2]}'):
+            submission = SurveySubmission.objects.create(task=task, user=self.employee, client=self.client_obj)
+            SurveyAnswer.objects.create(
+                question=question, user=self.employee, client=self.client_obj, submission=submission,
+                text_answer=text_answer,
+            )
+
+        counts = [1, 2, 1]
+        aggregate = aggregate_survey(task.id)
+        self.assertEqual([choice.count for choice in aggregate.get(question.id).choice_counts], counts)
+        StatisticsGenerator.generate_all_statistics(tasks=Task.objects.filter(pk=task.pk))
+        aggregate = IncrementalStatistics.survey_aggregate(task.id)
+        self.assertEqual([choice.count for choice in aggregate.get(question.id).choice_counts], counts)
+        self.assertEqual(
+            [row[len(exports.PIVOT_HEADERS):] for row in exports.pivot_table(task).rows], [[1, 1, 0], [0, 1, 1]]
+        )
+
+
+class SurveySchemaTests(TestCase):
+    """Скомпилированная схема анкеты: один запрос при попадании в кэш и сброс из любого процесса."""
+
+    def setUp(self):
+        cache.clear()
+        self.employee = CustomUser.objects.create(username='employee', role=UserRoles.EMPLOYEE)
+        self.task = Task.objects.create(title='Анкета', task_type=TaskType.SURVEY)
+        self.question = SurveyQuestion.objects.create(
+            task=self.task, question_text='Вопрос', question_type='RADIO', order=0
+        )
+        self.choice = SurveyQuestionChoice.objects.create(question=self.question, choice_text='Вариант', order=0)
+
+    def test_cache_hit_reads_only_schema_version(self):
+        SurveyResponseForm(self.task, self.employee)
+        # Версия схемы хранится в БД, чтобы ее видели все процессы
+        with self.assertNumQueries(1):
+            form = SurveyResponseForm(self.task, self.employee)
+        self.assertEqual(list(form.fields[f'question_{self.question.id}'].choices), [(self.choice.id, 'Вариант')])
+
+    def test_change_in_other_process_invalidates_schema(self):
+        get_survey_schema(self.task.id)
+        # У другого процесса свой локальный кэш, общая с ним только версия в БД
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'other-worker',
+        }}):
+            self.choice.choice_text = 'Новый вариант'
+            self.choice.save()
+        self.assertEqual(
+            get_survey_schema(self.task.id)[0]['choices'], [{'id': self.choice.id, 'choice_text': 'Новый вариант'}]
+        )
+
+
+class SurveySubmissionConcurrencyTests(TransactionTestCase):
+    """Стресс-тест счетчика анкеты при одновременной отправке."""
+
+    THREADS = 8
+    SUBMISSIONS_PER_THREAD = 25
+
+    def setUp(self):
+        self.client_obj = Client.objects.create(name='Клиент')
+        self.employee = CustomUser.objects.create(username='employee', role=UserRoles.EMPLOYEE)
+        self.total = self.THREADS * self.SUBMISSIONS_PER_THREAD
+
+    def create_task(self, target_count):
+        task = Task.objects.create(
+            title='Анкета',
+            task_type=TaskType.SURVEY,
+            status=TaskStatus.SENT,
+            client=self.client_obj,
+            target_count=target_count,
+        )
+        SurveyQuestion.objects.create(task=task, question_text='Вопрос', question_type='TEXT')
+        return task
+
+    def test_concurrent_increments_are_not_lost(self):
+        task = self.create_task(target_count=self.total * 2)
+        plan_reached = []
+
+        def submit(index):
+            # Каждый поток держит свой, заведомо устаревший экземпляр задачи
+            stale_task = retry_when_locked(lambda: Task.objects.get(pk=task.pk))
+            for _ in range(self.SUBMISSIONS_PER_THREAD):
+                plan_reached.append(retry_when_locked(stale_task.register_survey_submission))
+
+        self.assertEqual(run_in_threads(self.THREADS, submit), [])
+        task.refresh_from_db()
+        self.assertEqual(task.current_count, self.total)
+        self.assertEqual(task.status, TaskStatus.SENT)
+        self.assertTrue(task.is_active)
+        self.assertNotIn(True, plan_reached)
+
+    def test_plan_transition_fires_exactly_once(self):
+        target = self.total // 2
+        task = self.create_task(target_count=target)
+        plan_reached = []
+
+        def submit(index):
+            stale_task = retry_when_locked(lambda: Task.objects.get(pk=task.pk))
+            for _ in range(self.SUBMISSIONS_PER_THREAD):
+                plan_reached.append(retry_when_locked(stale_task.register_survey_submission))
+
+        self.assertEqual(run_in_threads(self.THREADS, submit), [])
+        task.refresh_from_db()
+        self.assertEqual(task.current_count, self.total)
+        self.assertEqual(task.status, TaskStatus.ON_CHECK)
+        self.assertFalse(task.is_active)
+        self.assertEqual(plan_reached.count(True), 1)
+
+    def test_concurrent_form_submissions(self):
+        task = self.create_task(target_count=self.total)
+        question = task.questions.get()
+
+        def submit(index):
+            stale_task = retry_when_locked(lambda: Task.objects.select_related('client').get(pk=task.pk))
+            for number in range(self.SUBMISSIONS_PER_THREAD):
+                form = retry_when_locked(lambda: SurveyResponseForm(
+                    stale_task, self.employee,
+                    data={f'question_{question.id}': f'{index}-{number}'},
+                ))
+                self.assertTrue(form.is_valid())
+
+                def save():
+                    # Как в SurveyResponseView.form_valid
+                    with transaction.atomic():
+                        form.save()
+                        stale_task.register_survey_submission()
+
+                retry_when_locked(save)
+
+        self.assertEqual(run_in_threads(self.THREADS, submit), [])
+        task.refresh_from_db()
+        self.assertEqual(SurveyAnswer.objects.filter(question__task=task).count(), self.total)
+        self.assertEqual(task.current_count, self.total)
+        self.assertEqual(task.status, TaskStatus.ON_CHECK)
+        self.assertFalse(task.is_active)
+
+
+class SurveyAggregationTests(TestCase):
+    """Сводка ответов: корректность счетчиков и фиксированное число запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_obj = Client.objects.create(name='Клиент')
+        cls.other_client = Client.objects.create(name='Другой клиент')
+        cls.employee = CustomUser.objects.create_user('employee', password='pass', role=UserRoles.EMPLOYEE)
+        cls.admin = CustomUser.objects.create_superuser('admin', password='pass', role=UserRoles.MODERATOR)
+        cls.task = Task.objects.create(
+            title='Анкета', task_type=TaskType.SURVEY, status=TaskStatus.SENT, target_count=100
+        )
+        cls.questions = cls.add_questions(cls.task, suffix='')
+
+        radio, checkbox, select_single, select_multiple, yes_no, text, photo = cls.questions
+        answers = [
+            (cls.client_obj, {
+                radio: radio.choice_ids[0], checkbox: checkbox.choice_ids[:2],
+                select_single: str(select_single.choice_ids[1]), select_multiple: [str(i) for i in select_multiple.choice_ids[:2]],
+                yes_no: 'да', text: 'ответ',
+            }),
+            (cls.other_client, {
+                radio: radio.choice_ids[0], checkbox: checkbox.choice_ids[1:],
+                select_single: str(select_single.choice_ids[1]), select_multiple: [str(select_multiple.choice_ids[1])],
+                yes_no: 'нет', text: '',
+            }),
+            (cls.client_obj, {
+                radio: radio.choice_ids[1], checkbox: [],
+                select_single: '', select_multiple: [],
+                yes_no: 'да', text: 'ещё ответ',
+            }),
+        ]
+        for client, values in answers:
+            cls.submit(cls.task, client, values)
+
+    @classmethod
+    def add_questions(cls, task, suffix):
+        """Создает по вопросу каждого типа; у вопросов с вариантами по три варианта."""
+        questions = []
+        layout = [
+            ('RADIO', True), ('CHECKBOX', True), ('SELECT_SINGLE', True),
+            ('SELECT_MULTIPLE', True), ('RADIO', False), ('TEXT', False), ('PHOTO', False),
+        ]
+        for order, (question_type, with_choices) in enumerate(layout):
+            question = SurveyQuestion.objects.create(
+                task=task, question_text=f'{question_type}{suffix}', question_type=question_type, order=order
+            )
+            question.choice_ids = []
+            if with_choices:
+                question.choice_ids = [
+                    SurveyQuestionChoice.objects.create(question=question, choice_text=f'Вариант {i}', order=i).id
+                    for i in range(3)
+                ]
+            questions.append(question)
+        return questions
+
+    @classmethod
+    def submit(cls, task, client, values):
+        data = {'selected_client_id': client.id}
+        for question, value in values.items():
+            data[f'question_{question.id}'] = value
+        form = SurveyResponseForm(task, cls.employee, data=data)
+        assert form.is_valid(), form.errors
+        # Счетчики статистики обновляются после фиксации транзакции
+        with cls.captureOnCommitCallbacks(execute=True):
+            form.save()
+
+    def setUp(self):
+        cache.clear()
+
+    def counts(self, aggregate, question):
+        return [choice.count for choice in aggregate.get(question.id).choice_counts]
+
+    def test_counts(self):
+        radio, checkbox, select_single, select_multiple, yes_no, text, photo = self.questions
+        aggregate = aggregate_survey(self.task.id)
+
+        self.assertEqual(aggregate.unique_clients, 2)
+        self.assertEqual(aggregate.total_responses, 3 * 7)
+        self.assertEqual(aggregate.get(radio.id).total_answers, 3)
+        self.assertEqual(self.counts(aggregate, radio), [2, 1, 0])
+        self.assertEqual(self.counts(aggregate, checkbox), [1, 2, 1])
+        self.assertEqual(self.counts(aggregate, select_single), [0, 2, 0])
+        self.assertEqual(self.counts(aggregate, select_multiple), [1, 2, 0])
+        self.assertEqual(
+            [(choice.choice_text, choice.count) for choice in aggregate.get(yes_no.id).choice_counts],
+            [('Да', 2), ('Нет', 1)],
+        )
+        self.assertEqual(aggregate.get(text.id).text_answers_count, 2)
+        self.assertEqual(aggregate.get(photo.id).total_answers, 3)
+
+    def test_counters_match_answers(self):
+        def numbers(aggregate):
+            return (
+                aggregate.total_responses,
+                aggregate.unique_clients,
+                [
+                    (question.id, question.total_answers, question.text_answers_count,
+                     [(choice.choice_text, choice.count) for choice in question.choice_counts])
+                    for question in aggregate.questions
+                ],
+            )
+
+        expected = numbers(aggregate_survey(self.task.id))
+        self.assertEqual(numbers(IncrementalStatistics.survey_aggregate(self.task.id)), expected)
+        StatisticsGenerator.generate_all_statistics(tasks=statistics_tasks(all_tasks=True))
+        self.assertEqual(numbers(IncrementalStatistics.survey_aggregate(self.task.id)), expected)
+
+    def test_query_count_does_not_grow_with_questions(self):
+        with self.assertNumQueries(7):
+            aggregate_survey(self.task.id)
+        # Схема из кэша: только ее версия
+        with self.assertNumQueries(5):
+            aggregate_survey(self.task.id)
+
+        self.add_questions(self.task, suffix=' (2)')
+        self.add_questions(self.task, suffix=' (3)')
+        aggregate_survey(self.task.id)
+        with self.assertNumQueries(5):
+            aggregate = aggregate_survey(self.task.id)
+        self.assertEqual(len(aggregate.questions), 21)
+
+    def test_counters_query_count_does_not_depend_on_answers(self):
+        IncrementalStatistics.survey_aggregate(self.task.id)
+        # Версия схемы, два запроса к счетчикам и уникальные клиенты из дневной сводки
+        with self.assertNumQueries(4):
+            IncrementalStatistics.survey_aggregate(self.task.id)
+
+        radio, checkbox, select_single, select_multiple, yes_no, text, photo = self.questions
+        for _ in range(3):
+            self.submit(self.task, self.other_client, {
+                radio: radio.choice_ids[2], checkbox: [], select_single: '', select_multiple: [],
+                yes_no: 'нет', text: '',
+            })
+        self.add_questions(self.task, suffix=' (2)')
+        IncrementalStatistics.survey_aggregate(self.task.id)
+        with self.assertNumQueries(4):
+            aggregate = IncrementalStatistics.survey_aggregate(self.task.id)
+        self.assertEqual(len(aggregate.questions), 14)
+        self.assertEqual(self.counts(aggregate, radio), [2, 1, 3])
+
+    def test_results_view_query_budget(self):
+        self.client.force_login(self.employee)
+        url = reverse('tasks:survey_results', args=[self.task.id])
+        self.client.get(url)
+        with self.assertNumQueries(8):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        self.add_questions(self.task, suffix=' (2)')
+        self.client.get(url)
+        with self.assertNumQueries(8):
+            self.client.get(url)
+
+    def test_admin_statistics_view_query_budget(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:survey_statistics', args=[self.task.id])
+        self.client.get(url)
+        with self.assertNumQueries(9):
+            response = self.client.get(url)
+        self.assertContains(response, 'Вариант 1')
+
+        self.add_questions(self.task, suffix=' (2)')
+        self.client.get(url)
+        with self.assertNumQueries(9):
+            self.client.get(url)
+
+    def test_module_statistics_view_query_budget(self):
+        request = RequestFactory().get('/')
+        request.user = self.admin
+        model_admin = SimpleNamespace(model=Task)
+        survey_statistics_view(model_admin, request, self.task.id)
+        with self.assertNumQueries(7):
+            survey_statistics_view(model_admin, request, self.task.id)
+
+    def test_chart_data_query_budget(self):
+        IncrementalStatistics.survey_aggregate(self.task.id)
+        with self.assertNumQueries(4):
+            data = StatisticsView().get_chart_data(self.task)
+        self.assertEqual(data['datasets'][0]['data'], [3] * 7)
+
+
+class StatisticsDashboardTests(TestCase):
+    """Дашборд статистики: счетчики, постраничные таблицы и кэш по фильтрам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employees = [
+            CustomUser.objects.create_user(f'employee{i}', password='pass', role=UserRoles.EMPLOYEE)
+            for i in range(5)
+        ]
+        cls.clients = [Client.objects.create(name=f'Клиент {i}') for i in range(5)]
+        for i, (employee, client) in enumerate(zip(cls.employees, cls.clients)):
+            for number in range(i):
+                Task.objects.create(
+                    title=f'Анкета {i}.{number}', task_type=TaskType.SURVEY, assigned_to=employee, client=client,
+                    status=TaskStatus.COMPLETED if number % 2 else TaskStatus.SENT,
+                )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.employees[0])
+
+    def fetch(self, section, **params):
+        return self.client.get(reverse('tasks:statistics_data', args=[section]), params).json()
+
+    def test_first_paint_renders_summary_only(self):
+        # Сессия, пользователь, счетчики задач и сводки, списки сотрудников/модераторов для фильтров
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('tasks:statistics'))
+        self.assertEqual(response.context['total_tasks'], 10)
+        self.assertEqual(response.context['completed_tasks'], 4)
+        self.assertEqual(response.context['survey_tasks'], 10)
+
+    def test_keyset_pagination(self):
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            page = self.fetch('employees', limit=2, cursor=cursor)
+            seen.extend((row['username'], row['total_tasks']) for row in page['results'])
+            cursor = page['next']
+        self.assertEqual(seen, [(f'employee{i}', i) for i in range(4, -1, -1)])
+
+        page = self.fetch('clients', limit=10, employee=self.employees[3].id)
+        self.assertEqual(
+            [(row['name'], row['total_tasks'], row['completed_tasks']) for row in page['results']][:2],
+            [('Клиент 4', 0, 0), ('Клиент 3', 3, 1)],
+        )
+
+    def test_keyset_filters_before_aggregating(self):
+        filters = dashboard.normalize_filters(QueryDict(''))
+        with CaptureQueriesContext(connection) as queries:
+            page = dashboard.get_employee_page(filters, self.employees[3].id, 2)
+        self.assertEqual([row['username'] for row in page['results']], ['employee2', 'employee1'])
+        sql = queries[0]['sql']
+        self.assertNotIn('HAVING', sql)
+        self.assertIn(f'"users_customuser"."id" < {self.employees[3].id}', sql)
+
+    def test_survey_rows_single_query_and_cache(self):
+        with self.assertNumQueries(1):
+            page = dashboard.get_survey_page(dashboard.normalize_filters(QueryDict('task_type=SURVEY')), 4, 50)
+        self.assertEqual([row['title'] for row in page['results']], ['Анкета 2.1', 'Анкета 2.0', 'Анкета 1.0'])
+
+        filters = dashboard.normalize_filters(QueryDict('client=all&task_type=SURVEY&employee=&date_from=bad'))
+        self.assertEqual(filters, {'task_type': 'SURVEY'})
+        with self.assertNumQueries(0):
+            dashboard.get_survey_page(filters, 4, 50)
+
+
+class GroupedAnswersTests(TestCase):
+    """Анкеты в админке: постраничный вывод по курсору и статус прочтения."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser('admin', password='pass', role=UserRoles.MODERATOR)
+        cls.employees = [
+            CustomUser.objects.create_user(f'employee{i}', password='pass', role=UserRoles.EMPLOYEE)
+            for i in range(2)
+        ]
+        cls.clients = [Client.objects.create(name=f'Клиент {i}') for i in range(2)]
+        cls.task = Task.objects.create(title='Анкета', task_type=TaskType.SURVEY, created_by=cls.admin)
+        cls.questions = [
+            SurveyQuestion.objects.create(task=cls.task, question_text=f'Вопрос {i}', question_type='TEXT', order=i)
+            for i in range(2)
+        ]
+        # Две анкеты одного сотрудника по одному клиенту за день — отдельные группы
+        now = timezone.now()
+        cls.expected = []
+        for age, employee, client in [
+            (timedelta(hours=1), cls.employees[0], cls.clients[0]),
+            (timedelta(hours=2), cls.employees[0], cls.clients[0]),
+            (timedelta(hours=3), cls.employees[1], cls.clients[1]),
+            (timedelta(days=1), cls.employees[0], cls.clients[0]),
+            (timedelta(days=20), cls.employees[1], cls.clients[1]),
+        ]:
+            submission = SurveySubmission.objects.create(
+                task=cls.task, user=employee, client=client, created_at=now - age
+            )
+            for question in cls.questions:
+                SurveyAnswer.objects.create(
+                    question=question, user=employee, client=client, submission=submission, text_answer='ответ'
+                )
+            cls.expected.append(submission.pk)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def fetch(self, **params):
+        return self.client.get(reverse('admin:grouped_answers_api'), params).json()
+
+    def test_form_save_creates_one_submission(self):
+        form = SurveyResponseForm(self.task, self.employees[1], data={
+            'selected_client_id': self.clients[0].id,
+            f'question_{self.questions[0].id}': 'первый',
+            f'question_{self.questions[1].id}': 'второй',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        answers = form.save()
+        submission = SurveySubmission.objects.get(user=self.employees[1], client=self.clients[0])
+        self.assertEqual({answer.submission_id for answer in answers}, {submission.pk})
+        self.assertEqual(self.fetch(limit=1)['results'][0]['id'], submission.pk)
+
+    def test_cursor_pagination(self):
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            page = self.fetch(limit=2, cursor=cursor)
+            self.assertLessEqual(len(page['results']), 2)
+            seen.extend(group['id'] for group in page['results'])
+            cursor = page['next']
+        self.assertEqual(seen, self.expected)
+
+        page = self.fetch(limit=1)
+        group = page['results'][0]
+        self.assertEqual(page['users'][str(group['userId'])], 'employee0')
+        self.assertEqual(page['tasks'][str(group['taskId'])], {'name': 'Анкета', 'moderatorName': 'admin'})
+        self.assertEqual((group['answerCount'], group['photoCount']), (2, 0))
+        self.assertNotIn('answers', group)
+        self.assertTrue(group['isNew'])
+
+        page = self.fetch(userId=self.employees[1].id, clientId=self.clients[1].id)
+        self.assertEqual([group['id'] for group in page['results']], [self.expected[2], self.expected[4]])
+
+    def test_query_count_does_not_depend_on_groups(self):
+        filters = answer_groups.normalize_filters(QueryDict())
+        # Анкеты со счетчиками ответов и фото — одним запросом
+        with self.assertNumQueries(1):
+            page = answer_groups.get_group_page(filters, None, 3)
+        self.assertEqual(len(page['results']), 3)
+        with self.assertNumQueries(1):
+            page = answer_groups.get_group_page(filters, answer_groups.parse_cursor(page['next']), 10)
+        self.assertEqual([group['id'] for group in page['results']], self.expected[3:])
+
+    def test_detail_endpoint(self):
+        url = reverse('admin:grouped_answer_detail_api', args=[self.expected[0]])
+        detail = self.client.get(url).json()
+        self.assertEqual([answer['question'] for answer in detail['answers']], ['Вопрос 1', 'Вопрос 0'])
+        # Ответы, варианты, фото
+        with self.assertNumQueries(3):
+            answer_groups.get_group_detail(self.expected[0])
+
+        url = reverse('admin:grouped_answer_detail_api', args=[self.expected[-1] + 100])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_mark_as_read(self):
+        response = self.client.post(
+            reverse('admin:mark_as_read_api'), {'answerId': str(self.expected[4])}, content_type='application/json'
+        )
+        self.assertTrue(response.json()['success'])
+        submission = SurveySubmission.objects.get(pk=self.expected[4])
+        self.assertEqual(submission.read_by, self.admin)
+
+        groups = {group['id']: group for group in self.fetch(limit=10)['results']}
+        self.assertTrue(groups[self.expected[4]]['isRead'])
+        self.assertFalse(groups[self.expected[0]]['isRead'])
+
+        response = self.client.post(
+            reverse('admin:mark_as_read_api'), {'answerId': '1_2_3_2026-01-01'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def post_bulk(self, data):
+        return self.client.post(reverse('admin:mark_as_read_bulk_api'), data, content_type='application/json')
+
+    def test_bulk_mark_as_read(self):
+        with self.assertNumQueries(6):  # сессия, пользователь, транзакция, id для ленты и UPDATE
+            response = self.post_bulk({'ids': self.expected[:3]})
+        self.assertEqual(response.json()['updated'], 3)
+        # Повторная отметка не меняет уже прочитанные анкеты
+        self.assertEqual(self.post_bulk({'ids': self.expected[:4]}).json()['updated'], 1)
+
+        yesterday = timezone.localdate() - timedelta(days=1)
+        response = self.post_bulk({'filters': {'taskId': self.task.id, 'date_to': yesterday.isoformat()}})
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertFalse(SurveySubmission.objects.filter(read_at__isnull=True).exists())
+        self.assertEqual(set(SurveySubmission.objects.values_list('read_by', flat=True)), {self.admin.id})
+
+        self.assertEqual(self.post_bulk({'filters': {'taskId': 'all'}}).status_code, 400)
+        self.assertEqual(self.post_bulk({'ids': ['1_2']}).status_code, 400)
+
+    def test_conditional_get(self):
+        url = reverse('admin:grouped_answers_api')
+        response = self.client.get(url, {'limit': 2})
+        etag = response['ETag']
+        # Совпавший ETag: 304 без запроса анкет (сессия, пользователь и версии данных)
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'limit': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(self.client.get(url, {'limit': 3})['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_bulk({'ids': self.expected[:1]})
+        response = self.client.get(url, {'limit': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        form = SurveyResponseForm(self.task, self.employees[1], data={
+            'selected_client_id': self.clients[0].id,
+            f'question_{self.questions[0].id}': 'ответ',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            form.save()
+        response = self.client.get(url, {'limit': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # Правка ответа в другом процессе (со своим кэшем) меняет ETag и здесь
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'other-worker',
+        }}):
+            with self.captureOnCommitCallbacks(execute=True):
+                answer = SurveyAnswer.objects.filter(submission_id=self.expected[0]).first()
+                answer.text_answer = 'исправлено'
+                answer.save()
+        self.assertEqual(self.client.get(url, {'limit': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        url = reverse('admin:autocomplete_clients')
+        etag = self.client.get(url, {'q': 'Клиент'})['ETag']
+        self.assertEqual(self.client.get(url, {'q': 'Клиент'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Client.objects.create(name='Клиент 2')
+        response = self.client.get(url, {'q': 'Клиент'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.json()['clients']), 3)
+
+    def test_excel_export(self):
+        url = reverse('admin:export_survey_answers_excel', args=[self.task.id])
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], exports.XLSX_CONTENT_TYPE)
+        workbook = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        rows = list(workbook.active.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), exports.ANSWER_HEADERS)
+        self.assertEqual(len(rows), 1 + 2 * len(self.expected))
+        self.assertEqual(rows[1][0], 'Клиент 0')
+        self.assertEqual(rows[1][6:], ('ответ', '0'))
+        # Ответы читаются порциями: запрос ответов и запрос вариантов на порцию
+        with self.assertNumQueries(2):
+            exports.write_answers_workbook(self.task, io.BytesIO())
+
+    def test_pivot_export(self):
+        exports.pivot_table(self.task)
+        # Схема из кэша по ее версии; запрос анкет и три запроса на порцию
+        with self.assertNumQueries(5):
+            table = exports.pivot_table(self.task)
+            rows = list(table.rows)
+        self.assertEqual(table.headers, exports.PIVOT_HEADERS + ['Вопрос 0', 'Вопрос 1'])
+        self.assertEqual([row[4:] for row in rows], [['ответ', 'ответ']] * len(self.expected))
+        self.assertEqual(rows[0][1:3], ['Клиент 1', 'employee1'])
+        with mock.patch('tasks.exports.PIVOT_CHUNK_SIZE', 2), self.assertNumQueries(11):
+            self.assertEqual(list(exports.pivot_table(self.task).rows), rows)
+
+        # Даты обоих видов выгрузки — в часовом поясе проекта
+        submission = SurveySubmission.objects.get(pk=self.expected[-1])
+        self.assertEqual(rows[0][3], timezone.localtime(submission.created_at).strftime('%d.%m.%Y %H:%M:%S'))
+        answer = SurveyAnswer.objects.filter(submission=submission).first()
+        self.assertIn(
+            timezone.localtime(answer.created_at).strftime('%d.%m.%Y %H:%M:%S'),
+            [row[2] for row in exports.answer_rows(self.task)],
+        )
+
+    def test_pivot_export_expands_multiple_choice(self):
+        task = Task.objects.create(title='Флажки', task_type=TaskType.SURVEY)
+        question = SurveyQuestion.objects.create(
+            task=task, question_text='CHECKBOX', question_type='CHECKBOX', order=0
+        )
+        choices = [
+            SurveyQuestionChoice.objects.create(question=question, choice_text=f'Вариант {i}', order=i).id
+            for i in range(3)
+        ]
+        for selected in (choices[:2], choices[2:]):
+            form = SurveyResponseForm(task, self.employees[0], data={
+                'selected_client_id': self.clients[0].id, f'question_{question.id}': selected,
+            })
+            self.assertTrue(form.is_valid(), form.errors)
+            form.save()
+
+        table = exports.pivot_table(task)
+        self.assertEqual(table.headers[len(exports.PIVOT_HEADERS):], [
+            'CHECKBOX: Вариант 0', 'CHECKBOX: Вариант 1', 'CHECKBOX: Вариант 2',
+        ])
+        self.assertEqual([row[len(exports.PIVOT_HEADERS):] for row in table.rows], [[1, 1, 0], [0, 0, 1]])
+
+    def test_photos_archive(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        answer = SurveyAnswer.objects.filter(submission_id=self.expected[0]).first()
+        for content in (b'first', b'second'):
+            SurveyAnswerPhoto.objects.create(answer=answer, photo=ContentFile(content, name='photo.jpg'))
+        # Файла нет в хранилище — пропускается
+        SurveyAnswerPhoto.objects.bulk_create([SurveyAnswerPhoto(answer=answer, photo='survey_answer_photos/lost.jpg')])
+        report = PhotoReport.objects.create(
+            task=self.task, client=self.clients[1], address='Адрес', created_by=self.employees[1]
+        )
+        PhotoReportItem.objects.create(report=report, photo=ContentFile(b'stand', name='stand.jpg'))
+
+        url = reverse('admin:task_photos_archive', args=[self.task.id])
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        names = archive.namelist()
+        self.assertEqual(len(names), 3)
+        day = timezone.localdate().strftime('%Y-%m-%d')
+        self.assertTrue(all(name.startswith(f'Клиент 0/{day}/employee0/photo') for name in names[:2]))
+        self.assertEqual(sorted(archive.read(name) for name in names[:2]), [b'first', b'second'])
+        self.assertTrue(names[2].startswith(f'Клиент 1/{day}/employee1/stand'))
+        self.assertEqual({info.compress_type for info in archive.infolist()}, {zipfile.ZIP_STORED})
+
+        response = self.client.get(url, {'clientId': self.clients[1].id})
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual([archive.read(name) for name in archive.namelist()], [b'stand'])
+
+        response = self.client.post(reverse('admin:tasks_task_changelist'), {
+            'action': 'download_photos_archive', '_selected_action': [self.task.id],
+        })
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+
+    def replay_feed(self, after):
+        """События живой ленты после id ``after``, как при переподключении браузера."""
+        async def drain():
+            subscription = live.feed.subscribe(str(after))
+            subscription.close()
+            events = []
+            while not subscription.queue.empty():
+                events.append(subscription.queue.get_nowait())
+            return events
+        return async_to_sync(drain)()
+
+    def test_live_feed_publishes_after_commit(self):
+        start = live.feed.last_event_id
+        form = SurveyResponseForm(self.task, self.employees[1], data={
+            'selected_client_id': self.clients[0].id,
+            f'question_{self.questions[0].id}': 'первый',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            form.save()
+            self.assertEqual(live.feed.last_event_id, start)
+        submission = SurveySubmission.objects.get(user=self.employees[1], client=self.clients[0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('admin:mark_as_read_api'), {'answerId': str(submission.pk)}, content_type='application/json'
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_bulk({'ids': self.expected[:2]})
+
+        events = self.replay_feed(start)
+        self.assertEqual([event.type for event in events], ['submission', 'read', 'read'])
+        row = events[0].data['results'][0]
+        self.assertEqual((row['id'], row['answerCount'], row['photoCount']), (submission.pk, submission.answers.count(), 0))
+        self.assertEqual(events[0].data['clients'], {self.clients[0].id: 'Клиент 0'})
+        self.assertEqual(events[1].data['ids'], [submission.pk])
+        self.assertEqual(sorted(events[2].data['ids']), sorted(self.expected[:2]))
+        # Пропуск старше истории — перезагрузка списка
+        self.assertEqual([event.type for event in self.replay_feed(start + 10 ** 6)], ['reset'])
+
+    async def test_events_require_staff(self):
+        response = await self.async_client.get(reverse('admin:submission_events_api'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_events_need_asgi(self):
+        # Тестовый клиент работает как WSGI: поток занял бы поток воркера навсегда
+        response = self.client.get(reverse('admin:submission_events_api'))
+        self.assertEqual(response.status_code, 501)
+        response = self.client.get(reverse('admin:tasks_surveyanswer_changelist'))
+        self.assertFalse(response.context['live_feed'])
+        self.assertContains(response, 'const liveFeedAvailable = false;')
+
+    async def test_events_stream_under_asgi(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse('admin:submission_events_api'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        first_chunk = await anext(aiter(response.streaming_content))
+        self.assertEqual(first_chunk, f'retry: {live.RECONNECT_DELAY_MS}\n\n'.encode())
+        response = await self.async_client.get(reverse('admin:tasks_surveyanswer_changelist'))
+        self.assertContains(response, 'const liveFeedAvailable = true;')
+
+
+class LiveFeedTests(SimpleTestCase):
+    """Поток событий живой ленты анкет."""
+
+    def test_stream(self):
+        async def run():
+            feed = live.SubmissionFeed()
+            subscription = feed.subscribe()
+            stream = live.event_stream(subscription, keepalive=0.01)
+            self.assertEqual(await anext(stream), f'retry: {live.RECONNECT_DELAY_MS}\n\n')
+            self.assertEqual(await anext(stream), ': keepalive\n\n')
+
+            # Публикация из другого потока (синхронный view)
+            await asyncio.to_thread(feed.publish, 'read', {'ids': [1], 'readAt': '2026-01-01 10:00:00'})
+            self.assertEqual(
+                await anext(stream),
+                'id: 1\nevent: read\ndata: {"ids": [1], "readAt": "2026-01-01 10:00:00"}\n\n',
+            )
+
+            # Отставшая вкладка получает reset, и поток закрывается
+            for pk in range(live.SUBSCRIBER_QUEUE_SIZE + 1):
+                feed.publish('read', {'ids': [pk], 'readAt': None})
+            await asyncio.sleep(0)
+            self.assertIn('event: reset', await anext(stream))
+            with self.assertRaises(StopAsyncIteration):
+                await anext(stream)
+            self.assertEqual(feed.subscriber_count, 0)
+        asyncio.run(run())
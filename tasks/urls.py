@@ -13,6 +13,7 @@ urlpatterns = [
     path('answer/<int:answer_id>/add-single-photo/', views.AddSinglePhotoView.as_view(), name='add_single_photo'),
     path('my-surveys/', views.MySurveysView.as_view(), name='my_surveys'),
     path('statistics/', views.StatisticsView.as_view(), name='statistics'),
+    path('statistics/<str:section>/', views.StatisticsDataView.as_view(), name='statistics_data'),
     path('search_clients/', views.search_clients, name='search_clients'),
     path('autocomplete_clients/', views.autocomplete_clients, name='autocomplete_clients'),
 
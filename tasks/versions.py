@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Data versions for conditional GET of the answers page APIs.
+
+Each kind of data the endpoints read (submissions, read marks, clients,
+tasks, users) has a counter, bumped after the commit that changes it
+(signal handlers in ``tasks.signals``, ``clients.signals`` and
+``answer_groups.notify_read``). An endpoint's ETag is a hash of the
+request parameters and the versions it depends on, so a matching
+``If-None-Match`` is answered with 304 by ``django.views.decorators.http
+.condition`` before the view runs its queries.
+
+The counters are rows of ``DataVersion`` rather than Django cache entries:
+the default cache is per-process ``LocMemCache``, and a bump made by one
+worker (or by a management command) has to change the ETags and cache
+keys of every other. Reading versions costs one primary key query; a bump
+is an ``UPDATE ... SET value = value + 1``. The same counters version
+other caches (``schema_version_name``, ``clients.search``). A missing
+counter is created from the clock, which only changes the ETags.
+"""
+
+import hashlib
+import json
+import time
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import DataVersion
+
+SUBMISSIONS = 'submissions'
+READS = 'reads'
+CLIENTS = 'clients'
+TASKS = 'tasks'
+USERS = 'users'
+
+
+def get_versions(*names):
+    """Текущие версии данных по именам одним запросом."""
+    found = dict(DataVersion.objects.filter(name__in=names).values_list('name', 'value'))
+    missing = set(names) - found.keys()
+    if missing:
+        DataVersion.objects.bulk_create(
+            [DataVersion(name=name, value=time.time_ns()) for name in missing], ignore_conflicts=True
+        )
+        found.update(DataVersion.objects.filter(name__in=missing).values_list('name', 'value'))
+    return {name: found[name] for name in names}
+
+
+def bump(*names):
+    """Увеличивает версии данных; возвращает новые версии по именам."""
+    names = sorted(set(names))
+    if not names:
+        return {}
+    # Чтение в той же транзакции видит именно это увеличение; отсутствующие
+    # счетчики создаются от часов
+    with transaction.atomic():
+        DataVersion.objects.filter(name__in=names).update(value=F('value') + 1)
+        return get_versions(*names)
+
+
+def bump_on_commit(*names):
+    """Увеличивает версии после фиксации текущей транзакции."""
+    transaction.on_commit(lambda: bump(*names), robust=True)
+
+
+def request_etag(request, names, **extra):
+    """
+    ETag ответа для параметров запроса и версий данных ``names``.
+
+    ``extra`` — прочие значения, от которых зависит ответ.
+    """
+    payload = json.dumps(
+        [request.path, sorted(request.GET.lists()), get_versions(*names), extra],
+        sort_keys=True,
+    )
+    return hashlib.md5(payload.encode('utf-8')).hexdigest()
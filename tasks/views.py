@@ -8,9 +8,12 @@ Follows SOLID principles by separating concerns and providing clear interfaces.
 import re
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
 from django.contrib.auth.decorators import user_passes_test
 import json
 from django.shortcuts import render, get_object_or_404, redirect
+from django.views import View
 from django.views.generic import ListView, DetailView, FormView, TemplateView
 from django.urls import reverse_lazy
 from django.contrib import messages
@@ -18,12 +21,15 @@ from django.http import Http404, HttpResponseRedirect
 from django.urls import reverse
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils.translation import gettext as _
+from . import answer_groups, dashboard, versions
 from .forms import SurveyResponseForm, AddPhotosForm, AddSinglePhotoForm
 from .models import Task, TaskStatus, TaskType
 from users.models import CustomUser
 from .models import SurveyAnswer, SurveyQuestion, SurveyAnswerPhoto
 from clients.models import Client
+from reports.services import IncrementalStatistics
 
+from django.db import transaction
 from django.db.models import Count, Sum, Avg, Q
 from django.http import JsonResponse
 from django.core.exceptions import PermissionDenied
@@ -114,7 +120,7 @@ class SurveyResponseView(LoginRequiredMixin, FormView):
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         task_id = self.kwargs['task_id']
-        task = get_object_or_404(Task, id=task_id)
+        task = get_object_or_404(Task.objects.select_related('client'), id=task_id)
         if not task.can_be_viewed_by(self.request.user):
             raise Http404(_("Задача не найдена или недоступна"))
         if task.task_type != TaskType.SURVEY:
@@ -126,36 +132,34 @@ class SurveyResponseView(LoginRequiredMixin, FormView):
     # В SurveyResponseView метод form_valid
 
     def form_valid(self, form):
+        task = form.task
         try:
-            form.save()
+            # Ответы и счетчик анкеты сохраняются в одной транзакции
+            with transaction.atomic():
+                form.save()
+                
+                # Для фотоотчетов — статус "На проверке"
+                if task.task_type in [TaskType.EQUIPMENT_PHOTO, TaskType.SIMPLE_PHOTO]:
+                    task.status = TaskStatus.ON_CHECK
+                    task.is_active = False  # Фотоотчет становится неактивным после отправки
+                    task.save(update_fields=['status', 'is_active', 'updated_at'])
+                
+                # Для анкет — атомарно увеличиваем счетчик; при достижении плана
+                # анкета переходит в статус "На проверке" и становится неактивной
+                elif task.task_type == TaskType.SURVEY:
+                    task.register_survey_submission()
         except ValueError as e:
             messages.error(self.request, str(e))
             return self.form_invalid(form)
         
-        task = form.task
-        
-        # Для фотоотчетов — статус "На проверке"
-        if task.task_type in [TaskType.EQUIPMENT_PHOTO, TaskType.SIMPLE_PHOTO]:
-            task.status = TaskStatus.ON_CHECK
-            task.is_active = False  # Фотоотчет становится неактивным после отправки
-        
-        # Для анкет — увеличиваем счетчик, но остаемся активными
-        elif task.task_type == TaskType.SURVEY:
-            task.current_count += 1
-            # Проверяем, достигнут ли план
-            if task.target_count > 0 and task.current_count >= task.target_count:
-                task.status = TaskStatus.ON_CHECK
-                task.is_active = False  # Анкета становится неактивной только при достижении плана
-            # Иначе остаемся в статусе SENT и активными
-        
-        task.save()
         messages.success(self.request, _("Анкета успешно заполнена!"))
         return redirect('tasks:task_list')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        task_id = self.kwargs['task_id']
-        context['task'] = get_object_or_404(Task, id=task_id)
+        form = context['form']
+        context['task'] = form.task
+        context['questions'] = form.schema
         context['title'] = _('Заполнение анкеты')
         return context
     
@@ -168,26 +172,35 @@ class SurveyResultsView(LoginRequiredMixin, ListView):
     
     def get_queryset(self):
         task_id = self.kwargs['task_id']
-        task = get_object_or_404(Task, id=task_id)
+        self.task = get_object_or_404(Task, id=task_id)
+        
+        # Все счетчики — из предрасчитанной статистики
+        aggregate = IncrementalStatistics.survey_aggregate(self.task.id)
+        
+        # Ответы на фото-вопросы с количеством фото (для кнопки "Добавить ещё фото")
+        photo_question_ids = [
+            question.id for question in aggregate.questions if question.question_type == 'PHOTO'
+        ]
+        photo_answers = {}
+        if photo_question_ids:
+            for answer in SurveyAnswer.objects.filter(
+                question_id__in=photo_question_ids
+            ).annotate(photo_count=Count('photos')).only('id', 'question_id'):
+                photo_answers.setdefault(answer.question_id, []).append(answer)
         
-        # Получаем все ответы по этой задаче
-        answers = SurveyAnswer.objects.filter(question__task=task)
-        
-        # Группируем по вопросам
         results = []
-        for question in task.questions.all():
+        for question in aggregate.questions:
             question_results = {
-                'question': question,
-                'answers_count': answers.filter(question=question).count()
+                'question': question.question,
+                'answers_count': question.total_answers,
+                'photo_answers': photo_answers.get(question.id, []),
             }
             
             # Если это вопрос с вариантами ответов
-            if question.has_custom_choices():
-                choice_stats = {}
-                for choice in question.choices.all():
-                    count = answers.filter(selected_choices=choice).count()
-                    choice_stats[choice.choice_text] = count
-                question_results['choice_stats'] = choice_stats
+            if question.has_custom_choices:
+                question_results['choice_stats'] = {
+                    choice.choice_text: choice.count for choice in question.choice_counts
+                }
             
             results.append(question_results)
         
@@ -195,7 +208,7 @@ class SurveyResultsView(LoginRequiredMixin, ListView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['task'] = get_object_or_404(Task, id=self.kwargs['task_id'])
+        context['task'] = self.task
         context['title'] = _('Результаты анкеты')
         return context
     
@@ -310,6 +323,9 @@ class MySurveysView(LoginRequiredMixin, ListView):
 class StatisticsView(LoginRequiredMixin, TemplateView):
     """
     Главная страница статистики с фильтрами и визуализацией.
+
+    Сразу отдаются только счетчики; таблицы анкет, сотрудников и клиентов
+    подгружаются постранично из ``StatisticsDataView``.
     """
     template_name = 'tasks/statistics.html'
     
@@ -317,352 +333,258 @@ class StatisticsView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         context['title'] = _('Статистика задач')
         
-        # Фильтры
-        filters = self.request.GET
-        
-        # Базовый QuerySet
-        tasks = Task.objects.all()
-        
-        # Применяем фильтры
-        if 'task_type' in filters and filters['task_type'] != 'all':
-            tasks = tasks.filter(task_type=filters['task_type'])
-            
-        if 'client' in filters and filters['client'] != 'all':
-            tasks = tasks.filter(client_id=filters['client'])
-            
-        if 'employee' in filters and filters['employee'] != 'all':
-            tasks = tasks.filter(assigned_to_id=filters['employee'])
-            
-        if 'moderator' in filters and filters['moderator'] != 'all':
-            tasks = tasks.filter(created_by_id=filters['moderator'])
-            
-        if 'group_client' in filters and filters['group_client'] != 'all':
-            # Здесь можно добавить фильтрацию по группам клиентов
-            pass
-            
-        if 'date_from' in filters:
-            tasks = tasks.filter(created_at__gte=filters['date_from'])
-            
-        if 'date_to' in filters:
-            tasks = tasks.filter(created_at__lte=filters['date_to'])
-        
-        # Статистика по всем задачам
-        context['total_tasks'] = tasks.count()
-        context['completed_tasks'] = tasks.filter(status='COMPLETED').count()
-        context['on_check_tasks'] = tasks.filter(status='ON_CHECK').count()
-        context['sent_tasks'] = tasks.filter(status='SENT').count()
-        
-        # Статистика по типам задач
-        context['survey_tasks'] = tasks.filter(task_type='SURVEY').count()
-        context['photo_tasks'] = tasks.filter(task_type__in=['EQUIPMENT_PHOTO', 'SIMPLE_PHOTO']).count()
-        
-        # Статистика по сотрудникам
-        context['employees_stats'] = CustomUser.objects.filter(role='EMPLOYEE').annotate(
-            total_tasks=Count('tasks_assigned'),
-            completed_tasks=Count('tasks_assigned', filter=Q(tasks_assigned__status='COMPLETED')),
-            on_check_tasks=Count('tasks_assigned', filter=Q(tasks_assigned__status='ON_CHECK'))
-        ).order_by('-total_tasks')
-        
-        # Статистика по клиентам
-        context['clients_stats'] = Client.objects.annotate(
-            total_tasks=Count('tasks'),
-            completed_tasks=Count('tasks', filter=Q(tasks__status='COMPLETED')),
-            on_check_tasks=Count('tasks', filter=Q(tasks__status='ON_CHECK'))
-        ).order_by('-total_tasks')
-        
-        # Статистика по анкетам
-        survey_tasks = tasks.filter(task_type='SURVEY')
-        context['survey_statistics'] = []
-        
-        for task in survey_tasks:
-            total_answers = SurveyAnswer.objects.filter(question__task=task).count()
-            unique_clients = SurveyAnswer.objects.filter(question__task=task).values('client').distinct().count()
-            completion_rate = 0
-            
-            if task.target_count > 0:
-                completion_rate = min(100, int((task.current_count / task.target_count) * 100))
-            
-            context['survey_statistics'].append({
-                'task': task,
-                'total_answers': total_answers,
-                'unique_clients': unique_clients,
-                'completion_rate': completion_rate
-            })
-        
-        # График для первой анкеты
-        if context['survey_statistics']:
-            first_survey = context['survey_statistics'][0]
-            context['first_survey_chart_data'] = self.get_chart_data(first_survey['task'])
-        
+        filters = dashboard.normalize_filters(self.request.GET)
+        context.update(dashboard.get_summary(filters))
+        context['filters'] = filters
+        context['employees'] = CustomUser.objects.filter(role='EMPLOYEE').order_by('username')
+        context['moderators'] = CustomUser.objects.filter(role='MODERATOR').order_by('username')
+        if 'client' in filters:
+            context['selected_client'] = Client.objects.filter(id=filters['client']).first()
         return context
     
     def get_chart_data(self, task):
-        """Получает данные для графика по первой анкете."""
-        data = {
-            'labels': [],
-            'datasets': [{
-                'label': 'Количество ответов',
-                'data': [],
-                'backgroundColor': [
-                    'rgba(255, 99, 132, 0.2)',
-                    'rgba(54, 162, 235, 0.2)',
-                    'rgba(255, 206, 86, 0.2)',
-                    'rgba(75, 192, 192, 0.2)',
-                    'rgba(153, 102, 255, 0.2)',
-                    'rgba(255, 159, 64, 0.2)'
-                ],
-                'borderColor': [
-                    'rgba(255, 99, 132, 1)',
-                    'rgba(54, 162, 235, 1)',
-                    'rgba(255, 206, 86, 1)',
-                    'rgba(75, 192, 192, 1)',
-                    'rgba(153, 102, 255, 1)',
-                    'rgba(255, 159, 64, 1)'
-                ],
-                'borderWidth': 1
-            }]
-        }
-        
-        # Получаем все вопросы анкеты
-        questions = task.questions.all()
-        
-        for question in questions:
-            data['labels'].append(question.question_text[:30])
-            answers_count = SurveyAnswer.objects.filter(question=question).count()
-            data['datasets'][0]['data'].append(answers_count)
-        
-        return data
+        """Получает данные для графика по анкете."""
+        return dashboard.survey_chart_data(task.id)
+
+
+class StatisticsDataView(LoginRequiredMixin, View):
+    """
+    JSON-страницы таблиц дашборда статистики.
+
+    Параметры: фильтры дашборда, ``cursor`` (из поля ``next`` предыдущей
+    страницы) и ``limit``.
+    """
+    sections = {
+        'surveys': dashboard.get_survey_page,
+        'employees': dashboard.get_employee_page,
+        'clients': dashboard.get_client_page,
+    }
+    
+    def get(self, request, section):
+        if section not in self.sections:
+            raise Http404
+        filters = dashboard.normalize_filters(request.GET)
+        cursor = dashboard.parse_cursor(request.GET.get('cursor'))
+        return JsonResponse(self.sections[section](filters, cursor, dashboard.page_size(request.GET)))
     
 def survey_statistics_view(self, request, task_id):
     """View for detailed survey statistics."""
     task = get_object_or_404(Task, id=task_id)
-    
-    # Общая статистика
-    total_responses = SurveyAnswer.objects.filter(question__task=task).count()
-    unique_clients = SurveyAnswer.objects.filter(question__task=task).values('client').distinct().count()
+    aggregate = IncrementalStatistics.survey_aggregate(task.id)
+    
+    # Ответы на фото-вопросы одним запросом (плюс prefetch фото)
+    photo_question_ids = [
+        question.id for question in aggregate.questions if question.question_type == 'PHOTO'
+    ]
+    answers_with_photos = {}
+    if photo_question_ids:
+        for answer in SurveyAnswer.objects.filter(
+            question_id__in=photo_question_ids
+        ).prefetch_related('photos'):
+            answers_with_photos.setdefault(answer.question_id, []).append(answer)
     
     # Статистика по вопросам
     questions_stats = []
-    for question in task.questions.all():
+    for question in aggregate.questions:
         question_stats = {
-            'question': question,
-            'total_answers': SurveyAnswer.objects.filter(question=question).count()
+            'question': question.question,
+            'total_answers': question.total_answers
         }
         
-        if question.has_custom_choices():
-            choice_stats = []
-            for choice in question.choices.all():
-                count = SurveyAnswer.objects.filter(
-                    question=question,
-                    selected_choices=choice
-                ).count()
-                percentage = (count / question_stats['total_answers'] * 100) if question_stats['total_answers'] > 0 else 0
-                choice_stats.append({
+        if question.has_custom_choices:
+            question_stats['choice_stats'] = [
+                {
                     'choice': choice,
-                    'count': count,
-                    'percentage': round(percentage, 1)
-                })
-            question_stats['choice_stats'] = choice_stats
+                    'count': choice.count,
+                    'percentage': round(choice.percentage, 1)
+                }
+                for choice in question.choice_counts
+            ]
         else:
             # Для текстовых ответов
-            text_answers = SurveyAnswer.objects.filter(
-                question=question
-            ).exclude(text_answer__isnull=True).exclude(text_answer='')
-            question_stats['text_answers_count'] = text_answers.count()
+            question_stats['text_answers_count'] = question.text_answers_count
             
             # Для фото вопросов - добавляем список ответов с фото
             if question.question_type == 'PHOTO':
-                question_stats['answers_with_photos'] = SurveyAnswer.objects.filter(
-                    question=question
-                ).prefetch_related('photos')
+                question_stats['answers_with_photos'] = answers_with_photos.get(question.id, [])
         
         questions_stats.append(question_stats)
     
     context = {
         'title': f'Статистика: {task.title}',
         'task': task,
-        'total_responses': total_responses,
-        'unique_clients': unique_clients,
+        'total_responses': aggregate.total_responses,
+        'unique_clients': aggregate.unique_clients,
         'questions_stats': questions_stats,
         'opts': self.model._meta,
     }
     return render(request, 'admin/tasks/survey_statistics.html', context)
 
 @csrf_exempt
+@gzip_page
+@condition(etag_func=answer_groups.page_etag)
 def getGroupedAnswers(request):
-    """API endpoint to return grouped survey answers with filtering and new status."""
-    from django.utils import timezone
-    from django.db.models import Prefetch
-    from datetime import timedelta
-    from clients.models import Client
-    
-    # Get filters from query parameters
-    task_id = request.GET.get('taskId')
-    user_id = request.GET.get('userId')
-    client_id = request.GET.get('clientId')
-    # Also accept client search parameter for text-based search
-    client_search = request.GET.get('client_search', '').strip()
-    
-    # Calculate 24 hours ago for "new" flag
-    twenty_four_hours_ago = timezone.now() - timedelta(hours=24)
-    
-    # Build base queryset
-    answers = SurveyAnswer.objects.select_related(
-        'user', 'question__task', 'client'
-    ).prefetch_related(
-        'selected_choices', 
-        'photos',
-        'question__task__created_by'
-    ).order_by('-created_at')
-    
-    # Apply filters
-    if task_id:
-        answers = answers.filter(question__task_id=task_id)
-    if user_id:
-        answers = answers.filter(user_id=user_id)
-    if client_id:
-        answers = answers.filter(client_id=client_id)
-    
-    # Group answers by task, client, and user
-    grouped_data = {}
-    for answer in answers:
-        key = f"{answer.question.task.id}_{answer.client.id}_{answer.user.id}_{answer.created_at.date()}"
-        
-        if key not in grouped_data:
-            # Check if this group has been marked as read
-            from .models import SurveyAnswerGroupReadStatus
-            try:
-                read_status = SurveyAnswerGroupReadStatus.objects.get(
-                    task=answer.question.task,
-                    client=answer.client,
-                    user=answer.user,
-                    date_created=answer.created_at.date()
-                )
-                is_read = read_status.read_at is not None
-                read_at = read_status.read_at.strftime('%Y-%m-%d %H:%M:%S') if read_status.read_at else None
-            except SurveyAnswerGroupReadStatus.DoesNotExist:
-                is_read = False
-                read_at = None
-            
-            grouped_data[key] = {
-                'id': key,
-                'taskName': answer.question.task.title,
-                'clientName': answer.client.name,
-                'userName': answer.user.get_full_name() or answer.user.username,
-                'dateCreated': answer.created_at,
-                'moderatorName': answer.question.task.created_by.get_full_name() or answer.question.task.created_by.username if answer.question.task.created_by else '-',
-                'answers': [],
-                'isNew': answer.created_at > twenty_four_hours_ago and not is_read,
-                'isRead': is_read,
-                'readAt': read_at,
-            }
-        
-        # Add answer details
-        answer_details = {
-            'question': answer.question.question_text,
-            'questionType': answer.question.get_question_type_display(),
-            'selectedChoices': [choice.choice_text for choice in answer.selected_choices.all()],
-            'textAnswer': answer.text_answer,
-            'photos': [{'id': photo.id, 'url': photo.photo.url, 'name': photo.photo.name.split('/')[-1]} for photo in answer.photos.all()],
-            'createdAt': answer.created_at,
-            'questionId': answer.question.id
-        }
-        grouped_data[key]['answers'].append(answer_details)
-    
-    # Convert to list and sort by date created (newest first)
-    result = list(grouped_data.values())
-    result.sort(key=lambda x: x['dateCreated'], reverse=True)
-    
-    # Format dates to string for JSON serialization
-    for item in result:
-        item['dateCreated'] = item['dateCreated'].strftime('%Y-%m-%d %H:%M:%S')
-        for answer in item['answers']:
-            answer['createdAt'] = answer['createdAt'].strftime('%Y-%m-%d %H:%M:%S')
-    
-    return JsonResponse({'results': result})
+    """
+    API endpoint to return a page of survey submission summaries with filtering and new status.
+
+    Query parameters are the page filters (see ``answer_groups.normalize_filters``),
+    ``limit`` (page size) and ``cursor`` (the ``next`` value of the previous page).
+    Answers are returned by ``getGroupedAnswerDetail``. A request with a
+    matching ``If-None-Match`` gets 304 without querying the submissions.
+    """
+    filters = answer_groups.normalize_filters(request.GET)
+    page = answer_groups.get_group_page(
+        filters,
+        answer_groups.parse_cursor(request.GET.get('cursor')),
+        answer_groups.page_size(request.GET),
+    )
+    return JsonResponse(page)
+
+
+@csrf_exempt
+def getGroupedAnswerDetail(request, submission_id):
+    """API endpoint to return the answers of one survey submission."""
+    detail = answer_groups.get_group_detail(submission_id)
+    if detail is None:
+        return JsonResponse({'error': 'Submission not found'}, status=404)
+    return JsonResponse(detail)
 
 
 @csrf_exempt
 def markAsRead(request, answer_id=None):
-    """API endpoint to mark an answer group as read."""
+    """API endpoint to mark a survey submission (answer group) as read."""
     from django.utils import timezone
-    from .models import SurveyAnswerGroupReadStatus
+    from .models import SurveySubmission
     
     if request.method == 'POST':
-        # Parse the answer_id which contains task_id_client_id_user_id_date
+        # answer_id is the SurveySubmission id
         if answer_id is None:
             # For the new API, we'll use POST data
             try:
                 data = json.loads(request.body)
                 answer_id = data.get('answerId', '')
-            except:
+            except (ValueError, AttributeError):
                 return JsonResponse({'error': 'Invalid data'}, status=400)
         
-        if answer_id:
-            try:
-                parts = answer_id.split('_')
-                if len(parts) >= 4:
-                    task_id = parts[0]
-                    client_id = parts[1] 
-                    user_id = parts[2]
-                    date_str = parts[3]  # This might be date part from a longer string
-                    
-                    # Create or update the read status
-                    read_status, created = SurveyAnswerGroupReadStatus.objects.get_or_create(
-                        task_id=task_id,
-                        client_id=client_id,
-                        user_id=user_id,
-                        date_created=date_str,
-                        defaults={
-                            'read_at': timezone.now(),
-                            'read_by': request.user if request.user.is_authenticated else None
-                        }
-                    )
-                    
-                    if not created:
-                        # Update the existing record
-                        read_status.read_at = timezone.now()
-                        read_status.read_by = request.user if request.user.is_authenticated else None
-                        read_status.save()
-                    
-                    return JsonResponse({
-                        'success': True, 
-                        'readAt': read_status.read_at.strftime('%Y-%m-%d %H:%M:%S'),
-                        'message': 'Статус прочтения обновлен'
-                    })
-                else:
-                    return JsonResponse({'error': 'Invalid answer ID format'}, status=400)
-            except Exception as e:
-                return JsonResponse({'error': str(e)}, status=500)
-        else:
+        if not answer_id:
             return JsonResponse({'error': 'Answer ID is required'}, status=400)
+        if not str(answer_id).isdigit():
+            return JsonResponse({'error': 'Invalid answer ID format'}, status=400)
+        
+        read_at = timezone.now()
+        updated = SurveySubmission.objects.filter(pk=answer_id).update(
+            read_at=read_at,
+            read_by=request.user if request.user.is_authenticated else None,
+        )
+        if not updated:
+            return JsonResponse({'error': 'Submission not found'}, status=404)
+        answer_groups.notify_read([int(answer_id)], read_at)
+        
+        return JsonResponse({
+            'success': True, 
+            'readAt': timezone.localtime(read_at).strftime('%Y-%m-%d %H:%M:%S'),
+            'message': 'Статус прочтения обновлен'
+        })
     
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
+@csrf_exempt
+def markAsReadBulk(request):
+    """
+    API endpoint to mark many survey submissions as read.
+
+    The JSON body holds either ``ids`` (submission ids) or ``filters`` with
+    the same parameters as the grouped answers list, e.g.
+    ``{"filters": {"taskId": 5, "date_to": "2025-01-31"}}``.
+    """
+    from django.utils import timezone
+    
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid data'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Invalid data'}, status=400)
+    
+    ids = data.get('ids')
+    raw_filters = data.get('filters')
+    if isinstance(ids, list):
+        if not all(str(pk).isdigit() for pk in ids):
+            return JsonResponse({'error': 'Invalid answer ID format'}, status=400)
+        ids, filters = [int(pk) for pk in ids], None
+    elif isinstance(raw_filters, dict):
+        filters = answer_groups.normalize_filters({key: str(value) for key, value in raw_filters.items()})
+        if not filters:
+            # Пустой фильтр отметил бы все анкеты сразу
+            return JsonResponse({'error': 'At least one filter is required'}, status=400)
+        ids = None
+    else:
+        return JsonResponse({'error': 'ids or filters are required'}, status=400)
+    
+    updated, read_at = answer_groups.mark_read(
+        request.user if request.user.is_authenticated else None, ids=ids, filters=filters
+    )
+    return JsonResponse({
+        'success': True,
+        'updated': updated,
+        'readAt': timezone.localtime(read_at).strftime('%Y-%m-%d %H:%M:%S'),
+    })
+
+
+async def submission_events(request):
+    """
+    Server-Sent Events stream of new submissions and read marks.
+
+    Events come from the in-process feed (``tasks.live``), so an open page
+    costs no database queries. The stream needs an ASGI server
+    (``config.asgi``): under WSGI it would hold a worker thread per open tab
+    and never deliver an event, so it is answered 501 and the page polls
+    the list instead.
+    """
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+    from . import live
+    
+    user = await request.auser()
+    if not (user.is_active and user.is_staff):
+        return HttpResponseForbidden()
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse('Живая лента доступна только под ASGI-сервером', status=501)
+    
+    subscription = live.feed.subscribe(request.headers.get('Last-Event-ID'))
+    response = StreamingHttpResponse(live.event_stream(subscription), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Не буферизовать поток на nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @csrf_exempt
 def search_clients(request):
     if request.method == 'POST':
         data = json.loads(request.body)
-        query = data.get('query', '').strip()
+        from clients.search import MIN_QUERY_LENGTH, SEARCH_LIMIT, find_clients, normalize_query
 
-        if len(query) < 2:
-            return JsonResponse({'error': 'Введите минимум 2 символа для поиска'}, status=400)
+        query = normalize_query(data.get('query', ''))
 
-        # Use database indexing for faster search
-        clients = Client.objects.filter(
-            name__icontains=query
-        ).order_by('name')[:20]
+        if len(query) < MIN_QUERY_LENGTH:
+            return JsonResponse({'error': f'Введите минимум {MIN_QUERY_LENGTH} символа для поиска'}, status=400)
+
+        clients = find_clients(query)
 
         if len(clients) == 0:
             return JsonResponse({'message': 'Клиенти не найдены'})
 
         client_list = [{'id': client.id, 'name': client.name} for client in clients]
 
-        if len(clients) == 20:
+        if len(clients) == SEARCH_LIMIT:
             return JsonResponse({
                 'clients': client_list,
-                'message': 'Найдено 20 совпадений. Уточните запрос для более точного результата.'
+                'message': f'Найдено {SEARCH_LIMIT} совпадений. Уточните запрос для более точного результата.'
             })
         else:
             return JsonResponse({'clients': client_list})
@@ -670,25 +592,17 @@ def search_clients(request):
     return JsonResponse({'error': 'Метод не поддерживается'}, status=400)
 
 
+@condition(etag_func=lambda request: versions.request_etag(request, [versions.CLIENTS]))
 def autocomplete_clients(request):
     """API endpoint for client autocomplete functionality with case-insensitive search."""
-    query = request.GET.get('q', '').strip()
-    
-    if len(query) < 1:
-        return JsonResponse({'clients': []})
-    
-    # Case-insensitive search using __icontains
-    escaped_query = re.escape(query)
-    clients = Client.objects.filter(
-            name__iregex=escaped_query
-        ).distinct()[:20]
-    # clients = Client.objects.filter(
-    #     name__icontains=query
-    # ).order_by('name')[:10]  # Limit to 10 results as requested
+    from clients.search import find_clients
     
-    client_list = [{'id': client.id, 'name': client.name} for client in clients]
+    client_list = [{'id': client.id, 'name': client.name} for client in find_clients(request.GET.get('q', ''))]
     
     return JsonResponse({'clients': client_list})
+
+
+@condition(etag_func=lambda request: versions.request_etag(request, [versions.TASKS]))
 def autocomplete_tasks(request):
     """API endpoint for task autocomplete functionality with case-insensitive search."""
     query = request.GET.get('q', '').strip()